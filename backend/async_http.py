@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Minimal asyncio HTTP/1.1 front end
+Parses requests on the event loop and hands them to an async dispatch coroutine
+"""
+
+import asyncio
+import contextvars
+import http
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    """Thread pool with a cap on queued + running calls, awaitable from the loop"""
+
+    def __init__(self, name, max_workers, max_pending=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 4
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = None
+
+    async def run(self, func, *args):
+        """Run func(*args) on the pool, waiting for a free slot first"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            # Like asyncio.to_thread(): the call sees the caller's context, e.g. its request id
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, context.run, func, *args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class FileBody:
+    """Response body sent straight from a file slice with loop.sendfile()"""
+
+    __slots__ = ('path', 'offset', 'length')
+
+    def __init__(self, path, offset, length):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+
+class RequestBody:
+    """Request body left on the connection for the handler to read as it goes
+
+    Used for routes that stream their input, so the body never has to fit in
+    memory and isn't subject to max_body_size.
+    """
+
+    def __init__(self, reader, length, timeout):
+        self.reader = reader
+        self.remaining = length
+        self.timeout = timeout
+
+    async def read(self, size=64 * 1024):
+        """Up to `size` more bytes, b'' once the body is used up"""
+        if self.remaining <= 0:
+            return b''
+        data = await asyncio.wait_for(self.reader.read(min(size, self.remaining)), self.timeout)
+        if not data:
+            raise asyncio.IncompleteReadError(b'', self.remaining)
+        self.remaining -= len(data)
+        return data
+
+    async def drain(self):
+        while await self.read():
+            pass
+
+    def iter_chunks(self, loop, size=64 * 1024):
+        """The body as a blocking iterator of bytes, for a worker thread while `loop` runs"""
+        while True:
+            chunk = asyncio.run_coroutine_threadsafe(self.read(size), loop).result()
+            if not chunk:
+                return
+            yield chunk
+
+
+class AsyncHTTPServer:
+    """Keep-alive HTTP/1.1 server built on asyncio streams"""
+
+    MAX_HEADER_LINES = 100
+
+    def __init__(self, dispatch, host='', port=8000, idle_timeout=75.0, max_body_size=10 * 1024 * 1024,
+                 max_requests_per_connection=1000, stream_body=None):
+        # dispatch(method, path, headers, body) -> (status, extra_headers, body)
+        # where body is bytes, a FileBody or an async iterator of bytes
+        self.dispatch = dispatch
+        # stream_body(method, path) -> True hands dispatch a RequestBody instead of the read body
+        self.stream_body = stream_body
+        self.host = host or None
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_body_size = max_body_size
+        self.max_requests_per_connection = max_requests_per_connection
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port, backlog=2048)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        served = 0
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+
+                try:
+                    request = await self._read_request(request_line, reader)
+                except asyncio.TimeoutError:
+                    # Headers or body stalled mid-request
+                    await self._write_response(writer, 408, {}, b'', keep_alive=False)
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    # A header line longer than the stream limit
+                    request = None
+                if request is None:
+                    await self._write_response(writer, 400, {}, b'', keep_alive=False)
+                    break
+
+                method, path, version, headers, body = request
+                served += 1
+                keep_alive = self._wants_keep_alive(version, headers) and served < self.max_requests_per_connection
+
+                try:
+                    status, extra_headers, response_body = await self.dispatch(method, path, headers, body)
+                except Exception as e:
+                    logger.error("Error dispatching %s %s: %s", method, path, e)
+                    status, extra_headers, response_body = 500, {}, b''
+
+                streamed_request = isinstance(body, RequestBody)
+                if streamed_request and status >= 400 and body.remaining:
+                    # Rejected before its body was read; don't read it just to keep the connection
+                    keep_alive = False
+                # HTTP/1.0 has no chunked encoding: a body of unknown length ends when the connection closes
+                chunked = version == 'HTTP/1.1'
+                if not chunked and not isinstance(response_body, (bytes, bytearray, FileBody)):
+                    keep_alive = False
+                await self._write_response(writer, status, extra_headers, response_body, keep_alive,
+                                           head=method == 'HEAD', chunked=chunked)
+                if not keep_alive:
+                    break
+                if streamed_request:
+                    # Skip anything the handler left unread so the next request starts at its request line
+                    await body.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            # The peer went away, or stopped sending a streamed body mid-response
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, request_line, reader):
+        """Parse request line, headers and body; None for a malformed request
+
+        Every read waits at most idle_timeout, so a client that stops sending
+        raises asyncio.TimeoutError instead of holding the connection.
+        """
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            return None
+
+        headers = {}
+        for _ in range(self.MAX_HEADER_LINES):
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            return None
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            return None
+        try:
+            content_length = int(headers.get('content-length', 0))
+        except ValueError:
+            return None
+        if content_length < 0:
+            return None
+        method = method.upper()
+        if self.stream_body is not None and self.stream_body(method, target):
+            return method, target, version, headers, RequestBody(reader, content_length, self.idle_timeout)
+        if content_length > self.max_body_size:
+            return None
+
+        body = b''
+        if content_length:
+            body = await asyncio.wait_for(reader.readexactly(content_length), self.idle_timeout)
+        return method, target, version, headers, body
+
+    @staticmethod
+    def _wants_keep_alive(version, headers):
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    async def _write_response(self, writer, status, extra_headers, body, keep_alive, head=False, chunked=True):
+        """Write a response; body is bytes, a FileBody or an async iterator of bytes
+
+        An iterator is sent chunked, or with chunked=False as raw bytes ended by
+        closing the connection, which the caller must then do. For HEAD the
+        headers describe the body, including its length, but it isn't sent.
+        """
+        try:
+            reason = http.HTTPStatus(status).phrase
+        except ValueError:
+            reason = ''
+        from_file = isinstance(body, FileBody)
+        streaming = not from_file and not isinstance(body, (bytes, bytearray))
+
+        lines = [f'HTTP/1.1 {status} {reason}']
+        for name, value in extra_headers.items():
+            lines.append(f'{name}: {value}')
+        if streaming:
+            if chunked:
+                lines.append('Transfer-Encoding: chunked')
+        elif status not in (204, 304):
+            lines.append(f'Content-Length: {body.length if from_file else len(body)}')
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+        if head or status in (204, 304):
+            await writer.drain()
+            return
+        if from_file:
+            await writer.drain()
+            # Zero-copy where the transport allows it, read-and-write otherwise
+            with open(body.path, 'rb') as f:
+                await asyncio.get_running_loop().sendfile(writer.transport, f, body.offset, body.length)
+            return
+        if not streaming:
+            if body:
+                writer.write(body)
+            await writer.drain()
+            return
+
+        async for chunk in body:
+            if chunk:
+                writer.write((b'%x\r\n' % len(chunk) + chunk + b'\r\n') if chunked else chunk)
+                await writer.drain()
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the recommendation server
+Run from the backend directory, e.g. python -m benchmarks.suite or python -m benchmarks.catalog_scaling
+"""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Ranking latency versus catalog size
+Compares scoring every package with two-stage retrieval + ranking on synthetic catalogs
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+import hybrid_ml_survey_server as server
+from benchmarks.synthetic import synthetic_surveys
+from catalog import PackageCatalog
+
+DEFAULT_SIZES = (22, 100, 1000, 5000, 20000, 100000)
+
+
+def synthetic_catalog(n_packages, seed=0):
+    """n_packages regional variants of the shipped catalog with jittered prices"""
+    rng = np.random.default_rng(seed)
+    base = server.current_catalog().packages
+    packages = []
+    for i in range(n_packages):
+        template = base[i % len(base)]
+        region = i // len(base)
+        # Prices stay on Rp500 steps like the real catalog
+        price = int(round(template['harga'] * rng.uniform(0.6, 1.6) / 500)) * 500 if region else template['harga']
+        packages.append({
+            'name': template['name'] if not region else f"{template['name']} R{region}",
+            'kuota': template['kuota'],
+            'harga': price,
+            'category': template['category']
+        })
+    return PackageCatalog(packages)
+
+
+def time_ms(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def run(sizes=DEFAULT_SIZES, n_surveys=200, seed=0):
+    engine = server.HybridRecommendationEngine()
+    surveys = synthetic_surveys(n_surveys, seed)
+    rng = np.random.default_rng(seed)
+
+    print(f"{'packages':>9} {'ml scores':>10} {'full p50':>10} {'full p95':>10} "
+          f"{'2-stage p50':>12} {'2-stage p95':>12} {'speedup':>8}")
+    results = []
+    for size in sizes:
+        catalog = synthetic_catalog(size, seed)
+        kernel = server.ScoringKernel(catalog, engine.ml_processor.weighting_logic, engine.survey_analyzer,
+                                      engine.ml_processor.feature_encoder)
+        for source in ('model', 'fallback'):
+            full_ms, staged_ms = [], []
+            for survey in surveys:
+                prepared = kernel.prepare(survey)
+                if source == 'model':
+                    # Sparse class probabilities, like a forest's leaf votes
+                    ml_scores = rng.dirichlet(np.full(size, 0.05))
+                else:
+                    ml_scores = kernel.ml_scores(prepared, None)
+                elapsed, expected = time_ms(kernel.rank_all, prepared, ml_scores)
+                full_ms.append(elapsed)
+                elapsed, actual = time_ms(kernel.rank_candidates, prepared, ml_scores)
+                staged_ms.append(elapsed)
+                if actual != expected:
+                    raise AssertionError(f"Two-stage ranking differs at {size} packages for {survey}: "
+                                         f"{actual} != {expected}")
+
+            row = {
+                'packages': size,
+                'ml_scores': source,
+                'full_p50_ms': statistics.median(full_ms),
+                'full_p95_ms': float(np.percentile(full_ms, 95)),
+                'two_stage_p50_ms': statistics.median(staged_ms),
+                'two_stage_p95_ms': float(np.percentile(staged_ms, 95))
+            }
+            results.append(row)
+            print(f"{size:>9} {source:>10} {row['full_p50_ms']:>10.3f} {row['full_p95_ms']:>10.3f} "
+                  f"{row['two_stage_p50_ms']:>12.3f} {row['two_stage_p95_ms']:>12.3f} "
+                  f"{row['full_p50_ms'] / row['two_stage_p50_ms']:>7.2f}x")
+    print(f"Two-stage ranking matched full scoring on every survey; the server switches at "
+          f"{server.ScoringKernel.RETRIEVAL_MIN_PACKAGES} packages")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ranking latency versus catalog size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Catalog sizes to measure')
+    parser.add_argument('--surveys', type=int, default=200, help='Surveys ranked per catalog size (default: 200)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    run(args.sizes, args.surveys, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+HTTP load generator for the recommendation server
+Runs the threaded server in this process and drives every route over keep-alive connections
+"""
+
+import http.client
+import itertools
+import json
+import os
+import random
+import secrets
+import threading
+import time
+
+import hybrid_ml_survey_server as server
+from benchmarks.results import rss_mb, summarize
+from prefork import PooledTCPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Surveys per request on the batch route
+BATCH_SIZE = 32
+
+# Accounts registered before the run for the login, profile and survey routes
+SETUP_USERS = 50
+
+
+class InProcessServer:
+    """The threaded server on an ephemeral localhost port, served from a background thread"""
+
+    def __init__(self, threads=8):
+        self.httpd = PooledTCPServer(('127.0.0.1', 0), server.HybridRequestHandler, threads=threads)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='bench-server', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
+
+
+class Client:
+    """One keep-alive connection; reconnects when the server closes it"""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, body bytes)"""
+        for attempt in range(2):
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.conn.close()
+                return response.status, data
+            except (ConnectionError, http.client.HTTPException):
+                self.conn.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        self.conn.close()
+
+
+class Workload:
+    """Request factories for every route, backed by accounts and submissions made in setup()"""
+
+    def __init__(self, surveys, seed=0):
+        self.surveys = surveys
+        self.rng = random.Random(seed)
+        self.admin_token = os.environ.setdefault('ADMIN_TOKEN', secrets.token_hex(16))
+        self.users = []
+        self.submissions = []
+        self._emails = itertools.count()
+        self._run_id = secrets.token_hex(4)
+
+    def survey(self):
+        return self.surveys[self.rng.randrange(len(self.surveys))]
+
+    def new_account(self):
+        n = next(self._emails)
+        return {'name': f'Bench {n}', 'email': f'bench-{self._run_id}-{n}@example.com',
+                'password': 'benchmark', 'phone': f'08{n:010d}'}
+
+    def setup(self, client):
+        for _ in range(SETUP_USERS):
+            account = self.new_account()
+            status, body = client.request('POST', '/api/auth/register', json.dumps(account))
+            if status != 200:
+                raise RuntimeError(f"Benchmark setup could not register a user: {status} {body[:200]!r}")
+            data = json.loads(body)
+            self.users.append((account, data['user']['id'], data['token']))
+        for _ in range(SETUP_USERS):
+            status, body = client.request(*self.survey_submit())
+            if status == 200:
+                self.submissions.append(json.loads(body)['submission_id'])
+        if not self.submissions:
+            raise RuntimeError("Benchmark setup could not store a survey submission")
+
+    def user(self):
+        return self.users[self.rng.randrange(len(self.users))]
+
+    def survey_submit(self):
+        _, _, token = self.user()
+        body = {'survey_data': self.survey(), 'recommendations': [], 'selected_package': None}
+        return 'POST', '/api/survey/submit', json.dumps(body), {'Authorization': f'Bearer {token}'}
+
+    def routes(self):
+        """{route: () -> (method, path, body, headers)}, one entry per route the server serves"""
+        def user_profile():
+            _, user_id, token = self.user()
+            return 'GET', f'/api/user/{user_id}', None, {'Authorization': f'Bearer {token}'}
+
+        def login():
+            account, _, _ = self.user()
+            return 'POST', '/api/auth/login', json.dumps({'email': account['email'],
+                                                          'password': account['password']}), {}
+
+        return {
+            'GET /api/packages': lambda: ('GET', '/api/packages', None, {'Accept-Encoding': 'gzip'}),
+            'GET /api/health': lambda: ('GET', '/api/health', None, {}),
+            'GET /api/metrics': lambda: ('GET', '/api/metrics', None, {}),
+            'GET /api/admin/model': lambda: ('GET', '/api/admin/model', None, {'X-Admin-Token': self.admin_token}),
+            'GET /api/user/<id>': user_profile,
+            'GET /api/survey/submission/<id>': lambda: (
+                'GET', f'/api/survey/submission/{self.submissions[self.rng.randrange(len(self.submissions))]}',
+                None, {}),
+            'GET static': lambda: ('GET', '/beranda.html', None, {}),
+            'POST /api/recommend': lambda: ('POST', '/api/recommend', json.dumps(self.survey()), {}),
+            'POST /api/recommend/batch': lambda: (
+                'POST', '/api/recommend/batch', json.dumps([self.survey() for _ in range(BATCH_SIZE)]), {}),
+            'POST /api/auth/register': lambda: ('POST', '/api/auth/register', json.dumps(self.new_account()), {}),
+            'POST /api/auth/login': login,
+            'POST /api/survey/submit': self.survey_submit
+        }
+
+
+def drive(port, make_request, n_requests, concurrency):
+    """Send n_requests from `concurrency` threads; (latencies in seconds, errors, wall seconds)"""
+    latencies = []
+    errors = [0]
+    remaining = itertools.count()
+    lock = threading.Lock()
+
+    def worker():
+        client = Client(port)
+        local = []
+        local_errors = 0
+        try:
+            while next(remaining) < n_requests:
+                with lock:
+                    method, path, body, headers = make_request()
+                started = time.perf_counter()
+                try:
+                    status, _ = client.request(method, path, body, headers)
+                except (OSError, http.client.HTTPException):
+                    status = None
+                local.append(time.perf_counter() - started)
+                if status is None or status >= 400:
+                    local_errors += 1
+        finally:
+            client.close()
+            with lock:
+                latencies.extend(local)
+                errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def run(surveys, requests_per_route=500, concurrency=8, server_threads=8, routes=None, seed=0):
+    """{'routes': {route: latency and throughput}, 'rss_mb', 'peak_rss_mb'} for one load run"""
+    # Served through the same in-process server, as the website would load it
+    server.enable_static_files(REPO_ROOT)
+    server.init_database()
+    workload = Workload(surveys, seed)
+    results = {}
+
+    with InProcessServer(threads=server_threads) as httpd:
+        setup_client = Client(httpd.port)
+        workload.setup(setup_client)
+        setup_client.close()
+
+        for route, make_request in workload.routes().items():
+            if routes and route not in routes:
+                continue
+            # Warm connections, caches and code paths before measuring
+            drive(httpd.port, make_request, min(50, requests_per_route), concurrency)
+            latencies, errors, wall = drive(httpd.port, make_request, requests_per_route, concurrency)
+            row = dict(summarize(latencies, wall), requests=len(latencies), errors=errors, concurrency=concurrency)
+            results[route] = row
+            print(f"{route:<34} p50 {row['p50_ms']:>8.2f} ms  p95 {row['p95_ms']:>8.2f} ms  "
+                  f"p99 {row['p99_ms']:>8.2f} ms  {row['throughput_rps']:>8.0f} req/s  errors {errors}")
+
+    current, peak = rss_mb()
+    print(f"RSS {current} MB, peak {peak} MB")
+    return {'routes': results, 'rss_mb': current, 'peak_rss_mb': peak}
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the recommendation pipeline
+Times each stage on its own, one synthetic survey per call, with no HTTP in the way
+"""
+
+import time
+
+import hybrid_ml_survey_server as server
+from benchmarks.results import summarize
+
+
+def _time_calls(func, surveys, iterations, warmup):
+    for i in range(warmup):
+        func(surveys[i % len(surveys)])
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        survey = surveys[i % len(surveys)]
+        call_started = time.perf_counter()
+        func(survey)
+        samples.append(time.perf_counter() - call_started)
+    return samples, time.perf_counter() - started
+
+
+def benchmarks(engine):
+    """{name: function of one survey} for each measured entry point"""
+    processor = engine.ml_processor
+    # Surveys are copied the way the API hands each request its own dict
+    return {
+        'FeatureEncoder.encode_survey_data': processor.feature_encoder.encode_survey_data,
+        'MLModelProcessor.process_survey_through_model':
+            lambda survey: processor.process_survey_through_model(dict(survey)),
+        'SurveyAnalyzer.get_recommendations': lambda survey: engine.survey_analyzer.get_recommendations(survey),
+        'HybridRecommendationEngine.get_hybrid_recommendations':
+            lambda survey: engine.get_hybrid_recommendations(dict(survey))
+    }
+
+
+def run(engine, surveys, iterations=2000, warmup=200):
+    """{benchmark: p50/p95/p99 in microseconds and calls per second}"""
+    results = {}
+    for name, func in benchmarks(engine).items():
+        samples, wall = _time_calls(func, surveys, iterations, warmup)
+        results[name] = dict(summarize(samples, wall, unit='us'), iterations=iterations)
+        row = results[name]
+        print(f"{name:<55} p50 {row['p50_us']:>9.1f} us  p95 {row['p95_us']:>9.1f} us  "
+              f"p99 {row['p99_us']:>9.1f} us  {row['ops_per_s']:>9.0f}/s")
+    return results
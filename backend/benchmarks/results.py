@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark results: latency summaries, process memory, JSON baselines and regression checks
+Baselines are plain JSON so they can be kept next to the code and diffed across commits
+"""
+
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+
+import numpy as np
+
+# Metrics where a larger value is an improvement; every other metric is a cost
+HIGHER_IS_BETTER = ('ops_per_s', 'throughput_rps')
+
+# Counts that describe the run rather than measure it
+NOT_COMPARED = ('iterations', 'requests', 'errors', 'concurrency')
+
+
+def summarize(samples, wall_seconds, unit='ms'):
+    """p50/p95/p99 of per-call latencies in seconds, plus calls per second over wall_seconds"""
+    scale = {'ms': 1e3, 'us': 1e6}[unit]
+    samples = np.asarray(samples, dtype=float) * scale
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+    return {
+        f'p50_{unit}': round(float(p50), 4),
+        f'p95_{unit}': round(float(p95), 4),
+        f'p99_{unit}': round(float(p99), 4),
+        'throughput_rps' if unit == 'ms' else 'ops_per_s': round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0
+    }
+
+
+def rss_mb():
+    """(current, peak) resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current_mb = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        current_mb = peak_mb
+    return round(current_mb, 1), round(peak_mb, 1)
+
+
+def environment():
+    """Where the numbers came from, so baselines from different machines aren't mixed up unnoticed"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _flatten(results, prefix=''):
+    """{'micro.encode_survey_data.p50_us': value, ...} for every numeric leaf"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current, threshold=0.10):
+    """[(metric, baseline, current, relative change, regressed)] for metrics present in both runs
+
+    A cost metric regresses when it grows by more than `threshold`, a rate when
+    it drops by more than `threshold`.
+    """
+    old = _flatten({key: baseline.get(key, {}) for key in ('micro', 'load')})
+    new = _flatten({key: current.get(key, {}) for key in ('micro', 'load')})
+    rows = []
+    for metric in sorted(old.keys() & new.keys()):
+        if metric.rsplit('.', 1)[-1] in NOT_COMPARED:
+            continue
+        before, after = old[metric], new[metric]
+        change = (after - before) / before if before else 0.0
+        if metric.endswith(HIGHER_IS_BETTER):
+            regressed = change < -threshold
+        else:
+            regressed = change > threshold
+        rows.append((metric, before, after, change, regressed))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"{'metric':<{width}} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{metric:<{width}} {before:>12.4g} {after:>12.4g} {change:>+7.1%}{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"{regressions} regression(s) beyond {threshold:.0%} in {len(rows)} metrics")
+    return regressions
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark suite for the recommendation server
+Microbenchmarks plus an in-process HTTP load run, saved as a JSON baseline and compared against an earlier one
+
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --compare baseline.json
+    python -m benchmarks.suite --compare baseline.json --results current.json
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import hybrid_ml_survey_server as server
+from benchmarks import load, micro, results
+from benchmarks.synthetic import synthetic_model, synthetic_surveys
+from structured_logging import configure_logging
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def find_model(path=None):
+    """Absolute path of the model to benchmark: `path`, else the first deployed model file, else None"""
+    if path:
+        return os.path.abspath(path)
+    for directory in (os.getcwd(), BACKEND_DIR):
+        for name in server.MLModelProcessor.MODEL_PATHS:
+            candidate = os.path.join(directory, name)
+            if os.path.exists(candidate):
+                return os.path.abspath(candidate)
+    return None
+
+
+def prepare_engine(model_path, scratch_dir, cache_size, seed):
+    """Initialize the shared engine with the model to measure; returns its description"""
+    synthetic = False
+    if model_path is None:
+        try:
+            model_path = synthetic_model(os.path.join(scratch_dir, 'synthetic_model.pkl'), seed=seed)
+            synthetic = True
+        except ImportError:
+            print("scikit-learn is not installed and no model file was found; measuring without a model")
+
+    # The scratch directory has no model files, so only the chosen one is loaded
+    server.ENGINE_REGISTRY.initialize(cache={'max_entries': cache_size} if cache_size > 0 else None)
+    if model_path is not None:
+        server.ENGINE_REGISTRY.reload_model(model_path)
+    current = server.ENGINE_REGISTRY.get_engine().ml_processor.current
+    description = current.describe() if current is not None else None
+    return {'model': description, 'synthetic_model': synthetic, 'cache_size': cache_size}
+
+
+def run(args):
+    surveys = synthetic_surveys(args.surveys, args.seed)
+    model_path = find_model(args.model)
+    scratch_dir = tempfile.mkdtemp(prefix='sphinx-bench-')
+    previous_dir = os.getcwd()
+    # Run where telco_users.db and deployed model files can't be touched
+    os.chdir(scratch_dir)
+    try:
+        configure_logging('WARNING')
+        setup = prepare_engine(model_path, scratch_dir, args.cache_size, args.seed)
+        output = {'meta': dict(results.environment(), **setup, surveys=args.surveys, seed=args.seed)}
+
+        if not args.skip_micro:
+            print("Microbenchmarks")
+            output['micro'] = micro.run(server.ENGINE_REGISTRY.get_engine(), surveys, args.iterations)
+        if not args.skip_load:
+            print(f"\nHTTP load: {args.requests} requests per route, concurrency {args.concurrency}")
+            output['load'] = load.run(surveys, args.requests, args.concurrency, args.server_threads,
+                                      routes=args.routes, seed=args.seed)
+        return output
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the recommendation server')
+    parser.add_argument('--model', metavar='PATH',
+                        help='Model to load (default: the deployed model file, else a synthetic one)')
+    parser.add_argument('--surveys', type=int, default=1000, help='Distinct synthetic surveys (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help='Recommendation cache entries, 0 = measure the uncached pipeline (default: 0)')
+    parser.add_argument('--iterations', type=int, default=2000, help='Calls per microbenchmark (default: 2000)')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route (default: 500)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client connections (default: 8)')
+    parser.add_argument('--server-threads', type=int, default=8, help='Server request threads (default: 8)')
+    parser.add_argument('--routes', nargs='+', metavar='ROUTE',
+                        help='Only load these routes, e.g. "POST /api/recommend" (default: all)')
+    parser.add_argument('--skip-micro', action='store_true', help='Skip the microbenchmarks')
+    parser.add_argument('--skip-load', action='store_true', help='Skip the HTTP load run')
+    parser.add_argument('--save', metavar='PATH', help='Write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='BASELINE', help='Flag regressions against this baseline')
+    parser.add_argument('--results', metavar='PATH',
+                        help='With --compare: compare these saved results instead of running')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change counted as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    output = results.load(args.results) if args.results else run(args)
+    if args.save:
+        results.save(output, args.save)
+        print(f"\nSaved results to {args.save}")
+    if args.compare:
+        print(f"\nCompared with {args.compare}")
+        rows = results.compare(results.load(args.compare), output, args.threshold)
+        if results.print_comparison(rows, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Synthetic inputs for the benchmarks
+Surveys drawn from FeatureEncoder's answer vocabularies and a stand-in model for machines without the pickle
+"""
+
+import pickle
+import random
+
+import hybrid_ml_survey_server as server
+
+
+def answer_vocabularies(encoder=None):
+    """{survey field: answers the encoder understands} for every single-choice question"""
+    encoder = encoder or server.FeatureEncoder()
+    return {
+        'phone_model': list(encoder.phone_model_mapping),
+        'gender': list(encoder.gender_mapping),
+        'reason': list(encoder.reason_mapping),
+        'call_frequency': list(encoder.call_frequency_mapping),
+        'wifi': list(encoder.wifi_mapping),
+        'housing': list(encoder.housing_mapping),
+        'budget': list(encoder.budget_mapping),
+        'quota': list(encoder.quota_mapping),
+        'preference': list(encoder.preference_mapping),
+        'roaming': list(encoder.roaming_mapping)
+    }
+
+
+def synthetic_surveys(n_surveys, seed=0):
+    """Complete surveys, as the website submits them, with one to three usage answers"""
+    rng = random.Random(seed)
+    vocabularies = answer_vocabularies()
+    surveys = []
+    for _ in range(n_surveys):
+        survey = {field: rng.choice(answers) for field, answers in vocabularies.items()}
+        survey['usage'] = rng.sample(server.FeatureEncoder.USAGE_ANSWERS, rng.randint(1, 3))
+        surveys.append(survey)
+    return surveys
+
+
+def synthetic_model(path, n_surveys=5000, n_trees=30, seed=0):
+    """Train a random forest on synthetic surveys and pickle it to `path`
+
+    Each survey is labelled with the package the rule-based fallback ranks first,
+    so predictions look like a real model's. Requires scikit-learn.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    engine = server.HybridRecommendationEngine()
+    catalog = server.current_catalog()
+    surveys = synthetic_surveys(n_surveys, seed)
+    encoder = engine.ml_processor.feature_encoder
+
+    features = encoder.encode_batch(surveys)
+    labels = [catalog.row(engine.recommend_from_probabilities(survey, None)[0]['name']) for survey in surveys]
+
+    # One row per package so predict_proba has a column for every catalog row
+    extra = encoder.sample_feature_matrix(len(catalog), seed=seed)
+    features = list(features) + list(extra)
+    labels = labels + list(range(len(catalog)))
+
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=seed, n_jobs=1)
+    model.fit(features, labels)
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+    return path
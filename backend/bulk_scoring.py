@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Offline bulk re-scoring of stored surveys
+Streams survey_responses rows or a JSONL/CSV file through the hybrid engine in a process pool, with checkpoint and resume
+
+    python bulk_scoring.py --from-db --output rescored.jsonl --checkpoint rescore.ckpt --workers 4
+    python bulk_scoring.py --from-db --write-back --checkpoint rescore.ckpt --resume
+    python bulk_scoring.py --jsonl surveys.jsonl --output rescored.jsonl
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+
+import hybrid_ml_survey_server as server
+import structured_logging
+from catalog import DEFAULT_CATALOG_PATH
+from data_access import Database, UserStore
+from migrations import migrate
+
+logger = logging.getLogger('sphinx.bulk_scoring')
+
+# Chunks in flight per worker: enough to keep workers busy while the parent writes,
+# few enough that memory doesn't depend on how much history there is
+CHUNKS_PER_WORKER = 2
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 10.0
+
+# Identifiers copied from a survey_responses export into each result line
+CARRIED_FIELDS = ('id', 'submission_id', 'user_id')
+
+
+class BulkScoringError(Exception):
+    """Raised when a run can't start or resume as asked"""
+
+
+# Sources yield (position, meta, survey) in position order. `position` is what a
+# checkpoint records, `meta` identifies the survey in the output and `survey` is
+# a dict or its JSON text, decoded by the worker.
+
+def iter_database_surveys(store, after_id=0, page_size=500):
+    """survey_responses rows with id > after_id, one page per query"""
+    while True:
+        rows = store.surveys_after(after_id, page_size)
+        if not rows:
+            return
+        for survey_id, submission_id, user_id, survey_json in rows:
+            yield survey_id, {'id': survey_id, 'submission_id': submission_id, 'user_id': user_id}, survey_json
+        after_id = rows[-1][0]
+
+
+def iter_jsonl_surveys(path, after_line=0):
+    """One survey (or survey_responses export row) per line, positioned by line number"""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if line_number <= after_line or not line.strip():
+                continue
+            yield line_number, {'line': line_number}, line
+
+
+def parse_csv_survey(row):
+    """Survey from a CSV row: a survey_data JSON column, or one column per answer
+
+    usage holds a JSON array or ';'-separated answers; empty cells are left out
+    so the engine's defaults apply.
+    """
+    if row.get('survey_data'):
+        return row['survey_data']
+    survey = {field: value for field, value in row.items()
+              if field and value not in (None, '') and field not in CARRIED_FIELDS}
+    usage = survey.get('usage')
+    if usage is not None:
+        usage = usage.strip()
+        survey['usage'] = json.loads(usage) if usage.startswith('[') else [
+            answer.strip() for answer in usage.split(';') if answer.strip()]
+    return survey
+
+
+def iter_csv_surveys(path, after_record=0):
+    """One survey per CSV record after the header, positioned by record number"""
+    with open(path, encoding='utf-8', newline='') as f:
+        for record, row in enumerate(csv.DictReader(f), 1):
+            if record <= after_record:
+                continue
+            meta = {'record': record}
+            meta.update((field, row[field]) for field in CARRIED_FIELDS if row.get(field))
+            try:
+                survey = parse_csv_survey(row)
+            except ValueError as e:
+                survey = server.InvalidBatchItem(f"Invalid usage column: {e}")
+            yield record, meta, survey
+
+
+# Worker side: one engine per process, loaded by the pool initializer
+
+_ENGINE = None
+
+
+def load_engine(model_path=None, inference_backend='auto', catalog_path=DEFAULT_CATALOG_PATH, log_level=None):
+    """Build this process's engine; `model_path` overrides the usual model files"""
+    global _ENGINE
+    if log_level is not None and structured_logging.LOGGING is None:
+        # Spawned workers don't inherit the parent's logging setup
+        structured_logging.configure_logging(log_level)
+    server.enable_catalog(catalog_path)
+    engine = server.HybridRecommendationEngine()
+    engine.ml_processor.inference_backend = inference_backend
+    if model_path:
+        engine.ml_processor.reload_model(model_path)
+    else:
+        engine.ml_processor.load_model()
+    _ENGINE = engine
+    return engine
+
+
+def decode_survey(meta, survey):
+    """(survey dict, error); unwraps survey_responses export rows and carries their identifiers"""
+    if isinstance(survey, server.InvalidBatchItem):
+        return None, survey.error
+    if isinstance(survey, (str, bytes)):
+        try:
+            survey = json.loads(survey)
+        except ValueError as e:
+            return None, f"Invalid JSON: {e}"
+    if isinstance(survey, dict) and 'survey_data' in survey:
+        for field in CARRIED_FIELDS:
+            if survey.get(field) is not None:
+                meta.setdefault(field, survey[field])
+        survey = survey['survey_data']
+        if isinstance(survey, str):
+            try:
+                survey = json.loads(survey)
+            except ValueError as e:
+                return None, f"Invalid JSON in survey_data: {e}"
+    if not isinstance(survey, dict):
+        return None, 'Survey must be a JSON object'
+    return survey, None
+
+
+def result_line(meta, model_version, recommendations_json, error):
+    """One output line: the survey's identifiers, then its recommendations or error"""
+    fields = [f'{json.dumps(key)}: {json.dumps(value)}' for key, value in meta.items()]
+    if error is None:
+        fields.append(f'"success": true, "model_version": {json.dumps(model_version)}, '
+                      f'"recommendations": {recommendations_json}')
+    else:
+        fields.append(f'"success": false, "error": {json.dumps(error)}')
+    return '{' + ', '.join(fields) + '}\n'
+
+
+def score_chunk(items):
+    """Score (meta, survey) items with one model call
+
+    Returns (model label, model fingerprint, [(meta, output line, recommendations JSON or None)]).
+    """
+    engine = _ENGINE
+    decoded = [decode_survey(meta, survey) for meta, survey in items]
+    valid_rows = [row for row, (survey, _) in enumerate(decoded) if survey is not None]
+    results = {}
+    label = fingerprint = None
+    chunk_error = None
+    try:
+        batch, version = engine.recommend_batch([decoded[row][0] for row in valid_rows])
+        results = dict(zip(valid_rows, batch))
+        if version is not None:
+            label, fingerprint = version.label, version.fingerprint
+    except Exception as e:
+        logger.error("Error scoring a chunk of %d surveys: %s", len(valid_rows), e)
+        chunk_error = str(e)
+
+    scored = []
+    for row, (meta, _) in enumerate(items):
+        error = decoded[row][1] or chunk_error
+        recommendations_json = json.dumps(results[row]) if row in results else None
+        scored.append((meta, result_line(meta, label, recommendations_json, error), recommendations_json))
+    return label, fingerprint, scored
+
+
+class Checkpoint:
+    """Progress of one run as a small JSON file, atomically replaced after every chunk"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise BulkScoringError(f"Checkpoint {self.path} is unreadable: {e}") from e
+
+    def save(self, state):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+def describe_source(source):
+    kind, path = source
+    return {'kind': kind, 'path': os.path.abspath(path)}
+
+
+def open_source(source, store, position, chunk_size):
+    kind, path = source
+    if kind == 'db':
+        return iter_database_surveys(store, position, chunk_size)
+    if kind == 'jsonl':
+        return iter_jsonl_surveys(path, position)
+    return iter_csv_surveys(path, position)
+
+
+def iter_source_chunks(records, chunk_size, limit=None):
+    """(position of the last record, [(meta, survey)]) chunks, at most `limit` records in total"""
+    chunk = []
+    position = None
+    for count, (position, meta, survey) in enumerate(records, 1):
+        chunk.append((meta, survey))
+        if len(chunk) == chunk_size or count == limit:
+            yield position, chunk
+            chunk = []
+        if count == limit:
+            return
+    if chunk:
+        yield position, chunk
+
+
+def run(source, output=None, write_back=False, checkpoint=None, resume=False, workers=1, chunk_size=500,
+        limit=None, model_path=None, inference_backend='auto', catalog_path=DEFAULT_CATALOG_PATH,
+        database=server.DB_NAME, log_level='INFO'):
+    """Score every survey in `source`, a (kind, path) pair with kind 'db', 'jsonl' or 'csv'
+
+    Results go to the JSONL file `output` and, for the database source, into the
+    rescored_* columns of survey_responses when write_back is set. With a
+    checkpoint, progress is saved after each chunk and resume continues from it.
+    Returns the final checkpoint state.
+    """
+    if output is None and not write_back:
+        raise BulkScoringError("Nothing to write: give an output file or write back to the database")
+    if write_back and source[0] != 'db':
+        raise BulkScoringError("Only surveys read from the database can be written back")
+    if limit is not None and limit <= 0:
+        raise BulkScoringError("The limit must be a positive number of surveys")
+    if not os.path.isfile(source[1]):
+        raise BulkScoringError(f"{source[1]} does not exist")
+    if model_path and not os.path.isfile(model_path):
+        raise BulkScoringError(f"Model file {model_path} does not exist")
+
+    db = Database(database)
+    store = UserStore(db)
+    if source[0] == 'db':
+        migrate(db)
+
+    store_checkpoint = Checkpoint(checkpoint) if checkpoint else None
+    state = store_checkpoint.load() if store_checkpoint else None
+    if state is not None and not resume:
+        raise BulkScoringError(f"Checkpoint {checkpoint} exists; pass --resume to continue it or remove it")
+    if resume and state is None:
+        raise BulkScoringError(f"Checkpoint {checkpoint} not found, nothing to resume" if store_checkpoint
+                               else "--resume needs --checkpoint")
+    if state is None:
+        state = {'source': describe_source(source), 'output': os.path.abspath(output) if output else None,
+                 'write_back': write_back, 'position': 0, 'scored': 0, 'errors': 0, 'output_bytes': 0,
+                 'model_version': None, 'model_fingerprint': None, 'complete': False}
+    elif (state['source'] != describe_source(source) or state['write_back'] != write_back or
+          state['output'] != (os.path.abspath(output) if output else None)):
+        raise BulkScoringError(f"Checkpoint {checkpoint} belongs to a run with a different source or output")
+    elif state['complete']:
+        logger.info("Checkpoint %s is already complete: %d surveys scored", checkpoint, state['scored'])
+        return state
+
+    out = None
+    if output:
+        if state['output_bytes'] and (not os.path.exists(output) or os.path.getsize(output) < state['output_bytes']):
+            raise BulkScoringError(f"{output} is shorter than checkpoint {checkpoint} recorded; it can't be resumed")
+        out = open(output, 'r+b' if state['output_bytes'] else 'wb')
+        # Lines written after the last checkpoint are scored again, so drop them
+        out.truncate(state['output_bytes'])
+        out.seek(state['output_bytes'])
+
+    engine_options = (model_path, inference_backend, catalog_path, log_level)
+    pool = None
+    if workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=load_engine,
+                                                      initargs=engine_options)
+    else:
+        load_engine(*engine_options[:3])
+
+    logger.info("Bulk scoring %s from %s", source[0], source[1], extra={
+        'workers': workers, 'chunk_size': chunk_size, 'resume_position': state['position'],
+        'output': output, 'write_back': write_back})
+    chunks = iter_source_chunks(open_source(source, store, state['position'], chunk_size), chunk_size, limit)
+    pending = collections.deque()
+    started = last_progress = time.monotonic()
+    scored_this_run = 0
+
+    def submit(position, chunk):
+        if pool is None:
+            future = concurrent.futures.Future()
+            future.set_result(score_chunk(chunk))
+        else:
+            future = pool.submit(score_chunk, chunk)
+        pending.append((position, future))
+
+    def finish_oldest():
+        """Write the oldest chunk's results, then record its position"""
+        nonlocal scored_this_run, last_progress
+        position, future = pending.popleft()
+        label, fingerprint, scored = future.result()
+        if fingerprint is not None:
+            if state['model_fingerprint'] not in (None, fingerprint):
+                raise BulkScoringError(f"Model {label} differs from {state['model_version']} used earlier in "
+                                       "this run; start a new checkpoint to re-score with it")
+            state['model_version'], state['model_fingerprint'] = label, fingerprint
+
+        if out is not None:
+            out.write(''.join(line for _, line, _ in scored).encode())
+            out.flush()
+            os.fsync(out.fileno())
+            state['output_bytes'] = out.tell()
+        if write_back:
+            store.record_rescored([(recommendations_json, label, meta['id'])
+                                   for meta, _, recommendations_json in scored if recommendations_json is not None])
+
+        state['position'] = position
+        state['scored'] += len(scored)
+        state['errors'] += sum(1 for _, _, recommendations_json in scored if recommendations_json is None)
+        state['updated_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        scored_this_run += len(scored)
+        if store_checkpoint:
+            store_checkpoint.save(state)
+
+        now = time.monotonic()
+        if now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            logger.info("Scored %d surveys (%d errors), %.0f/s, at %s %s", state['scored'], state['errors'],
+                        scored_this_run / (now - started), source[0], position)
+
+    try:
+        for position, chunk in chunks:
+            submit(position, chunk)
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                finish_oldest()
+        while pending:
+            finish_oldest()
+        state['complete'] = limit is None
+        if store_checkpoint:
+            store_checkpoint.save(state)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if out is not None:
+            out.close()
+
+    elapsed = time.monotonic() - started
+    logger.info("Bulk scoring finished: %d surveys this run in %.1f s (%.0f/s), %d in total with %d errors",
+                scored_this_run, elapsed, scored_this_run / elapsed if elapsed else 0.0, state['scored'],
+                state['errors'], extra={'model_version': state['model_version']})
+    return state
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Re-score stored surveys with the hybrid engine')
+    sources = parser.add_mutually_exclusive_group(required=True)
+    sources.add_argument('--from-db', action='store_true', help='Read the survey_responses table')
+    sources.add_argument('--jsonl', metavar='PATH',
+                         help='One survey, or survey_responses row with survey_data, per line')
+    sources.add_argument('--csv', metavar='PATH',
+                         help='One survey per record: a survey_data column or one column per answer')
+    parser.add_argument('--database', default=server.DB_NAME, help=f'SQLite file (default: {server.DB_NAME})')
+    parser.add_argument('--output', metavar='PATH', help='Write one JSON line per survey to this file')
+    parser.add_argument('--write-back', action='store_true',
+                        help='Store results in survey_responses.rescored_* (--from-db only)')
+    parser.add_argument('--checkpoint', metavar='PATH', help='Save progress here after every chunk')
+    parser.add_argument('--resume', action='store_true', help='Continue the run recorded in --checkpoint')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Scoring processes, each loading the model once; 0 = one per CPU (default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Surveys per model call (default: 500)')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many surveys')
+    parser.add_argument('--model', metavar='PATH', help='Model file (default: the server\'s usual model files)')
+    parser.add_argument('--inference-backend', choices=['auto', 'sklearn'], default='auto',
+                        help='auto uses the compiled forest when it verifies (default: auto)')
+    parser.add_argument('--catalog', metavar='PATH', default=DEFAULT_CATALOG_PATH,
+                        help='Package catalog JSON (default: data/packages.json)')
+    parser.add_argument('--log-level', default=os.environ.get('LOG_LEVEL', 'INFO'), type=str.upper,
+                        help='Minimum level logged (default: $LOG_LEVEL or INFO)')
+    args = parser.parse_args(argv)
+    if args.workers <= 0:
+        args.workers = os.cpu_count() or 1
+    if args.chunk_size <= 0:
+        parser.error('--chunk-size must be positive')
+    if args.limit is not None and args.limit <= 0:
+        parser.error('--limit must be positive')
+    if args.from_db:
+        args.source = ('db', args.database)
+    elif args.jsonl:
+        args.source = ('jsonl', args.jsonl)
+    else:
+        args.source = ('csv', args.csv)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    structured_logging.configure_logging(args.log_level)
+    try:
+        run(args.source, output=args.output, write_back=args.write_back, checkpoint=args.checkpoint,
+            resume=args.resume, workers=args.workers, chunk_size=args.chunk_size, limit=args.limit,
+            model_path=args.model, inference_backend=args.inference_backend, catalog_path=args.catalog,
+            database=args.database, log_level=args.log_level)
+    except (BulkScoringError, server.ModelValidationError) as e:
+        logger.error("%s", e)
+        return 1
+    except concurrent.futures.BrokenExecutor as e:
+        logger.error("A scoring worker failed to start or died: %s", e)
+        return 1
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; continue with --resume" if args.checkpoint else "Interrupted")
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
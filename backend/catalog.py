@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Package catalog shared by the website and the recommendation engine
+Loads data/packages.json once, normalizes prices and indexes packages by name, category and price
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'data', 'packages.json')
+
+# Top-level groups of data/packages.json; script/script.js renders all but 'unlisted',
+# which holds packages only the recommendation engine offers
+SECTION_GROUPS = ('quota', 'simCredit', 'wifi', 'unlisted')
+
+
+class CatalogError(Exception):
+    """Raised when a catalog file can't be read or doesn't describe a valid catalog"""
+
+
+def parse_price(value):
+    """Rupiah amount as an int: 40000, "40000", "Rp40.000" and "Rp 1.500.000" all parse"""
+    if isinstance(value, bool):
+        raise CatalogError(f"Invalid price {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        # str() would turn 1.5 into "1.5", which then reads as Rp15
+        if not value.is_integer():
+            raise CatalogError(f"Invalid price {value!r}")
+        return int(value)
+    # Indonesian notation: '.' groups thousands, ',' starts the (unused) cents
+    digits = re.sub(r'[\s.]', '', str(value)).removeprefix('Rp').removeprefix('IDR').split(',')[0]
+    if not digits.isdigit():
+        raise CatalogError(f"Invalid price {value!r}")
+    return int(digits)
+
+
+def compact_quota(quota):
+    """API spelling of a quota: "20 GB" -> "20GB" """
+    return str(quota).replace(' ', '')
+
+
+class PackageCatalog:
+    """Normalized, recommendable packages plus the secondary indexes lookups use
+
+    `packages` keeps the shape the API has always returned (name, kuota, harga,
+    category) and is ordered by model class, so row i is the model's class i.
+    `listed_packages` leaves out the names in `unlisted`, which are recommended
+    but never listed.
+    """
+
+    def __init__(self, packages, version=None, unlisted=()):
+        self.packages = packages
+        self.version = version or hashlib.sha256(json.dumps(packages).encode()).hexdigest()[:16]
+        unlisted = set(unlisted)
+        self.listed_packages = [package for package in packages if package['name'] not in unlisted]
+
+        # name -> row
+        self.by_name = {}
+        for row, package in enumerate(packages):
+            if package['name'] in self.by_name:
+                raise CatalogError(f"Duplicate package name {package['name']!r}")
+            self.by_name[package['name']] = row
+
+        # category -> rows, in catalog order
+        by_category = {}
+        for row, package in enumerate(packages):
+            by_category.setdefault(package['category'], []).append(row)
+        self.by_category = {category: tuple(rows) for category, rows in by_category.items()}
+
+        # Rows sorted by price, ties in catalog order, with the prices alongside for bisect
+        self.price_order = tuple(sorted(range(len(packages)), key=lambda row: packages[row]['harga']))
+        self.sorted_prices = tuple(packages[row]['harga'] for row in self.price_order)
+
+    def __len__(self):
+        return len(self.packages)
+
+    def row(self, name):
+        """Row of the package called `name`, or None"""
+        return self.by_name.get(name)
+
+    def get(self, name):
+        row = self.by_name.get(name)
+        return self.packages[row] if row is not None else None
+
+    def rows_in_category(self, category):
+        return self.by_category.get(category, ())
+
+    def rows_within_budget(self, max_price):
+        """Rows priced at most max_price, cheapest first"""
+        return self.price_order[:bisect.bisect_right(self.sorted_prices, max_price)]
+
+    def rows_in_price_range(self, min_price, max_price):
+        """Rows priced between min_price and max_price inclusive, cheapest first"""
+        start = bisect.bisect_left(self.sorted_prices, min_price)
+        end = bisect.bisect_right(self.sorted_prices, max_price)
+        return self.price_order[start:end]
+
+    @classmethod
+    def from_document(cls, document, version=None):
+        """Catalog from the data/packages.json layout
+
+        Entries with a `category` are recommendable. They also carry `modelClass`,
+        their output index in the model, and may set `sku` (API name, defaults to
+        `name`) and `kuota` (defaults to the compacted `quota`).
+        """
+        if not isinstance(document, dict):
+            raise CatalogError("Catalog must be a JSON object of section groups")
+
+        by_class = {}
+        unlisted = set()
+        for group in SECTION_GROUPS:
+            for section in document.get(group, []):
+                for entry in section.get('packages', []):
+                    if 'category' not in entry:
+                        continue  # Listed on the website only
+                    try:
+                        model_class = int(entry['modelClass'])
+                        package = {
+                            'name': entry.get('sku') or entry['name'],
+                            'kuota': entry.get('kuota') or compact_quota(entry['quota']),
+                            'harga': parse_price(entry['price']),
+                            'category': entry['category']
+                        }
+                    except (CatalogError, KeyError, TypeError, ValueError) as e:
+                        raise CatalogError(f"Invalid package {entry!r} in {section.get('sectionTitle')!r}: {e}") from e
+                    if model_class in by_class:
+                        raise CatalogError(f"modelClass {model_class} is used by both "
+                                           f"{by_class[model_class]['name']!r} and {package['name']!r}")
+                    by_class[model_class] = package
+                    if group == 'unlisted':
+                        unlisted.add(package['name'])
+
+        if not by_class:
+            raise CatalogError("Catalog has no recommendable packages")
+        if sorted(by_class) != list(range(len(by_class))):
+            raise CatalogError(f"modelClass values must be 0..{len(by_class) - 1} without gaps")
+        return cls([by_class[model_class] for model_class in range(len(by_class))], version, unlisted)
+
+
+def load_catalog(path):
+    """Parse and index the catalog file at `path`"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        document = json.loads(data.decode('utf-8'))
+    except (OSError, ValueError) as e:
+        raise CatalogError(f"Can't read catalog {path}: {e}") from e
+    return PackageCatalog.from_document(document, version=hashlib.sha256(data).hexdigest()[:16])
+
+
+class CatalogFile:
+    """The catalog in one file, reloaded when the file changes
+
+    current() re-stats the file at most once per check_interval seconds, so the
+    check is lazy and works the same in every process. A file that fails to
+    parse is reported and the previous catalog stays in use.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, check_interval=2.0):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self.catalog = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.load_error = None
+        self._stamp = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def current(self):
+        """The catalog to serve; raises CatalogError only if no version ever loaded"""
+        catalog = self.catalog
+        if catalog is not None and time.monotonic() < self._next_check:
+            return catalog
+        with self._lock:
+            if self.catalog is None or time.monotonic() >= self._next_check:
+                self._next_check = time.monotonic() + self.check_interval
+                stamp = self._file_stamp()
+                if self.catalog is None or stamp != self._stamp:
+                    self._load(stamp)
+            if self.catalog is None:
+                raise CatalogError(self.load_error)
+            return self.catalog
+
+    def _load(self, stamp):
+        try:
+            catalog = load_catalog(self.path)
+        except CatalogError as e:
+            self.load_error = str(e)
+            # Don't retry an unchanged broken file on every check
+            self._stamp = stamp
+            logger.error("Error loading package catalog: %s", e)
+            return
+        if self.catalog is not None:
+            self.reloads += 1
+            logger.info("Package catalog reloaded: %d packages, version %s", len(catalog), catalog.version)
+        self.catalog = catalog
+        self.loaded_at = time.time()
+        self.load_error = None
+        self._stamp = stamp
+
+    def stats(self):
+        catalog = self.catalog
+        return {
+            'path': self.path,
+            'version': catalog.version if catalog is not None else None,
+            'packages': len(catalog) if catalog is not None else 0,
+            'categories': len(catalog.by_category) if catalog is not None else 0,
+            'reloads': self.reloads,
+            'load_error': self.load_error
+        }
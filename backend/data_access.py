@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+SQLite data access for users and survey responses
+Keeps one WAL-mode connection per thread and retries work that hits a busy database
+"""
+
+import contextlib
+import os
+import random
+import sqlite3
+import threading
+import time
+
+
+class Database:
+    """Per-thread SQLite connections tuned for many concurrent readers and one writer"""
+
+    # Applied to every new connection
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',    # readers no longer wait for the writer
+        'PRAGMA synchronous=NORMAL',  # fsync at checkpoints only, still durable with WAL
+        'PRAGMA cache_size=-16384',   # 16 MB page cache per connection
+        'PRAGMA temp_store=MEMORY'
+    )
+
+    def __init__(self, path, busy_timeout=5.0, max_retries=5, statement_cache_size=128):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+        self.statement_cache_size = statement_cache_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.connects = 0
+        self.retries = 0
+        self.busy_failures = 0
+
+    def connection(self):
+        """This thread's connection, opened on first use"""
+        local = self._local
+        # A connection inherited through fork() must not be used by the child
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self._connect()
+            local.pid = os.getpid()
+        return local.conn
+
+    def _connect(self):
+        # isolation_level=None: transactions are only opened by transaction()
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            cached_statements=self.statement_cache_size
+        )
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma).fetchall()
+        with self._lock:
+            self.connects += 1
+        return conn
+
+    @staticmethod
+    def _is_busy(error):
+        message = str(error).lower()
+        return 'locked' in message or 'busy' in message
+
+    def run(self, work):
+        """Return work(conn), retrying with backoff while the database is busy"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return work(self.connection())
+            except sqlite3.OperationalError as e:
+                if not self._is_busy(e):
+                    raise
+                with self._lock:
+                    if attempt == self.max_retries:
+                        self.busy_failures += 1
+                        raise
+                    self.retries += 1
+            time.sleep(min(0.5, 0.01 * 2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def transaction(self, work):
+        """Run work(conn) as one write transaction; the whole unit is retried when busy"""
+        def attempt(conn):
+            # IMMEDIATE takes the write lock up front, so the transaction can't
+            # fail halfway when upgrading from a read
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(conn)
+                conn.execute('COMMIT')
+                return result
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+
+        return self.run(attempt)
+
+    def query_one(self, sql, params=()):
+        return self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    def close(self):
+        """Close this thread's connection"""
+        local = self._local
+        if getattr(local, 'pid', None) == os.getpid():
+            local.conn.close()
+        local.pid = None
+        local.conn = None
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'connections_opened': self.connects,
+            'busy_retries': self.retries,
+            'busy_failures': self.busy_failures
+        }
+
+
+class UserStore:
+    """Queries for users and their survey responses"""
+
+    USER_FIELDS = ('id', 'name', 'email', 'phone', 'package')
+    PROFILE_FIELDS = USER_FIELDS + ('created_at', 'survey_count')
+    SUBMISSION_FIELDS = ('submission_id', 'user_id', 'created_at')
+
+    SELECT_USER_BY_ID = 'SELECT id, name, email, phone, package FROM users WHERE id = ?'
+    SELECT_USER_ID_BY_EMAIL = 'SELECT id FROM users WHERE email = ?'
+    SELECT_USER_BY_CREDENTIALS = '''
+        SELECT id, name, email, phone, package
+        FROM users
+        WHERE email = ? AND password = ?
+    '''
+    # survey_count is maintained by triggers, see migrations.add_survey_count
+    SELECT_PROFILE = '''
+        SELECT id, name, email, phone, package, created_at, survey_count
+        FROM users
+        WHERE id = ?
+    '''
+    INSERT_USER = '''
+        INSERT INTO users (name, email, password, phone)
+        VALUES (?, ?, ?, ?)
+    '''
+    SELECT_SUBMISSION = '''
+        SELECT submission_id, user_id, created_at
+        FROM survey_responses
+        WHERE submission_id = ?
+    '''
+    INSERT_SURVEY = '''
+        INSERT INTO survey_responses (submission_id, user_id, survey_data, recommendations)
+        VALUES (?, ?, ?, ?)
+    '''
+    UPDATE_LAST_SURVEY = '''
+        UPDATE users SET last_survey = ?, package = ?
+        WHERE id = ?
+    '''
+    # Keyset pagination, so each page is an index range scan however deep into the table it is
+    SELECT_SURVEYS_AFTER = '''
+        SELECT id, submission_id, user_id, survey_data
+        FROM survey_responses
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    '''
+    UPDATE_RESCORED = '''
+        UPDATE survey_responses
+        SET rescored_recommendations = ?, rescored_model_version = ?, rescored_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    '''
+
+    def __init__(self, database, timer=None):
+        self.db = database
+        # timer(query) returns a context manager around each call, e.g. a latency histogram
+        self.timer = timer or (lambda query: contextlib.nullcontext())
+
+    def register(self, name, email, password, phone):
+        """Create a user and return it, or None if the email is already registered"""
+        def insert(conn):
+            # Check and insert in one write transaction so concurrent sign-ups can't race
+            if conn.execute(self.SELECT_USER_ID_BY_EMAIL, (email,)).fetchone():
+                return None
+            user_id = conn.execute(self.INSERT_USER, (name, email, password, phone)).lastrowid
+            return conn.execute(self.SELECT_USER_BY_ID, (user_id,)).fetchone()
+
+        with self.timer('register'):
+            return self._as_dict(self.USER_FIELDS, self.db.transaction(insert))
+
+    def authenticate(self, email, password):
+        """The user with these credentials, or None"""
+        with self.timer('authenticate'):
+            return self._as_dict(self.USER_FIELDS, self.db.query_one(self.SELECT_USER_BY_CREDENTIALS, (email, password)))
+
+    def record_survey(self, submission_id, user_id, survey_json, recommendations_json, package):
+        """Store a survey response and make it the user's latest"""
+        self.record_surveys([(submission_id, user_id, survey_json, recommendations_json, package)])
+
+    def record_surveys(self, submissions):
+        """Store (submission_id, user_id, survey_json, recommendations_json, package) rows in one transaction"""
+        # Only each user's last submission decides their last_survey and package
+        latest = {}
+        for submission_id, user_id, survey_json, recommendations_json, package in submissions:
+            latest[user_id] = (survey_json, package, user_id)
+
+        def insert(conn):
+            conn.executemany(self.INSERT_SURVEY, [submission[:4] for submission in submissions])
+            conn.executemany(self.UPDATE_LAST_SURVEY, list(latest.values()))
+
+        with self.timer('record_surveys'):
+            self.db.transaction(insert)
+
+    def surveys_after(self, after_id, limit):
+        """Up to `limit` (id, submission_id, user_id, survey_json) rows with id > after_id, in id order"""
+        with self.timer('surveys_after'):
+            return self.db.run(lambda conn: conn.execute(self.SELECT_SURVEYS_AFTER, (after_id, limit)).fetchall())
+
+    def record_rescored(self, results):
+        """Store (recommendations_json, model_version, survey_id) re-scoring results in one transaction"""
+        with self.timer('record_rescored'):
+            self.db.transaction(lambda conn: conn.executemany(self.UPDATE_RESCORED, results))
+
+    def submission(self, submission_id):
+        """submission_id, user_id and created_at of a stored survey response, or None"""
+        with self.timer('submission'):
+            return self._as_dict(self.SUBMISSION_FIELDS, self.db.query_one(self.SELECT_SUBMISSION, (submission_id,)))
+
+    def profile(self, user_id):
+        """Profile fields plus survey_count, or None for an unknown user"""
+        with self.timer('profile'):
+            return self._as_dict(self.PROFILE_FIELDS, self.db.query_one(self.SELECT_PROFILE, (user_id,)))
+
+    @staticmethod
+    def _as_dict(fields, row):
+        return dict(zip(fields, row)) if row else None
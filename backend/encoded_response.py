@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pre-encoded HTTP response bodies
+Serializes and compresses a body once, then answers each request with the best
+encoding the client accepts or a 304 when its cached copy is still current
+"""
+
+import gzip
+import hashlib
+import zlib
+
+# Preferred first when the client rates several encodings equally
+ENCODINGS = ('gzip', 'deflate', 'identity')
+
+
+def accepted_encodings(accept_encoding):
+    """{encoding: q} from an Accept-Encoding header value"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding, available=ENCODINGS):
+    """Best of `available` for this Accept-Encoding header; identity unless it is refused"""
+    accepted = accepted_encodings(accept_encoding)
+    best, best_q = 'identity', 0.0
+    for encoding in available:
+        if encoding == 'identity':
+            q = accepted.get('identity', accepted.get('*', 1.0))
+        else:
+            q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def etag_matches(if_none_match, etags):
+    """True when an If-None-Match header names one of `etags` (weak comparison, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+
+class EncodedBody:
+    """One response body with gzip and deflate variants and a strong ETag per variant"""
+
+    def __init__(self, body, content_type='application/json', cache_control='no-cache', headers=None):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.headers = dict(headers or {})
+        # mtime=0 keeps the gzip bytes, and so the ETag, identical across processes
+        self.variants = {
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+            'deflate': zlib.compress(body, 9)
+        }
+        # Each encoding is its own representation, so each needs its own strong tag
+        self.etags = {
+            'identity': f'"{digest}"',
+            'gzip': f'"{digest}-gzip"',
+            'deflate': f'"{digest}-deflate"'
+        }
+        self._all_etags = frozenset(self.etags.values())
+
+    @property
+    def etag(self):
+        return self.etags['identity']
+
+    def respond(self, accept_encoding=None, if_none_match=None):
+        """(status, headers, body) for a GET carrying these request headers"""
+        encoding = choose_encoding(accept_encoding)
+        headers = dict(self.headers)
+        headers['ETag'] = self.etags[encoding]
+        headers['Cache-Control'] = self.cache_control
+        headers['Vary'] = 'Accept-Encoding'
+
+        # Any variant's tag proves the client has the current body
+        if etag_matches(if_none_match, self._all_etags):
+            return 304, headers, b''
+
+        headers['Content-Type'] = self.content_type
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, self.variants[encoding]
+
+    def stats(self):
+        return {encoding: len(body) for encoding, body in self.variants.items()}
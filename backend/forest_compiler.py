@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Compiled RandomForest inference
+Flattens a fitted sklearn forest into NumPy node arrays and evaluates all
+trees for a batch of rows in lock-step, without sklearn's per-call overhead
+"""
+
+import numpy as np
+
+
+class ForestCompileError(Exception):
+    """Raised when an estimator cannot be compiled into node arrays"""
+
+
+class CompiledForest:
+    """All trees of a forest as one set of flat node arrays
+
+    Traversal advances every (row, tree) pair one level per vectorized step
+    until all of them sit on a leaf.
+    """
+
+    # Arrays that fully describe a compiled forest, e.g. for model_artifact
+    ARRAY_NAMES = ('feature', 'threshold', 'children', 'is_leaf', 'value', 'roots')
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features, classes, is_leaf=None):
+        self.feature = feature
+        self.threshold = threshold
+        # children[2 * node + went_left]: right child at even, left child at odd slots
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.classes_ = classes
+        self.is_leaf = is_leaf if is_leaf is not None else self.left == np.arange(len(feature))
+
+    @property
+    def left(self):
+        return self.children[1::2]
+
+    @property
+    def right(self):
+        return self.children[0::2]
+
+    @property
+    def n_features_in_(self):
+        return self.n_features
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted RandomForestClassifier (or a single DecisionTreeClassifier)"""
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None and hasattr(model, 'tree_'):
+            estimators = [model]
+        if not estimators or not hasattr(model, 'classes_'):
+            raise ForestCompileError(f"{type(model).__name__} is not a fitted tree classifier")
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ForestCompileError("Multi-output forests are not supported")
+
+        n_classes = len(model.classes_)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point back to themselves; is_leaf is derived from that
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+            threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+            left = np.where(is_leaf, node_ids, tree.children_left).astype(np.intp) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right).astype(np.intp) + offset
+
+            # Same per-leaf normalisation as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            value = value / normalizer
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.stack([np.concatenate(rights), np.concatenate(lefts)], axis=1).ravel(),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            n_features=getattr(model, 'n_features_in_', None),
+            classes=np.asarray(model.classes_)
+        )
+
+    def apply(self, X):
+        """Leaf node index of every (row, tree) pair, shape (N, n_trees)"""
+        # sklearn evaluates trees on float32 input
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+
+        leaves = np.tile(self.roots, n_rows)
+        active = np.arange(leaves.size)
+        row_offsets = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        current = leaves.copy()
+
+        # Step every active (row, tree) pair one level down per pass and drop
+        # pairs from the active set as soon as they reach a leaf
+        while active.size:
+            go_left = flat_X[row_offsets + self.feature[current]] <= self.threshold[current]
+            current = self.children[current * 2 + go_left]
+            at_leaf = self.is_leaf[current]
+            if at_leaf.any():
+                leaves[active[at_leaf]] = current[at_leaf]
+                still_active = ~at_leaf
+                active = active[still_active]
+                row_offsets = row_offsets[still_active]
+                current = current[still_active]
+
+        return leaves.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X):
+        """Mean of the per-tree leaf class distributions, like RandomForestClassifier"""
+        X = np.asarray(X)
+        if X.ndim != 2 or (self.n_features is not None and X.shape[1] != self.n_features):
+            raise ValueError(f"Expected input of shape (n, {self.n_features}), got {X.shape}")
+
+        leaves = self.apply(X)
+        proba = np.zeros((X.shape[0], self.value.shape[1]))
+        for tree in range(self.n_trees):
+            proba += self.value[leaves[:, tree]]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def max_difference(self, model, X):
+        """Largest absolute probability difference from the sklearn model on X"""
+        expected = model.predict_proba(X)
+        return float(np.max(np.abs(self.predict_proba(X) - expected))) if len(X) else 0.0
+
+
+def compile_and_verify(model, X, tolerance=1e-9):
+    """Compile `model` and check it against sklearn on X; returns (forest, max_difference)"""
+    forest = CompiledForest.from_sklearn(model)
+    difference = forest.max_difference(model, X)
+    if difference > tolerance:
+        raise ForestCompileError(
+            f"Compiled forest differs from sklearn by {difference:.3g} (tolerance {tolerance:g})")
+    return forest, difference
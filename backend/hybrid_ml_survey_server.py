@@ -5,17 +5,55 @@ Processes survey data through ML model and provides survey-based recommendations
 """
 
 import json
+import argparse
+import codecs
+import logging
+import asyncio
 import http.server
-import socketserver
+import select
+import socket
 import urllib.parse
-import sqlite3
 from datetime import datetime
 import os
 import sys
 import pickle
+import itertools
+import bisect
+import hashlib
+import hmac
+import re
+import collections
+import signal
+import atexit
+import uuid
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 import numpy as np
 import types
 
+from prefork import PooledTCPServer, PreforkServer
+from async_http import AsyncHTTPServer, BoundedExecutor, FileBody
+from micro_batch import InferenceQueueFull, MicroBatchScheduler
+from caching import LRUCache
+from data_access import Database, UserStore
+from metrics import MetricsRegistry
+from structured_logging import REQUEST_ID, begin_request, configure_logging, debug_sampled, shutdown_logging
+from migrations import migrate
+from write_behind import SurveyQueueFull, SurveyWriteQueue
+from session_tokens import InvalidToken, TokenSigner, bearer_token
+from encoded_response import EncodedBody
+from catalog import DEFAULT_CATALOG_PATH, CatalogError, CatalogFile
+from static_files import StaticFiles
+from forest_compiler import CompiledForest, compile_and_verify
+from model_artifact import ArtifactError, artifact_path, is_artifact, load_artifact, write_artifact
+
+logger = logging.getLogger('sphinx.server')
+access_logger = logging.getLogger('sphinx.access')
+
 # Create compatibility layer for older sklearn module paths
 try:
     from sklearn.ensemble import RandomForestClassifier
@@ -30,74 +68,152 @@ try:
     sklearn_tree_classes.DecisionTreeClassifier = DecisionTreeClassifier
     sys.modules['sklearn.tree._classes'] = sklearn_tree_classes
 
-    print("Sklearn compatibility layer created successfully")
+    logger.debug("Sklearn compatibility layer created successfully")
 except ImportError as e:
-    print(f"Warning: Could not create sklearn compatibility layer: {e}")
+    logger.warning("Could not create sklearn compatibility layer: %s", e)
+
+# Request metrics for /api/metrics; pre-fork workers serve the sum over all of them, see run_server()
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.histogram(
+    'sphinx_stage_seconds', 'Time spent in each stage of request handling', ('stage',))
+SQLITE_SECONDS = METRICS.histogram(
+    'sphinx_sqlite_query_seconds', 'SQLite calls made by the auth, survey and profile handlers', ('query',))
+REQUEST_SECONDS = METRICS.histogram(
+    'sphinx_http_request_duration_seconds', 'Time from parsed request to response, per route', ('route', 'method'))
+REQUESTS_TOTAL = METRICS.counter(
+    'sphinx_http_requests_total', 'Responses sent, per route and status', ('route', 'method', 'status'))
+REQUEST_ERRORS_TOTAL = METRICS.counter(
+    'sphinx_http_request_errors_total', 'Responses with a 5xx status, per route', ('route',))
 
 # Database setup
 DB_NAME = 'telco_users.db'
 
+# Per-thread pooled connections; all queries go through USER_STORE
+DATABASE = Database(DB_NAME)
+USER_STORE = UserStore(DATABASE, timer=SQLITE_SECONDS.time)
+
+# Set by enable_write_behind(); None means submissions are written synchronously
+SURVEY_QUEUE = None
+
+# Set by enable_profile_cache(); None means every profile read goes to SQLite
+PROFILE_CACHE = None
+
+# Frontend files for GET requests outside /api/, see enable_static_files()
+STATIC_FILES = StaticFiles(os.getcwd())
+
+def make_token_signer():
+    """Session token signer keyed by SECRET_KEY, valid for SESSION_TIMEOUT seconds
+
+    Without SECRET_KEY the key is random and every token dies with the process;
+    the server only starts that way with --ephemeral-secret, see parse_args().
+    """
+    # Created at import, before any fork, so pre-fork workers share even a random key
+    secret = os.environ.get('SECRET_KEY') or secrets.token_bytes(32)
+    return TokenSigner(secret, ttl=int(os.environ.get('SESSION_TIMEOUT', 3600)))
+
+TOKEN_SIGNER = make_token_signer()
+
 def init_database():
-    """Initialize SQLite database for user data"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            phone TEXT,
-            package TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_survey TEXT
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS survey_responses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            survey_data TEXT,
-            recommendations TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
-
-# ISP Packages Data
-PACKAGES = [
-    {"name": "Sphinx Stable 20GB", "kuota": "20GB", "harga": 40000, "category": "stable"},
-    {"name": "Sphinx Stable 50GB", "kuota": "50GB", "harga": 75000, "category": "stable"},
-    {"name": "Sphinx Stable 100GB", "kuota": "100GB", "harga": 120000, "category": "stable"},
-    {"name": "Sphinx Hemat 5GB", "kuota": "5GB", "harga": 25000, "category": "hemat"},
-    {"name": "Sphinx Hemat 10GB", "kuota": "10GB", "harga": 35000, "category": "hemat"},
-    {"name": "Sphinx Hemat 20GB", "kuota": "20GB", "harga": 45000, "category": "hemat"},
-    {"name": "Sphinx Hemat 30GB", "kuota": "30GB", "harga": 55000, "category": "hemat"},
-    {"name": "Sphinx Unlimited", "kuota": "Unlimited", "harga": 250000, "category": "unlimited"},
-    {"name": "Sphinx Call Pro", "kuota": "300 Menit", "harga": 50000, "category": "call"},
-    {"name": "Sphinx Call Flex", "kuota": "150 Menit", "harga": 30000, "category": "call"},
-    {"name": "Sphinx Call Lite", "kuota": "60 Menit", "harga": 15000, "category": "call"},
-    {"name": "Sphinx Social 10GB", "kuota": "10GB", "harga": 20000, "category": "social"},
-    {"name": "Sphinx Stream 50GB", "kuota": "50GB", "harga": 70000, "category": "stream"},
-    {"name": "Sphinx Stream 100GB", "kuota": "100GB", "harga": 120000, "category": "stream"},
-    {"name": "Sphinx Work Connect 30GB", "kuota": "30GB", "harga": 55000, "category": "work"},
-    {"name": "Sphinx Gamer Pro 40GB", "kuota": "40GB", "harga": 65000, "category": "gaming"},
-    {"name": "Sphinx Gamer Max 80GB", "kuota": "80GB", "harga": 110000, "category": "gaming"},
-    {"name": "Sphinx IoT Home 20GB", "kuota": "20GB", "harga": 30000, "category": "iot"},
-    {"name": "Sphinx IoT Fiber 30 Mbps", "kuota": "Fiber IoT", "harga": 150000, "category": "iot"},
-    {"name": "Sphinx Global Lite", "kuota": "1GB", "harga": 75000, "category": "roaming"},
-    {"name": "Sphinx Global Pass", "kuota": "3GB", "harga": 150000, "category": "roaming"},
-    {"name": "Sphinx Roam Max", "kuota": "10GB", "harga": 350000, "category": "roaming"}
-]
+    """Initialize SQLite database for user data, upgrading older files in place"""
+    migrate(DATABASE)
+
+def enable_write_behind(max_queue=10000, batch_size=256, flush_interval_ms=50.0):
+    """Acknowledge survey submissions immediately and store them in group commits"""
+    global SURVEY_QUEUE
+    SURVEY_QUEUE = SurveyWriteQueue(
+        USER_STORE,
+        max_queue=max_queue,
+        batch_size=batch_size,
+        flush_interval_ms=flush_interval_ms,
+        on_written=lambda rows: invalidate_profiles(row[1] for row in rows)
+    )
+    atexit.register(flush_write_behind)
+
+def enable_profile_cache(max_entries=10000, ttl=30.0):
+    """Serve repeat /api/user/<id> reads from memory until a write invalidates them"""
+    global PROFILE_CACHE
+    PROFILE_CACHE = LRUCache(max_entries=max_entries, ttl=ttl)
+
+def enable_static_files(root='.', max_age=3600, cache_entries=512, cache_max_file=128 * 1024):
+    """Serve the frontend from `root`: small files from memory, large ones with sendfile()"""
+    global STATIC_FILES
+    STATIC_FILES = StaticFiles(root, max_age=max_age, cache_entries=cache_entries, cache_max_file=cache_max_file)
+
+def enable_keep_alive(idle_timeout=75.0, max_requests=1000):
+    """HTTP/1.1 persistent connections: close after idle_timeout seconds or max_requests responses"""
+    HybridRequestHandler.idle_timeout = idle_timeout
+    HybridRequestHandler.max_requests_per_connection = max_requests
+
+def invalidate_profiles(user_ids):
+    """Drop cached profiles after their users or survey responses changed"""
+    if PROFILE_CACHE is None:
+        return
+    for user_id in user_ids:
+        # Keys are the ints from parse_user_id; SQLite coerces '3' to 3 the same way
+        try:
+            PROFILE_CACHE.invalidate(int(user_id))
+        except (TypeError, ValueError):
+            pass
+
+def flush_write_behind():
+    """Write everything still queued; called on every shutdown path"""
+    if SURVEY_QUEUE is not None:
+        SURVEY_QUEUE.close()
+
+def start_worker():
+    """Per-process setup in a freshly forked pre-fork worker"""
+    METRICS.start_publishing()
+    ENGINE_REGISTRY.start_model_watcher()
+
+def shutdown_worker():
+    """Finish queued predictions, flush queued survey writes, metrics, then queued log lines, before a pre-fork worker exits"""
+    ENGINE_REGISTRY.close_scheduler()
+    flush_write_behind()
+    METRICS.publish()
+    shutdown_logging()
+
+# ISP packages, shared with the website through data/packages.json
+CATALOG = CatalogFile()
+
+def current_catalog():
+    """Indexed catalog of recommendable packages, reloaded when its file changes"""
+    return CATALOG.current()
+
+def enable_catalog(path, check_interval=2.0):
+    """Serve the catalog from `path`; fails fast if it can't be loaded"""
+    global CATALOG
+    CATALOG = CatalogFile(path, check_interval=check_interval)
+    catalog = CATALOG.current()
+    logger.info("Package catalog: %d packages from %s", len(catalog), CATALOG.path)
+
+def content_fingerprint(data):
+    """Return a short SHA-256 fingerprint of a file's contents"""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def file_stamp(path):
+    """[size, mtime in ns] of a file, a cheap stand-in for its fingerprint"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
 
 class FeatureEncoder:
     """Encodes survey data into features compatible with ML model"""
 
+    N_FEATURES = 17
+
+    # Feature vector used when a survey cannot be encoded
+    DEFAULT_FEATURES = [5, 1, 3, 1, 1, 3, 3, 3, 2, 0] + [0]*7
+
+    # Usage answers, in the order of the 7 binary usage features
+    USAGE_ANSWERS = (
+        'Gaming online',
+        'Streaming video (YouTube, Netflix, dll.)',
+        'Browsing & media sosial',
+        'Video conference (Zoom, Teams, dll.)',
+        'Download & upload file besar',
+        'Smart home / IoT',
+        'Lainnya'
+    )
+
     def __init__(self):
         # Feature mappings for encoding
         self.phone_model_mapping = {
@@ -178,20 +294,28 @@ class FeatureEncoder:
             'Tidak': 0
         }
 
+    def sample_feature_matrix(self, n_rows, seed=0):
+        """Random feature rows drawn from the answer vocabularies, for model checks"""
+        rng = np.random.default_rng(seed)
+        columns = [
+            self.phone_model_mapping, self.gender_mapping, self.reason_mapping,
+            self.call_frequency_mapping, self.wifi_mapping, self.housing_mapping,
+            self.budget_mapping, self.quota_mapping, self.preference_mapping,
+            self.roaming_mapping
+        ]
+        matrix = np.empty((n_rows, self.N_FEATURES), dtype=np.int64)
+        for column, mapping in enumerate(columns):
+            matrix[:, column] = rng.choice(sorted(set(mapping.values())), size=n_rows)
+        matrix[:, len(columns):] = rng.integers(0, 2, size=(n_rows, self.N_FEATURES - len(columns)))
+        matrix[0] = self.DEFAULT_FEATURES
+        return matrix
+
     def encode_usage_features(self, usage_list):
         """Encode usage features into binary"""
         if isinstance(usage_list, str):
             usage_list = [usage_list]
 
-        usage_features = {
-            'Gaming online': 0,
-            'Streaming video (YouTube, Netflix, dll.)': 0,
-            'Browsing & media sosial': 0,
-            'Video conference (Zoom, Teams, dll.)': 0,
-            'Download & upload file besar': 0,
-            'Smart home / IoT': 0,
-            'Lainnya': 0
-        }
+        usage_features = dict.fromkeys(self.USAGE_ANSWERS, 0)
 
         for usage in usage_list:
             if usage in usage_features:
@@ -199,72 +323,125 @@ class FeatureEncoder:
 
         return list(usage_features.values())
 
-    def encode_survey_data(self, survey_data):
-        """Convert survey data to feature vector for ML model"""
-        try:
-            # Basic features
-            phone_model = survey_data.get('phone_model', 'Lainnya')
-            gender = survey_data.get('gender', 'Laki-laki')
-            reason = survey_data.get('reason', 'Mencari internet yang stabil')
-            call_frequency = survey_data.get('call_frequency', 'Jarang')
-            wifi = survey_data.get('wifi', 'Tidak')
-            housing = survey_data.get('housing', 'Rumah pribadi')
-            budget = survey_data.get('budget', 'Rp.50.000-Rp100.000')
-            quota = survey_data.get('quota', '25-50 GB')
-            preference = survey_data.get('preference', 'Standar')
-            roaming = survey_data.get('roaming', 'Tidak')
-            usage = survey_data.get('usage', [])
+    def feature_values(self, survey_data):
+        """Build the 17 encoded feature values for one survey"""
+        # Basic features
+        phone_model = survey_data.get('phone_model', 'Lainnya')
+        gender = survey_data.get('gender', 'Laki-laki')
+        reason = survey_data.get('reason', 'Mencari internet yang stabil')
+        call_frequency = survey_data.get('call_frequency', 'Jarang')
+        wifi = survey_data.get('wifi', 'Tidak')
+        housing = survey_data.get('housing', 'Rumah pribadi')
+        budget = survey_data.get('budget', 'Rp.50.000-Rp100.000')
+        quota = survey_data.get('quota', '25-50 GB')
+        preference = survey_data.get('preference', 'Standar')
+        roaming = survey_data.get('roaming', 'Tidak')
+        usage = survey_data.get('usage', [])
+
+        # Encode categorical features
+        features = []
 
-            # Encode categorical features
-            features = []
+        # Phone model (high importance for tech_doc requirement)
+        features.append(self.phone_model_mapping.get(phone_model, 4))
 
-            # Phone model (high importance for tech_doc requirement)
-            features.append(self.phone_model_mapping.get(phone_model, 4))
+        # Gender
+        features.append(self.gender_mapping.get(gender, 1))
 
-            # Gender
-            features.append(self.gender_mapping.get(gender, 1))
+        # Reason (need/importance)
+        features.append(self.reason_mapping.get(reason, 2))
 
-            # Reason (need/importance)
-            features.append(self.reason_mapping.get(reason, 2))
+        # Call frequency
+        features.append(self.call_frequency_mapping.get(call_frequency, 1))
 
-            # Call frequency
-            features.append(self.call_frequency_mapping.get(call_frequency, 1))
+        # WiFi availability
+        features.append(self.wifi_mapping.get(wifi, 0))
 
-            # WiFi availability
-            features.append(self.wifi_mapping.get(wifi, 0))
+        # Housing type
+        features.append(self.housing_mapping.get(housing, 2))
 
-            # Housing type
-            features.append(self.housing_mapping.get(housing, 2))
+        # Budget (important factor)
+        features.append(self.budget_mapping.get(budget, 3))
 
-            # Budget (important factor)
-            features.append(self.budget_mapping.get(budget, 3))
+        # Expected quota
+        features.append(self.quota_mapping.get(quota, 3))
 
-            # Expected quota
-            features.append(self.quota_mapping.get(quota, 3))
+        # Preference
+        features.append(self.preference_mapping.get(preference, 2))
 
-            # Preference
-            features.append(self.preference_mapping.get(preference, 2))
+        # Roaming needs
+        features.append(self.roaming_mapping.get(roaming, 0))
 
-            # Roaming needs
-            features.append(self.roaming_mapping.get(roaming, 0))
+        # Usage features (binary)
+        usage_features = self.encode_usage_features(usage)
+        features.extend(usage_features)
 
-            # Usage features (binary)
-            usage_features = self.encode_usage_features(usage)
-            features.extend(usage_features)
+        return features
 
+    def encode_survey_data(self, survey_data):
+        """Convert survey data to feature vector for ML model"""
+        try:
             # Convert to numpy array and reshape for model
-            feature_vector = np.array(features).reshape(1, -1)
+            with STAGE_SECONDS.time('encode'):
+                feature_vector = np.array(self.feature_values(survey_data)).reshape(1, -1)
 
             return feature_vector
 
         except Exception as e:
-            print(f"Error encoding survey data: {e}")
+            logger.error("Error encoding survey data: %s", e)
             # Return default feature vector if encoding fails
-            return np.array([5, 1, 3, 1, 1, 3, 3, 3, 2, 0] + [0]*7).reshape(1, -1)
+            return np.array(self.DEFAULT_FEATURES).reshape(1, -1)
+
+    def encode_batch(self, surveys):
+        """Encode many surveys straight into one (N, 17) feature matrix"""
+        matrix = np.empty((len(surveys), self.N_FEATURES), dtype=np.int64)
+
+        with STAGE_SECONDS.time('encode'):
+            for row, survey_data in enumerate(surveys):
+                try:
+                    matrix[row] = self.feature_values(survey_data)
+                except Exception as e:
+                    logger.error("Error encoding survey data: %s", e)
+                    matrix[row] = self.DEFAULT_FEATURES
+
+        return matrix
 
 class WeightingLogic:
     """Implements weighting logic for recommendations as per tech_doc.txt"""
 
+    # Upper bound of each budget answer in Rupiah
+    BUDGET_LIMITS = {
+        "< Rp25.000": 25000,
+        "Rp25.000–Rp50.000": 50000,
+        "Rp.50.000-Rp100.000": 100000,
+        "Rp.100.000–Rp250.000": 250000,
+        "> Rp250.000": 500000
+    }
+
+    CATEGORY_USAGE_MATCH = {
+        'gaming': ['Gaming online'],
+        'stream': ['Streaming video (YouTube, Netflix, dll.)'],
+        'work': ['Video conference (Zoom, Teams, dll.)'],
+        'social': ['Browsing & media sosial'],
+        'call': ['Download & upload file besar'],  # Assumed
+        'iot': ['Smart home / IoT']
+    }
+
+    REASON_CATEGORY_MAP = {
+        'Mencari internet yang stabil': ['stable', 'work'],
+        'Mencari internet yang murah': ['hemat'],
+        'Mencari internet yang cepat': ['stream', 'gaming', 'stable'],
+        'Mencari kuota besar': ['unlimited', 'stream', 'gaming'],
+        'Mencari paket telepon': ['call']
+    }
+
+    PREFERENCE_CATEGORY_MAP = {
+        'Hemat/entry-level': ['hemat', 'call'],
+        'Standar': ['stable', 'social'],
+        'Kuota besar': ['unlimited', 'stream', 'gaming'],
+        'Unlimited': ['unlimited'],
+        'Stabil/cepat': ['stable', 'work', 'stream']
+    }
+
     def __init__(self):
         # Weight factors for different aspects
         self.weights = {
@@ -276,15 +453,7 @@ class WeightingLogic:
 
     def calculate_budget_fit(self, package_price, user_budget):
         """Calculate how well package fits user budget"""
-        budget_map = {
-            "< Rp25.000": 25000,
-            "Rp25.000–Rp50.000": 50000,
-            "Rp.50.000-Rp100.000": 100000,
-            "Rp.100.000–Rp250.000": 250000,
-            "> Rp250.000": 500000
-        }
-
-        max_budget = budget_map.get(user_budget, 100000)
+        max_budget = self.BUDGET_LIMITS.get(user_budget, 100000)
 
         if package_price <= max_budget:
             # Perfect fit if within budget
@@ -301,19 +470,10 @@ class WeightingLogic:
         if isinstance(usage_list, str):
             usage_list = [usage_list]
 
-        category_usage_match = {
-            'gaming': ['Gaming online'],
-            'stream': ['Streaming video (YouTube, Netflix, dll.)'],
-            'work': ['Video conference (Zoom, Teams, dll.)'],
-            'social': ['Browsing & media sosial'],
-            'call': ['Download & upload file besar'],  # Assumed
-            'iot': ['Smart home / IoT']
-        }
-
         match_score = 0.5  # Base score
 
-        if package_category in category_usage_match:
-            required_usage = category_usage_match[package_category]
+        if package_category in self.CATEGORY_USAGE_MATCH:
+            required_usage = self.CATEGORY_USAGE_MATCH[package_category]
             for usage in required_usage:
                 if usage in usage_list:
                     match_score = 1.0
@@ -323,32 +483,16 @@ class WeightingLogic:
 
     def calculate_need_alignment(self, package_category, reason, preference):
         """Calculate alignment with user's stated needs"""
-        reason_category_map = {
-            'Mencari internet yang stabil': ['stable', 'work'],
-            'Mencari internet yang murah': ['hemat'],
-            'Mencari internet yang cepat': ['stream', 'gaming', 'stable'],
-            'Mencari kuota besar': ['unlimited', 'stream', 'gaming'],
-            'Mencari paket telepon': ['call']
-        }
-
-        preference_category_map = {
-            'Hemat/entry-level': ['hemat', 'call'],
-            'Standar': ['stable', 'social'],
-            'Kuota besar': ['unlimited', 'stream', 'gaming'],
-            'Unlimited': ['unlimited'],
-            'Stabil/cepat': ['stable', 'work', 'stream']
-        }
-
         alignment_score = 0.5
 
         # Check reason alignment
-        if reason in reason_category_map:
-            if package_category in reason_category_map[reason]:
+        if reason in self.REASON_CATEGORY_MAP:
+            if package_category in self.REASON_CATEGORY_MAP[reason]:
                 alignment_score += 0.3
 
         # Check preference alignment
-        if preference in preference_category_map:
-            if package_category in preference_category_map[preference]:
+        if preference in self.PREFERENCE_CATEGORY_MAP:
+            if package_category in self.PREFERENCE_CATEGORY_MAP[preference]:
                 alignment_score += 0.2
 
         return min(alignment_score, 1.0)
@@ -375,93 +519,408 @@ class WeightingLogic:
 
         return min(logic_score, 1.0)
 
+class ModelValidationError(Exception):
+    """Raised when a model file cannot be loaded or cannot serve the package catalog"""
+
+class ModelVersion:
+    """One loaded model and its compiled backend, never modified once it serves requests"""
+
+    # Largest batch sent to the compiled forest backend
+    COMPILED_MAX_ROWS = 256
+
+    def __init__(self, number, model, path, fingerprint):
+        self.number = number
+        self.model = model
+        self.path = path
+        self.fingerprint = fingerprint
+        self.format = 'artifact' if is_artifact(path) else 'pickle'
+        self.label = f"v{number}-{fingerprint[:8]}"
+        self.loaded_at = datetime.now().isoformat()
+        self.compiled_model = None
+        self.compiled_max_difference = None
+        self.warmup_time_ms = None
+
+    def active_model(self, n_rows=1):
+        """The compiled forest when available, otherwise the sklearn estimator"""
+        # sklearn's C traversal overtakes the NumPy engine on large batches
+        if self.compiled_model is not None and n_rows <= self.COMPILED_MAX_ROWS:
+            return self.compiled_model
+        return self.model
+
+    def predict_proba(self, feature_matrix):
+        return self.active_model(len(feature_matrix)).predict_proba(feature_matrix)
+
+    def describe(self):
+        return {
+            'version': self.label,
+            'path': self.path,
+            'fingerprint': self.fingerprint,
+            'format': self.format,
+            'loaded_at': self.loaded_at,
+            'inference_backend': 'compiled' if self.compiled_model is not None else 'sklearn',
+            'warmup_time_ms': self.warmup_time_ms
+        }
+
 class MLModelProcessor:
     """Processes survey data through the actual ML model"""
 
+    # Model files in order of preference; an exported artifact next to a pickle
+    # (see export_model_artifact) is tried before the pickle itself
+    MODEL_PATHS = ['model_telco_recommendation_new.pkl', 'model_telco_recommendation.pkl']
+
+    # Previously served versions kept for rollback
+    HISTORY_SIZE = 3
+
+    # (package category, substring of a usage answer, score boost) used when
+    # the model is unavailable
+    FALLBACK_USAGE_BOOSTS = [
+        ('gaming', 'Gaming', 0.2),
+        ('stream', 'Streaming', 0.2),
+        ('work', 'Video conference', 0.2),
+        ('social', 'Browsing', 0.1)
+    ]
+
     def __init__(self):
-        self.model = None
         self.feature_encoder = FeatureEncoder()
         self.weighting_logic = WeightingLogic()
-        self.model_loaded = False
+        self.scheduler = None
+        self.inference_backend = 'auto'
+        # Version used by new requests; replaced as a whole, never mutated
+        self.current = None
+        self.history = collections.deque(maxlen=self.HISTORY_SIZE)
+        self.load_attempted = False
+        self.load_error = None
+        self._version_numbers = itertools.count(1)
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.current.model if self.current is not None else None
+
+    @property
+    def model_loaded(self):
+        return self.current is not None
+
+    @property
+    def model_path(self):
+        return self.current.path if self.current is not None else None
+
+    @property
+    def model_fingerprint(self):
+        return self.current.fingerprint if self.current is not None else None
+
+    @property
+    def compiled_model(self):
+        return self.current.compiled_model if self.current is not None else None
+
+    def set_history_size(self, size):
+        with self._swap_lock:
+            self.history = collections.deque(self.history, maxlen=max(0, size))
+
+    def enable_micro_batching(self, max_batch_size=64, max_wait_ms=2.0, max_queue=1024):
+        """Route single-row predictions through a shared micro-batch scheduler"""
+        self.scheduler = MicroBatchScheduler(
+            self._predict_rows,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue=max_queue
+        )
 
-    def load_model(self):
-        """Load the ML model from pickle file"""
+    def _predict_rows(self, items):
+        # Each item is (version, row); a batch straddling a swap runs once per version
+        rows_by_version = {}
+        for position, (version, row) in enumerate(items):
+            rows_by_version.setdefault(version, []).append(position)
+
+        results = [None] * len(items)
+        for version, positions in rows_by_version.items():
+            probabilities = version.predict_proba(np.asarray([items[position][1] for position in positions]))
+            for position, row_probabilities in zip(positions, probabilities):
+                results[position] = row_probabilities
+        return results
+
+    def pin_version(self):
+        """The version a request uses from start to finish; loads the model on first use"""
+        if self.current is None and not self.load_attempted:
+            self.load_model()
+        return self.current
+
+    def validate_model(self, model):
+        """Raise ModelValidationError unless the model maps encoded surveys onto the catalog"""
+        n_features = FeatureEncoder.N_FEATURES
+        n_packages = len(current_catalog())
+        if not hasattr(model, 'predict_proba'):
+            raise ModelValidationError(f"{type(model).__name__} has no predict_proba")
+        if getattr(model, 'n_features_in_', n_features) != n_features:
+            raise ModelValidationError(f"Model expects {model.n_features_in_} features, encoder produces {n_features}")
+        if hasattr(model, 'classes_') and len(model.classes_) != n_packages:
+            raise ModelValidationError(f"Model has {len(model.classes_)} classes for {n_packages} packages")
+
+        # Call it exactly the way requests will
+        sample = self.feature_encoder.sample_feature_matrix(8)
         try:
-            # Try the new fixed model first
-            model_path = 'model_telco_recommendation_new.pkl'
-            fallback_path = 'model_telco_recommendation.pkl'
-
-            if os.path.exists(model_path):
-                print(f"Loading NEW AI model from {model_path}...")
-                with open(model_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                self.model_loaded = True
-                print(f"SUCCESS: NEW AI model loaded: {type(self.model)}")
-                if hasattr(self.model, 'estimators_'):
-                    print(f"AI Model has {len(self.model.estimators_)} decision trees")
-                if hasattr(self.model, 'n_features_in_'):
-                    print(f"AI Model expects {self.model.n_features_in_} features")
-                return
-
-            elif os.path.exists(fallback_path):
-                print(f"Trying original model from {fallback_path}...")
-                with open(fallback_path, 'rb') as f:
-                    self.model = pickle.load(f)
-                self.model_loaded = True
-                print(f"SUCCESS: Original model loaded: {type(self.model)}")
-            else:
-                print("No ML model file found")
-                self.model_loaded = False
+            probabilities = np.asarray(model.predict_proba(sample))
+        except Exception as e:
+            raise ModelValidationError(f"Model failed on sample surveys: {e}") from e
+        if probabilities.shape != (len(sample), n_packages):
+            raise ModelValidationError(
+                f"Model returned probabilities of shape {probabilities.shape}, expected {(len(sample), n_packages)}")
+
+    def compile_version(self, version):
+        """Attach the compiled forest backend if it reproduces sklearn within 1e-9"""
+        if isinstance(version.model, CompiledForest):
+            # Mapped artifact: compiled and verified at export time
+            version.compiled_model = version.model
+            return
+        if self.inference_backend == 'sklearn':
+            return
 
+        try:
+            sample = self.feature_encoder.sample_feature_matrix(512)
+            forest, difference = compile_and_verify(version.model, sample)
         except Exception as e:
-            print(f"ERROR loading AI model: {e}")
-            self.model_loaded = False
+            logger.warning("Compiled forest backend unavailable, using sklearn: %s", e)
+            return
+
+        version.compiled_model = forest
+        version.compiled_max_difference = difference
+        logger.info("Compiled forest backend ready: %d trees, %d nodes, max difference from sklearn %.2g",
+                    forest.n_trees, forest.n_nodes, difference)
+
+    def warm_version(self, version):
+        """Run single-row and batch predictions before the version takes traffic"""
+        start = time.perf_counter()
+        sample = self.feature_encoder.sample_feature_matrix(64)
+        version.predict_proba(sample[:1])
+        version.predict_proba(sample)
+        version.warmup_time_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def load_pickle(self, path):
+        """Unpickle a model file; returns (model, fingerprint, header)"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        return pickle.loads(data), content_fingerprint(data), None
+
+    def load_artifact(self, path):
+        """Map an exported artifact; returns (forest, fingerprint, header)
+
+        The fingerprint is the source pickle's, so a model keeps its version label
+        whichever format it was loaded from.
+        """
+        forest, header = load_artifact(path)
+        fingerprint = header['metadata'].get('source_fingerprint')
+        if not fingerprint:
+            raise ArtifactError(f"{path} does not record its source model")
+
+        # A pickle deployed after the export must not be shadowed by the old artifact.
+        # Hashing it costs about as much as unpickling, so only do that when its
+        # size or mtime moved since the export.
+        source_path = os.path.join(os.path.dirname(path), header['metadata'].get('source_path', ''))
+        if os.path.isfile(source_path) and file_stamp(source_path) != header['metadata'].get('source_stamp'):
+            with open(source_path, 'rb') as f:
+                if content_fingerprint(f.read()) != fingerprint:
+                    raise ArtifactError(f"stale, {source_path} changed since it was exported")
+        return forest, fingerprint, header
+
+    def model_candidates(self):
+        """Existing model files in the order load_model() tries them"""
+        for path in self.MODEL_PATHS:
+            # Artifacts only hold the compiled forest, which --inference-backend sklearn rules out
+            if self.inference_backend != 'sklearn' and os.path.exists(artifact_path(path)):
+                yield artifact_path(path)
+            if os.path.exists(path):
+                yield path
+
+    @classmethod
+    def model_files(cls):
+        """Every file a model may be loaded from, for change detection"""
+        for path in cls.MODEL_PATHS:
+            yield artifact_path(path)
+            yield path
+
+    def build_version(self, path):
+        """Load, validate, compile and warm a model file without touching the serving version"""
+        start = time.perf_counter()
+        try:
+            model, fingerprint, header = self.load_artifact(path) if is_artifact(path) else self.load_pickle(path)
+        except Exception as e:
+            raise ModelValidationError(f"Cannot load {path}: {e}") from e
+        load_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        self.validate_model(model)
+        version = ModelVersion(next(self._version_numbers), model, path, fingerprint)
+        details = {'model_type': type(model).__name__, 'load_ms': load_ms}
+        if hasattr(model, 'estimators_'):
+            details['trees'] = len(model.estimators_)
+        if isinstance(model, CompiledForest):
+            details.update(trees=model.n_trees, nodes=model.n_nodes, memory_mapped=True)
+        if hasattr(model, 'n_features_in_'):
+            details['features'] = int(model.n_features_in_)
+        logger.info("AI model %s loaded from %s", version.label, path, extra=details)
+
+        self.compile_version(version)
+        if header is not None:
+            version.compiled_max_difference = header['metadata'].get('max_difference')
+        self.warm_version(version)
+        return version
+
+    def activate(self, version):
+        """Serve new requests from `version`; in-flight requests finish on the one they pinned"""
+        with self._swap_lock:
+            previous = self.current
+            if previous is not None and previous is not version:
+                self.history.appendleft(previous)
+            self.current = version
+        return previous
+
+    def find_model_path(self):
+        return next(self.model_candidates(), None)
 
-    def process_survey_through_model(self, survey_data):
-        """Process survey data through ML model and return recommendations"""
-        if not self.model_loaded:
-            self.load_model()
+    def load_model(self):
+        """Load the first model file that passes validation"""
+        with self._load_lock:
+            if self.load_attempted:
+                return self.current
+            self.load_attempted = True
+            self.load_error = None
+
+            for path in self.model_candidates():
+                logger.info("Loading AI model from %s", path)
+                try:
+                    version = self.build_version(path)
+                except ModelValidationError as e:
+                    logger.error("Error loading AI model: %s", e)
+                    self.load_error = str(e)
+                    continue
+
+                if self.load_error:
+                    logger.warning("Serving %s because a preferred model was rejected: %s", path, self.load_error)
+                self.activate(version)
+                return version
+
+            if self.load_error is None:
+                logger.warning("No ML model file found")
+            return None
+
+    def reload_model(self, path=None):
+        """Build a new version off the request path and swap it in
+
+        On any failure the serving version is left untouched and the error is raised.
+        """
+        with self._load_lock:
+            path = path or self.find_model_path()
+            if path is None:
+                raise ModelValidationError("No ML model file found")
+            try:
+                version = self.build_version(path)
+            except ModelValidationError as e:
+                self.load_error = str(e)
+                raise
+
+            self.load_attempted = True
+            self.load_error = None
+            self.activate(version)
+            return version
+
+    def rollback(self, label=None):
+        """Serve a previous version again, the most recent one unless `label` names another"""
+        with self._swap_lock:
+            for version in self.history:
+                if label is None or version.label == label:
+                    break
+            else:
+                raise LookupError(f"Unknown model version {label}" if label else "No previous model version")
 
-        recommendations = []
+            self.history.remove(version)
+            if self.current is not None:
+                self.history.appendleft(self.current)
+            self.current = version
+        return version
+
+    def predict_probabilities(self, feature_matrix, version=None):
+        """Run the model on an (N, 17) feature matrix; None if unavailable"""
+        version = version or self.current
+        if version is None:
+            return None
 
+        try:
+            # Includes the wait for a coalesced batch when micro-batching is on
+            with STAGE_SECONDS.time('inference'):
+                if self.scheduler is not None and len(feature_matrix) == 1:
+                    # Coalesce with concurrent single-survey requests
+                    return np.asarray([self.scheduler.submit((version, feature_matrix[0]))])
+
+                # Get predictions/probabilities from model
+                return version.predict_proba(feature_matrix)
+        except InferenceQueueFull:
+            raise
+        except Exception as model_error:
+            logger.error("Error in model prediction: %s", model_error)
+            return None
+
+    def predict_survey(self, survey_data, version=None):
+        """Encode one survey and return its class probabilities, or None"""
         # Encode survey data
         try:
             feature_vector = self.feature_encoder.encode_survey_data(survey_data)
-            print(f"Feature vector shape: {feature_vector.shape}")
+            return self.predict_features(feature_vector, version)
 
-            if self.model_loaded and hasattr(self.model, 'predict_proba'):
-                # Use actual ML model for predictions
-                try:
-                    # Get predictions/probabilities from model
-                    if hasattr(self.model, 'predict_proba'):
-                        probabilities = self.model.predict_proba(feature_vector)[0]
-                    else:
-                        # If no predict_proba, use decision_function or predict
-                        if hasattr(self.model, 'decision_function'):
-                            scores = self.model.decision_function(feature_vector)[0]
-                        else:
-                            predictions = self.model.predict(feature_vector)
-                            scores = predictions[0] if len(predictions.shape) > 1 else [predictions[0]]
-
-                        # Convert to probabilities-like scores
-                        probabilities = np.array(scores) / np.sum(scores) if np.sum(scores) > 0 else np.ones(len(scores)) / len(scores)
-
-                    print(f"Model predictions: {probabilities}")
-
-                except Exception as model_error:
-                    print(f"Error in model prediction: {model_error}")
-                    probabilities = None
-            else:
-                probabilities = None
+        except InferenceQueueFull:
+            raise
+        except Exception as e:
+            logger.error("Error in feature encoding: %s", e)
+            return None
 
+    def predict_features(self, feature_vector, version=None):
+        """Class probabilities for one already-encoded (1, 17) feature vector, or None"""
+        version = version or self.pin_version()
+
+        try:
+            probabilities = self.predict_probabilities(feature_vector, version)
+            if probabilities is not None:
+                probabilities = probabilities[0]
+                # Per-request detail: only sampled requests at debug level pay for it
+                if debug_sampled(logger):
+                    logger.debug("Model predictions", extra={'features': feature_vector[0], 'predictions': probabilities})
+
+        except InferenceQueueFull:
+            raise
         except Exception as e:
-            print(f"Error in feature encoding: {e}")
+            logger.error("Error in model prediction: %s", e)
             probabilities = None
 
+        return probabilities
+
+    def predict_batch(self, surveys, version=None):
+        """Encode many surveys and return an (N, classes) probability matrix, or None"""
+        version = version or self.pin_version()
+
+        feature_matrix = self.feature_encoder.encode_batch(surveys)
+        return self.predict_probabilities(feature_matrix, version)
+
+    def process_survey_through_model(self, survey_data):
+        """Process survey data through ML model and return recommendations"""
+        return self.rank_packages(survey_data, self.predict_survey(survey_data))
+
+    def process_batch_through_model(self, surveys):
+        """Process many surveys with a single model call, one result list per survey"""
+        probabilities = self.predict_batch(surveys)
+
+        return [
+            self.rank_packages(survey_data, probabilities[row] if probabilities is not None else None)
+            for row, survey_data in enumerate(surveys)
+        ]
+
+    def rank_packages(self, survey_data, probabilities):
+        """Combine model probabilities with weighting logic and return the top 3"""
+        recommendations = []
+        packages = current_catalog().packages
+
         # Generate recommendations with ML scores
-        if probabilities is not None and len(probabilities) == len(PACKAGES):
+        if probabilities is not None and len(probabilities) == len(packages):
             # Use actual AI model predictions
-            for i, package in enumerate(PACKAGES):
+            for i, package in enumerate(packages):
                 ml_score = probabilities[i]
         else:
             # Fallback ML score based on phone model and basic features
@@ -474,27 +933,23 @@ class MLModelProcessor:
             base_ml_score = (phone_score + budget_score) / 12.0  # Normalize to 0-1
 
             # Create varied ML scores for each package based on category match
-            for i, package in enumerate(PACKAGES):
+            for i, package in enumerate(packages):
                 ml_score = base_ml_score
                 usage = survey_data.get('usage', [])
                 if isinstance(usage, str):
                     usage = [usage]
 
                 # Boost scores based on category match
-                if package['category'] == 'gaming' and any('Gaming' in u for u in usage):
-                    ml_score += 0.2
-                elif package['category'] == 'stream' and any('Streaming' in u for u in usage):
-                    ml_score += 0.2
-                elif package['category'] == 'work' and any('Video conference' in u for u in usage):
-                    ml_score += 0.2
-                elif package['category'] == 'social' and any('Browsing' in u for u in usage):
-                    ml_score += 0.1
-
-                probabilities = [0] * len(PACKAGES) if probabilities is None else probabilities
+                for category, keyword, boost in self.FALLBACK_USAGE_BOOSTS:
+                    if package['category'] == category and any(keyword in u for u in usage):
+                        ml_score += boost
+                        break
+
+                probabilities = [0] * len(packages) if probabilities is None else probabilities
                 if i < len(probabilities):
                     probabilities[i] = min(ml_score, 1.0)
 
-        for i, package in enumerate(PACKAGES):
+        for i, package in enumerate(packages):
             if probabilities is not None and i < len(probabilities):
                 ml_score = probabilities[i]
 
@@ -520,6 +975,21 @@ class MLModelProcessor:
 class SurveyAnalyzer:
     """Survey-based recommendation analyzer"""
 
+    # (package category, substring of a usage answer) that earns the usage weight
+    USAGE_KEYWORDS = [
+        ('gaming', 'Gaming online'),
+        ('stream', 'Streaming video'),
+        ('work', 'Video conference'),
+        ('social', 'Browsing')
+    ]
+
+    # (substring of the lowercased reason, package category) that earns the need weight
+    NEED_KEYWORDS = [
+        ('stabil', 'stable'),
+        ('murah', 'hemat'),
+        ('unlimited', 'unlimited')
+    ]
+
     def __init__(self):
         self.weights = {
             'usage': 0.4,
@@ -535,7 +1005,7 @@ class SurveyAnalyzer:
 
         survey_recommendations = []
 
-        for package in PACKAGES:
+        for package in current_catalog().packages:
             if package['name'] in exclude_packages:
                 continue
 
@@ -560,57 +1030,519 @@ class SurveyAnalyzer:
         if isinstance(usage, str):
             usage = [usage]
 
-        if package['category'] == 'gaming' and any('Gaming online' in u for u in usage):
-            score += self.weights['usage']
-        elif package['category'] == 'stream' and any('Streaming video' in u for u in usage):
-            score += self.weights['usage']
-        elif package['category'] == 'work' and any('Video conference' in u for u in usage):
-            score += self.weights['usage']
-        elif package['category'] == 'social' and any('Browsing' in u for u in usage):
-            score += self.weights['usage']
+        for category, keyword in self.USAGE_KEYWORDS:
+            if package['category'] == category and any(keyword in u for u in usage):
+                score += self.weights['usage']
+                break
 
         # Budget fit
-        budget_map = {
-            "< Rp25.000": 25000,
-            "Rp25.000–Rp50.000": 50000,
-            "Rp.50.000-Rp100.000": 100000,
-            "Rp.100.000–Rp250.000": 250000,
-            "> Rp250.000": 500000
-        }
-
-        user_budget = budget_map.get(survey_data.get('budget'), 100000)
+        user_budget = WeightingLogic.BUDGET_LIMITS.get(survey_data.get('budget'), 100000)
         if package['harga'] <= user_budget:
             score += self.weights['budget']
 
         # Need match
         reason = survey_data.get('reason', '')
-        if "stabil" in reason.lower() and package['category'] == "stable":
-            score += self.weights['need']
-        elif "murah" in reason.lower() and package['category'] == "hemat":
-            score += self.weights['need']
-        elif "unlimited" in reason.lower() and package['category'] == "unlimited":
-            score += self.weights['need']
+        for keyword, category in self.NEED_KEYWORDS:
+            if keyword in reason.lower() and package['category'] == category:
+                score += self.weights['need']
+                break
 
         return min(score, 1.0)
 
+class ScoringKernel:
+    """Catalog precompiled into arrays so both score families come from one pass
+
+    Produces exactly the same scores as WeightingLogic.calculate_weighted_score,
+    MLModelProcessor.rank_packages and SurveyAnalyzer._calculate_survey_score.
+    prepare() returns None for surveys with unusual value types; callers then
+    use those reference implementations instead.
+
+    Catalogs of at least RETRIEVAL_MIN_PACKAGES packages are ranked in two
+    stages, see rank_candidates(); smaller ones are cheaper to score in full.
+    """
+
+    RETRIEVAL_MIN_PACKAGES = 2048
+    SURVEY_SCORE_THRESHOLD = 0.2
+
+    def __init__(self, catalog, weighting_logic, survey_analyzer, feature_encoder):
+        self.catalog = catalog
+        self.packages = packages = catalog.packages
+        self.weighting_logic = weighting_logic
+        self.survey_analyzer = survey_analyzer
+        self.feature_encoder = feature_encoder
+
+        self.categories = sorted({package['category'] for package in packages})
+        category_index = {category: i for i, category in enumerate(self.categories)}
+        n_categories = len(self.categories)
+
+        # Price vector and each package's category as an index into the affinity matrices
+        self.prices = np.array([package['harga'] for package in packages])
+        self.category_codes = np.array([category_index[package['category']] for package in packages], dtype=np.intp)
+        self.category_onehot = np.zeros((len(packages), n_categories), dtype=bool)
+        self.category_onehot[np.arange(len(packages)), self.category_codes] = True
+
+        # category x usage answer: usage answers that give a category a full usage match
+        self.usage_vocabulary = sorted({
+            usage for required in WeightingLogic.CATEGORY_USAGE_MATCH.values() for usage in required
+        })
+        self.category_usage = np.zeros((n_categories, len(self.usage_vocabulary)), dtype=bool)
+        for category, required in WeightingLogic.CATEGORY_USAGE_MATCH.items():
+            if category in category_index:
+                for usage in required:
+                    self.category_usage[category_index[category], self.usage_vocabulary.index(usage)] = True
+
+        # reason / preference answer x category affinity
+        self.reason_rows = self._affinity_rows(WeightingLogic.REASON_CATEGORY_MAP, category_index)
+        self.preference_rows = self._affinity_rows(WeightingLogic.PREFERENCE_CATEGORY_MAP, category_index)
+
+        # Keyword rules resolved to category indices
+        self.survey_usage_rules = self._keyword_rules(
+            [(keyword, category) for category, keyword in SurveyAnalyzer.USAGE_KEYWORDS], category_index)
+        self.survey_need_rules = self._keyword_rules(SurveyAnalyzer.NEED_KEYWORDS, category_index)
+        self.fallback_boost_rules = [
+            (keyword, category_index[category], boost)
+            for category, keyword, boost in MLModelProcessor.FALLBACK_USAGE_BOOSTS
+            if category in category_index
+        ]
+
+        # Retrieval index: each category's rows by price (ties in catalog order) and their prices
+        price_order = np.array(catalog.price_order, dtype=np.intp)
+        price_order_codes = self.category_codes[price_order]
+        self.category_price_rows = [price_order[price_order_codes == code] for code in range(n_categories)]
+        # Lists, because bisect on a list beats np.searchsorted for one scalar
+        self.category_sorted_prices = [self.prices[rows].tolist() for rows in self.category_price_rows]
+
+
+    @staticmethod
+    def _affinity_rows(answer_map, category_index):
+        rows = {}
+        for answer, categories in answer_map.items():
+            row = np.zeros(len(category_index), dtype=bool)
+            for category in categories:
+                if category in category_index:
+                    row[category_index[category]] = True
+            rows[answer] = row
+        return rows
+
+    @staticmethod
+    def _keyword_rules(rules, category_index):
+        return [(keyword, category_index[category]) for keyword, category in rules if category in category_index]
+
+    def prepare(self, survey_data):
+        """Pull the fields the scorers read; None if the survey needs the reference path"""
+        if not isinstance(survey_data, dict):
+            return None
+
+        usage = survey_data.get('usage', [])
+        if isinstance(usage, str):
+            usage = [usage]
+        if not isinstance(usage, (list, tuple)) or not all(isinstance(u, str) for u in usage):
+            return None
+
+        if 'reason' in survey_data and not isinstance(survey_data['reason'], str):
+            return None
+
+        prepared = {
+            'usage': usage,
+            'budget': survey_data.get('budget', 'Rp.50.000-Rp100.000'),
+            'reason': survey_data.get('reason', 'Mencari internet yang stabil'),
+            'survey_reason': survey_data.get('reason', ''),
+            'preference': survey_data.get('preference', 'Standar'),
+            'phone_model': survey_data.get('phone_model', 'Lainnya')
+        }
+        try:
+            hash((prepared['budget'], prepared['preference'], prepared['phone_model']))
+        except TypeError:
+            return None
+        return prepared
+
+    def ml_scores(self, prepared, probabilities):
+        """Per-package ML scores; None when the model output needs the reference path"""
+        if probabilities is not None:
+            if len(probabilities) == len(self.packages):
+                return np.asarray(probabilities)
+            return None
+
+        # Fallback ML score based on phone model and basic features
+        phone_score = self.feature_encoder.phone_model_mapping.get(prepared['phone_model'], 4)
+        budget_score = self.feature_encoder.budget_mapping.get(prepared['budget'], 3)
+        base_ml_score = (phone_score + budget_score) / 12.0
+
+        category_boost = np.zeros(len(self.categories))
+        boosted = np.zeros(len(self.categories), dtype=bool)
+        for keyword, category, boost in self.fallback_boost_rules:
+            if not boosted[category] and any(keyword in u for u in prepared['usage']):
+                category_boost[category] = boost
+                boosted[category] = True
+
+        return np.minimum(base_ml_score + category_boost[self.category_codes], 1.0)
+
+    def category_terms(self, prepared):
+        """Budget ceiling and every score term that depends only on a package's category"""
+        max_budget = WeightingLogic.BUDGET_LIMITS.get(prepared['budget'], 100000)
+        usage = set(prepared['usage'])
+
+        # WeightingLogic: usage match, need alignment
+        user_usage = np.array([u in usage for u in self.usage_vocabulary], dtype=bool)
+        usage_match = np.where(self.category_usage[:, user_usage].any(axis=1), 1.0, 0.5)
+
+        need_alignment = np.full(len(self.categories), 0.5)
+        reason_row = self.reason_rows.get(prepared['reason'])
+        if reason_row is not None:
+            need_alignment = need_alignment + np.where(reason_row, 0.3, 0.0)
+        preference_row = self.preference_rows.get(prepared['preference'])
+        if preference_row is not None:
+            need_alignment = need_alignment + np.where(preference_row, 0.2, 0.0)
+        need_alignment = np.minimum(need_alignment, 1.0)
+
+        # SurveyAnalyzer: usage keyword, need keyword
+        survey_usage = np.zeros(len(self.categories), dtype=bool)
+        for keyword, category in self.survey_usage_rules:
+            if any(keyword in u for u in prepared['usage']):
+                survey_usage[category] = True
+        survey_need = np.zeros(len(self.categories), dtype=bool)
+        reason = prepared['survey_reason'].lower()
+        for keyword, category in self.survey_need_rules:
+            if keyword in reason:
+                survey_need[category] = True
+
+        return max_budget, usage_match, need_alignment, survey_usage, survey_need
+
+    def score(self, prepared, ml_scores):
+        """Weighted logic scores and survey scores for every package"""
+        terms = self.category_terms(prepared)
+        return self.logic_scores(terms, ml_scores), self.survey_scores(terms)
+
+    def logic_scores(self, terms, ml_scores):
+        """WeightingLogic score of every package from category_terms()"""
+        categories = self.category_codes
+        max_budget, usage_match, need_alignment, _, _ = terms
+
+        # WeightingLogic: budget fit, usage match, need alignment
+        budget_fit = np.where(self.prices <= max_budget, 1.0,
+                              np.where(self.prices <= max_budget * 1.2, 0.7, 0.3))
+
+        weights = self.weighting_logic.weights
+        logic_scores = np.minimum(
+            budget_fit * weights['budget_fit'] +
+            usage_match[categories] * weights['usage_match'] +
+            need_alignment[categories] * weights['need_alignment'] +
+            ml_scores * weights['tech_level'],
+            1.0
+        )
+        return logic_scores
+
+    def survey_scores(self, terms):
+        """SurveyAnalyzer score of every package from category_terms()"""
+        categories = self.category_codes
+        max_budget, _, _, survey_usage, survey_need = terms
+
+        # SurveyAnalyzer: usage keyword, hard budget limit, need keyword
+        survey_weights = self.survey_analyzer.weights
+        return np.minimum(
+            np.where(survey_usage[categories], survey_weights['usage'], 0.0) +
+            np.where(self.prices <= max_budget, survey_weights['budget'], 0.0) +
+            np.where(survey_need[categories], survey_weights['need'], 0.0),
+            1.0
+        )
+
+    def rank(self, prepared, ml_scores, k=3):
+        """(ML picks, survey picks) as [(row, score)], best first; survey picks exclude ML picks"""
+        if len(self.packages) >= self.RETRIEVAL_MIN_PACKAGES:
+            return self.rank_candidates(prepared, ml_scores, k)
+        return self.rank_all(prepared, ml_scores, k)
+
+    def rank_all(self, prepared, ml_scores, k=3):
+        """Rank by scoring every package"""
+        with STAGE_SECONDS.time('weighting'):
+            terms = self.category_terms(prepared)
+            logic_scores = self.logic_scores(terms, ml_scores)
+            ml_rows = self.top_k(logic_scores, k)
+
+        # Survey picks exclude the ML picks and must clear the score threshold
+        with STAGE_SECONDS.time('survey'):
+            survey_scores = self.survey_scores(terms)
+            eligible = survey_scores > self.SURVEY_SCORE_THRESHOLD
+            eligible[ml_rows] = False
+            survey_rows = self.top_k(survey_scores, k, eligible)
+
+        return ([(row, float(logic_scores[row])) for row in ml_rows],
+                [(row, float(survey_scores[row])) for row in survey_rows])
+
+    def rank_candidates(self, prepared, ml_scores, k=3):
+        """Same result as rank_all(), scoring only packages that can still make the top k
+
+        Retrieval: every score term except the ML score is fixed per (category,
+        budget tier), and each such group is a contiguous price range of the
+        category. Groups are visited by their best possible score and dropped
+        once that bound falls below the current k-th score, so mostly the
+        in-budget rows of well-matching categories get ranked.
+        """
+        started = time.perf_counter()
+        max_budget, usage_match, need_alignment, survey_usage, survey_need = self.category_terms(prepared)
+        usage_match, need_alignment = usage_match.tolist(), need_alignment.tolist()
+        weights = self.weighting_logic.weights
+        tech_weight = weights['tech_level']
+        ml_ceiling = float(ml_scores.max()) if len(ml_scores) else 0.0
+
+        # Each category's boundaries of the in-budget and up-to-120% price ranges
+        budget_ends = [
+            (bisect.bisect_right(prices, max_budget), bisect.bisect_right(prices, max_budget * 1.2), len(prices))
+            for prices in self.category_sorted_prices
+        ]
+
+        # (base score, best possible score, rows) per non-empty group, same arithmetic as score()
+        groups = []
+        for code, (in_budget, near_budget, end) in enumerate(budget_ends):
+            for budget_fit, start, stop in ((1.0, 0, in_budget), (0.7, in_budget, near_budget),
+                                            (0.3, near_budget, end)):
+                if start == stop:
+                    continue
+                base = (budget_fit * weights['budget_fit'] +
+                        usage_match[code] * weights['usage_match'] +
+                        need_alignment[code] * weights['need_alignment'])
+                groups.append((base, min(base + ml_ceiling * tech_weight, 1.0), code, start, stop))
+        groups.sort(key=lambda group: -group[1])
+
+        best_rows = np.empty(0, dtype=np.intp)
+        best_scores = np.empty(0)
+        for base, bound, code, start, stop in groups:
+            # Equal scores are still kept when the row comes first in the catalog
+            if len(best_rows) == k and bound < best_scores[-1]:
+                break
+            rows = self.category_price_rows[code][start:stop]
+            scores = np.minimum(base + ml_scores[rows] * tech_weight, 1.0)
+            best_rows, best_scores = self._merge_top_k(best_rows, best_scores, rows, scores, k)
+        survey_started = time.perf_counter()
+        STAGE_SECONDS.observe(survey_started - started, 'weighting')
+
+        # Survey scores are constant per (category, within budget); rank groups, then rows by catalog order
+        survey_weights = self.survey_analyzer.weights
+        survey_groups = []
+        for code, (in_budget, _, end) in enumerate(budget_ends):
+            for within, start, stop in ((True, 0, in_budget), (False, in_budget, end)):
+                score = min((survey_weights['usage'] if survey_usage[code] else 0.0) +
+                            (survey_weights['budget'] if within else 0.0) +
+                            (survey_weights['need'] if survey_need[code] else 0.0), 1.0)
+                if start < stop and score > self.SURVEY_SCORE_THRESHOLD:
+                    survey_groups.append((score, self.category_price_rows[code][start:stop]))
+        survey_groups.sort(key=lambda group: -group[0])
+
+        excluded = best_rows
+        survey_picks = []
+        for score, level in itertools.groupby(survey_groups, key=lambda group: group[0]):
+            needed = k - len(survey_picks)
+            if needed <= 0:
+                break
+            # Only the first `needed` rows of each group, after exclusions, can be picked
+            keep = needed + len(excluded)
+            firsts = [rows if len(rows) <= keep else np.partition(rows, keep - 1)[:keep] for _, rows in level]
+            candidates = np.sort(np.concatenate(firsts))
+            candidates = candidates[~np.isin(candidates, excluded)][:needed]
+            survey_picks.extend((row, score) for row in candidates)
+        STAGE_SECONDS.observe(time.perf_counter() - survey_started, 'survey')
+
+        return ([(row, float(score)) for row, score in zip(best_rows, best_scores)],
+                [(row, float(score)) for row, score in survey_picks])
+
+    @staticmethod
+    def _merge_top_k(rows_a, scores_a, rows_b, scores_b, k):
+        """Top k of two (rows, scores) sets, highest score first, ties by row"""
+        if len(rows_b) > k:
+            # Anything below the group's k-th best score can't make the top k
+            kth_value = scores_b[np.argpartition(-scores_b, k - 1)[:k]].min()
+            keep = scores_b >= kth_value
+            rows_b, scores_b = rows_b[keep], scores_b[keep]
+        rows = np.concatenate((rows_a, rows_b))
+        scores = np.concatenate((scores_a, scores_b))
+        order = np.lexsort((rows, -scores))[:k]
+        return rows[order], scores[order]
+
+    @staticmethod
+    def top_k(scores, k, mask=None):
+        """Rows of the k highest scores, ties broken by catalog order like a stable sort"""
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+        if len(candidates) > k:
+            values = scores[candidates]
+            kth_value = values[np.argpartition(-values, k - 1)[:k]].min()
+            candidates = candidates[values >= kth_value]
+        order = np.argsort(-scores[candidates], kind='stable')
+        return candidates[order[:k]]
+
 class HybridRecommendationEngine:
     """Hybrid engine combining ML model and survey analysis"""
 
     def __init__(self):
         self.ml_processor = MLModelProcessor()
         self.survey_analyzer = SurveyAnalyzer()
+        self.kernel = None
+        # Bumped whenever self.kernel is replaced; ids of dead kernels can be reused
+        self.kernel_generation = 0
+        self.cache = None
+
+    def enable_cache(self, max_entries=4096, ttl=None):
+        """Cache results keyed on the canonical survey, see cache_key()"""
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def cache_generation(self):
+        """Changes whenever the compiled catalog is replaced"""
+        # Model versions are part of the key instead, so a rollback finds its entries again
+        self.get_kernel()
+        return self.kernel_generation
+
+    def cache_key(self, prepared, feature_vector, version):
+        """Canonical key: model version, encoded features and the raw answers the scorers read"""
+        return (
+            version.number if version is not None else None,
+            feature_vector.tobytes(),
+            prepared['budget'],
+            tuple(sorted(set(prepared['usage']))),
+            prepared['reason'],
+            prepared['survey_reason'],
+            prepared['preference']
+        )
+
+    @staticmethod
+    def copy_recommendations(recommendations):
+        return [dict(pkg) for pkg in recommendations]
+
+    def get_kernel(self):
+        """Scoring kernel for the current catalog, recompiled when the catalog is reloaded"""
+        catalog = current_catalog()
+        kernel = self.kernel
+        if kernel is None or kernel.catalog is not catalog:
+            kernel = ScoringKernel(
+                catalog,
+                self.ml_processor.weighting_logic,
+                self.survey_analyzer,
+                self.ml_processor.feature_encoder
+            )
+            self.kernel = kernel
+            self.kernel_generation += 1
+        return kernel
+
+    def recommend(self, survey_data):
+        """Recommendations for one survey and the ModelVersion that produced them (None without a model)"""
+        version = self.ml_processor.pin_version()
+        return self.get_hybrid_recommendations(survey_data, version), version
 
-    def get_hybrid_recommendations(self, survey_data):
+    def recommend_batch(self, surveys):
+        """Recommendations for many surveys, all scored by the same ModelVersion"""
+        version = self.ml_processor.pin_version()
+        return self.get_hybrid_recommendations_batch(surveys, version), version
+
+    def get_hybrid_recommendations(self, survey_data, version=None):
         """Get hybrid recommendations: ML model + survey analysis"""
+        version = version or self.ml_processor.pin_version()
+        prepared = self.get_kernel().prepare(survey_data) if self.cache is not None else None
+
+        if prepared is None:
+            # Get ML model predictions with proper feature encoding
+            probabilities = self.ml_processor.predict_survey(survey_data, version)
+            return self.recommend_from_probabilities(survey_data, probabilities)
+
+        self.cache.set_generation(self.cache_generation())
+        feature_vector = self.ml_processor.feature_encoder.encode_survey_data(survey_data)
+
+        def compute():
+            probabilities = self.ml_processor.predict_features(feature_vector, version)
+            return self.recommend_from_probabilities(survey_data, probabilities)
+
+        recommendations = self.cache.get_or_compute(self.cache_key(prepared, feature_vector, version), compute)
+        return self.copy_recommendations(recommendations)
+
+    def get_hybrid_recommendations_batch(self, surveys, version=None):
+        """Hybrid recommendations for many surveys using one model call"""
+        version = version or self.ml_processor.pin_version()
+        if self.cache is None:
+            probabilities = self.ml_processor.predict_batch(surveys, version)
+            return [
+                self.recommend_from_probabilities(survey_data, probabilities[row] if probabilities is not None else None)
+                for row, survey_data in enumerate(surveys)
+            ]
+
+        # Serve cache hits directly and send only the misses through the model
+        self.cache.set_generation(self.cache_generation())
+        kernel = self.get_kernel()
+        feature_matrix = self.ml_processor.feature_encoder.encode_batch(surveys)
+        results = [None] * len(surveys)
+        keys = [None] * len(surveys)
+        misses = []
+
+        for row, survey_data in enumerate(surveys):
+            prepared = kernel.prepare(survey_data)
+            if prepared is not None:
+                keys[row] = self.cache_key(prepared, feature_matrix[row:row + 1], version)
+                cached = self.cache.get(keys[row])
+                if cached is not None:
+                    results[row] = self.copy_recommendations(cached)
+                    continue
+            misses.append(row)
+
+        if misses:
+            probabilities = self.ml_processor.predict_probabilities(feature_matrix[misses], version)
+            for position, row in enumerate(misses):
+                recommendations = self.recommend_from_probabilities(
+                    surveys[row], probabilities[position] if probabilities is not None else None)
+                if keys[row] is not None:
+                    self.cache.put(keys[row], self.copy_recommendations(recommendations))
+                results[row] = recommendations
+
+        return results
+
+    def recommend_from_probabilities(self, survey_data, probabilities):
+        """Rank the catalog once with the kernel and pick 3 ML + 3 survey packages"""
+        kernel = self.get_kernel()
+        prepared = kernel.prepare(survey_data)
+        ml_scores = kernel.ml_scores(prepared, probabilities) if prepared is not None else None
+
+        if ml_scores is None:
+            # Unusual input: use the per-package reference implementation
+            with STAGE_SECONDS.time('weighting'):
+                ml_recommendations = self.ml_processor.rank_packages(survey_data, probabilities)
+            return self.merge_recommendations(survey_data, ml_recommendations)
+
+        ml_picks, survey_picks = kernel.rank(prepared, ml_scores, 3)
+
+        with STAGE_SECONDS.time('merge'):
+            return self.build_recommendations(kernel, ml_scores, ml_picks, survey_picks)
+
+    def build_recommendations(self, kernel, ml_scores, ml_picks, survey_picks):
+        """Package dicts for the kernel's (row, score) picks, combined ML first"""
+        ml_recommendations = []
+        for row, final_score in ml_picks:
+            pkg_copy = kernel.packages[row].copy()
+            pkg_copy['ml_score'] = float(ml_scores[row])
+            pkg_copy['logic_score'] = final_score
+            pkg_copy['match_percentage'] = round(final_score * 100)
+            pkg_copy['recommendation_type'] = 'ml_model'
+            pkg_copy['source'] = 'AI Model'
+            ml_recommendations.append(pkg_copy)
+
+        survey_recommendations = []
+        for row, score in survey_picks:
+            pkg_copy = kernel.packages[row].copy()
+            pkg_copy['survey_score'] = score
+            pkg_copy['match_percentage'] = round(score * 100)
+            survey_recommendations.append(pkg_copy)
 
-        # Get ML model recommendations with proper feature encoding
-        ml_recommendations = self.ml_processor.process_survey_through_model(survey_data)
+        return self.combine_recommendations(ml_recommendations, survey_recommendations)
+
+    def merge_recommendations(self, survey_data, ml_recommendations):
+        """Add survey-based picks to the ML picks and order the combined list"""
 
         # Track packages recommended by ML
         ml_packages = {pkg['name'] for pkg in ml_recommendations}
 
         # Get survey-based recommendations (excluding ML packages)
-        survey_recommendations = self.survey_analyzer.get_recommendations(survey_data, ml_packages)
+        with STAGE_SECONDS.time('survey'):
+            survey_recommendations = self.survey_analyzer.get_recommendations(survey_data, ml_packages)
+
+        with STAGE_SECONDS.time('merge'):
+            return self.combine_recommendations(ml_recommendations, survey_recommendations)
+
+    def combine_recommendations(self, ml_recommendations, survey_recommendations):
+        """Label both recommendation lists and order them ML first"""
 
         # Combine recommendations
         all_recommendations = []
@@ -635,11 +1567,814 @@ class HybridRecommendationEngine:
 
         return all_recommendations[:6]  # Top 6 total
 
+class EngineRegistry:
+    """Process-wide holder for the shared, read-only recommendation engine"""
+
+    # Survey used to exercise the full pipeline once before serving traffic
+    WARMUP_SURVEY = {
+        'phone_model': 'Lainnya',
+        'budget': 'Rp.50.000-Rp100.000',
+        'usage': ['Browsing & media sosial']
+    }
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.Lock()
+        self.load_time_ms = None
+        self.warmup_time_ms = None
+        self.loaded_at = None
+        self.watch_interval = 0
+        self._watcher_pid = None
+
+    def initialize(self, micro_batching=None, cache=None, inference_backend='auto', model_reload=None):
+        """Build the engine, load the model and warm it with a dummy prediction
+
+        micro_batching: optional MicroBatchScheduler settings (max_batch_size,
+        max_wait_ms, max_queue) for coalescing concurrent single predictions.
+        cache: optional LRUCache settings (max_entries, ttl) for recommendation results.
+        inference_backend: 'auto' uses the compiled forest when it verifies, 'sklearn' never does.
+        model_reload: optional hot-reload settings (history, watch_interval); the
+        watcher itself is started by start_model_watcher().
+        """
+        with self._lock:
+            if self._engine is not None:
+                return self._engine
+
+            start = time.perf_counter()
+            engine = HybridRecommendationEngine()
+            engine.ml_processor.inference_backend = inference_backend
+            if model_reload:
+                engine.ml_processor.set_history_size(model_reload.get('history', MLModelProcessor.HISTORY_SIZE))
+                self.watch_interval = model_reload.get('watch_interval') or 0
+            engine.ml_processor.load_model()
+            if micro_batching:
+                engine.ml_processor.enable_micro_batching(**micro_batching)
+            if cache:
+                engine.enable_cache(**cache)
+            self.load_time_ms = round((time.perf_counter() - start) * 1000, 2)
+
+            start = time.perf_counter()
+            try:
+                engine.get_hybrid_recommendations(dict(self.WARMUP_SURVEY))
+            except Exception as e:
+                logger.warning("Engine warmup failed: %s", e)
+            self.warmup_time_ms = round((time.perf_counter() - start) * 1000, 2)
+
+            self.loaded_at = datetime.now().isoformat()
+            self._engine = engine
+            logger.info("Recommendation engine ready (load %s ms, warmup %s ms)", self.load_time_ms, self.warmup_time_ms)
+            return engine
+
+    def get_engine(self):
+        """Return the shared engine, initializing it on first use"""
+        engine = self._engine
+        if engine is None:
+            engine = self.initialize()
+        return engine
+
+    def reload_model(self, path=None):
+        """Load, validate and warm a model file, then swap it into the shared engine"""
+        processor = self.get_engine().ml_processor
+        start = time.perf_counter()
+        version = processor.reload_model(path)
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        logger.info("Model %s from %s is now serving (loaded in %s ms)", version.label, version.path, elapsed)
+        return version
+
+    def rollback_model(self, label=None):
+        """Serve a previous model version again"""
+        version = self.get_engine().ml_processor.rollback(label)
+        logger.info("Rolled back to model %s from %s", version.label, version.path)
+        return version
+
+    def reload_in_background(self):
+        """Reload without blocking the caller, e.g. from a SIGHUP handler"""
+        threading.Thread(target=self._reload_logged, name='model-reload', daemon=True).start()
+
+    def _reload_logged(self):
+        try:
+            self.reload_model()
+        except Exception as e:
+            current = self.get_engine().ml_processor.current
+            logger.error("Model reload failed, still serving %s: %s", current.label if current else 'no model', e)
+
+    def start_model_watcher(self):
+        """Poll the model files and hot-reload when one changes
+
+        Threads don't survive fork(), so pre-fork workers call this after starting.
+        """
+        if not self.watch_interval or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch_model_files, name='model-watcher', daemon=True).start()
+
+    def close_scheduler(self):
+        """Run the predictions still waiting in the micro-batch queue before the process exits"""
+        processor = self._engine.ml_processor if self._engine is not None else None
+        if processor is not None and processor.scheduler is not None:
+            processor.scheduler.close()
+
+    @staticmethod
+    def _model_files_state():
+        state = []
+        for path in MLModelProcessor.model_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            state.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(state)
+
+    def _watch_model_files(self):
+        loaded = seen = self._model_files_state()
+        while True:
+            time.sleep(self.watch_interval)
+            state = self._model_files_state()
+            # Only act on a file that stayed unchanged for a full interval, so a
+            # copy still in progress is never loaded
+            if state != seen:
+                seen = state
+                continue
+            if state != loaded:
+                loaded = state
+                self._reload_logged()
+
+    def model_versions(self):
+        """Serving version, rollback candidates and the last load error"""
+        processor = self.get_engine().ml_processor
+        return {
+            'current': processor.current.describe() if processor.current else None,
+            'history': [version.describe() for version in processor.history],
+            'load_error': processor.load_error
+        }
+
+    def status(self):
+        """Describe the loaded engine for the health endpoint"""
+        processor = self._engine.ml_processor if self._engine is not None else None
+        return {
+            'engine_initialized': self._engine is not None,
+            'model_version': processor.current.label if processor and processor.current else None,
+            'model_path': processor.model_path if processor else None,
+            'model_fingerprint': processor.model_fingerprint if processor else None,
+            'model_history': [version.label for version in processor.history] if processor else [],
+            'model_load_error': processor.load_error if processor else None,
+            'inference_backend': ('compiled' if processor.compiled_model is not None else 'sklearn') if processor else None,
+            'model_load_time_ms': self.load_time_ms,
+            'warmup_time_ms': self.warmup_time_ms,
+            'loaded_at': self.loaded_at,
+            'micro_batching': processor.scheduler.stats() if processor and processor.scheduler else None,
+            'recommendation_cache': self._engine.cache.stats() if self._engine and self._engine.cache else None
+        }
+
+ENGINE_REGISTRY = EngineRegistry()
+
+# API operations shared by the threaded and asyncio front ends. Each one takes
+# the decoded request input and returns (status_code, response_payload).
+
+def api_packages():
+    """All available packages, without the unlisted ones"""
+    return 200, current_catalog().listed_packages
+
+# Clients may reuse the catalog for a few minutes, then revalidate with If-None-Match
+PACKAGES_CACHE_CONTROL = 'public, max-age=300'
+
+# (catalog the body was built from, EncodedBody); rebuilt when the catalog is reloaded
+_PACKAGES_BODY = (None, None)
+
+def packages_body():
+    """Pre-serialized and pre-compressed /api/packages body for the current catalog"""
+    global _PACKAGES_BODY
+    current = current_catalog()
+    catalog, body = _PACKAGES_BODY
+    if catalog is not current:
+        catalog = current
+        body = EncodedBody(json.dumps(catalog.listed_packages).encode(), cache_control=PACKAGES_CACHE_CONTROL,
+                           headers=CORS_HEADERS)
+        _PACKAGES_BODY = (catalog, body)
+    return body
+
+def packages_response(accept_encoding=None, if_none_match=None):
+    """(status, headers, body) for GET /api/packages; 304 when If-None-Match is current"""
+    try:
+        return packages_body().respond(accept_encoding, if_none_match)
+    except CatalogError as e:
+        logger.error("Error serving packages: %s", e)
+        return 503, JSON_HEADERS, json.dumps({'success': False, 'error': str(e)}).encode()
+
+def api_health():
+    """System status for the health endpoint"""
+    health_data = {
+        'status': 'healthy',
+        'ml_model_loaded': ENGINE_REGISTRY.get_engine().ml_processor.model_loaded,
+        'feature_encoder_ready': True,
+        'weighting_logic_ready': True,
+        'survey_analyzer_ready': True,
+        'hybrid_engine': 'active',
+        'model_type': 'model_telco_recommendation.pkl',
+        'database': DATABASE.stats(),
+        'catalog': CATALOG.stats(),
+        'survey_write_behind': SURVEY_QUEUE.stats() if SURVEY_QUEUE is not None else None,
+        'profile_cache': PROFILE_CACHE.stats() if PROFILE_CACHE is not None else None
+    }
+    health_data.update(ENGINE_REGISTRY.status())
+    return 200, health_data
+
+def api_recommend(post_data):
+    """Hybrid recommendations for one survey"""
+    try:
+        with STAGE_SECONDS.time('json_decode'):
+            survey_data = json.loads(post_data.decode('utf-8'))
+        engine = ENGINE_REGISTRY.get_engine()
+
+        # Get hybrid recommendations (ML + Survey)
+        recommendations, version = engine.recommend(survey_data)
+
+        # Count recommendation types
+        ml_count = sum(1 for r in recommendations if r.get('recommendation_type') == 'ml_model')
+        survey_count = sum(1 for r in recommendations if r.get('recommendation_type') == 'survey_based')
+
+        return 200, {
+            'success': True,
+            'recommendations': recommendations,
+            'metadata': {
+                'ml_model_used': version is not None,
+                'model_version': version.label if version is not None else None,
+                'feature_encoding': 'active',
+                'weighting_logic': 'active',
+                'survey_analysis': 'active',
+                'total_recommendations': len(recommendations),
+                'ml_count': ml_count,
+                'survey_count': survey_count,
+                'recommendation_source': 'Hybrid ML Model + Survey Analysis',
+                'model_file': 'model_telco_recommendation.pkl'
+            }
+        }
+
+    except InferenceQueueFull as e:
+        logger.warning("Rejecting recommendation: %s", e)
+        return 503, {'success': False, 'error': str(e)}
+
+    except Exception as e:
+        logger.error("Error in hybrid recommendation: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+def admin_authorized(token):
+    """True when the request's X-Admin-Token matches the ADMIN_TOKEN environment variable"""
+    expected = os.environ.get('ADMIN_TOKEN')
+    return bool(expected and token) and hmac.compare_digest(expected.encode(), token.encode())
+
+def admin_forbidden():
+    if not os.environ.get('ADMIN_TOKEN'):
+        return 403, {'success': False, 'error': 'Admin API is disabled, set ADMIN_TOKEN to enable it'}
+    return 403, {'success': False, 'error': 'Invalid admin token'}
+
+def resolve_model_path(path):
+    """Only model files inside the server directory may be loaded by the admin API"""
+    server_dir = os.path.realpath(os.getcwd())
+    resolved = os.path.realpath(path)
+    if not (resolved.endswith('.pkl') or is_artifact(resolved)) or os.path.dirname(resolved) != server_dir:
+        raise ModelValidationError("Model path must name a .pkl or .forest file in the server directory")
+    return resolved
+
+def api_model_versions():
+    """Serving model version and the versions available for rollback"""
+    return 200, dict(success=True, **ENGINE_REGISTRY.model_versions())
+
+def api_model_reload(post_data):
+    """Load a model file (default: the usual model path) and swap it in"""
+    try:
+        data = json.loads(post_data.decode('utf-8'))
+        path = data.get('path')
+        version = ENGINE_REGISTRY.reload_model(resolve_model_path(path) if path else None)
+        return 200, {'success': True, 'model_version': version.describe()}
+
+    except ModelValidationError as e:
+        logger.warning("Rejected model reload: %s", e)
+        return 422, {'success': False, 'error': str(e)}
+
+    except Exception as e:
+        logger.error("Error in model reload: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+def api_model_rollback(post_data):
+    """Serve a previous model version again (default: the most recent one)"""
+    try:
+        data = json.loads(post_data.decode('utf-8'))
+        version = ENGINE_REGISTRY.rollback_model(data.get('version'))
+        return 200, {'success': True, 'model_version': version.describe()}
+
+    except LookupError as e:
+        return 404, {'success': False, 'error': str(e)}
+
+    except Exception as e:
+        logger.error("Error in model rollback: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+# Surveys scored per model call by the batch endpoint
+BATCH_CHUNK_SIZE = 512
+
+# Bytes read off the socket at a time for a batch body
+BATCH_READ_SIZE = 64 * 1024
+
+# Largest single array item the batch decoder buffers before giving up on it
+MAX_BATCH_ITEM_SIZE = 1024 * 1024
+
+# Characters before the end of the decoded text within which an item may still be cut off
+BATCH_LOOKAHEAD = 64
+
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+JSON_DECODER = json.JSONDecoder()
+
+class InvalidBatchItem:
+    """Placeholder for a batch line that could not be decoded"""
+
+    def __init__(self, error):
+        self.error = error
+
+class BatchBodyText:
+    """UTF-8 text of a batch request body, decoded one chunk of bytes at a time
+
+    Only the unread part of the current chunk, plus the item being decoded,
+    is held in memory, whatever the size of the body.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.at_end = False
+
+    def read_more(self):
+        """Append the next chunk to the unread text; False once the body is used up"""
+        if self.at_end:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.at_end = True
+            added = self.decoder.decode(b'', final=True)
+        else:
+            added = self.decoder.decode(chunk)
+        self.text = self.text[self.pos:] + added
+        self.pos = 0
+        return True
+
+    def next_char(self):
+        """First character after whitespace, or '' at the end of the body"""
+        while True:
+            self.pos = JSON_WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return ''
+
+    def drain(self):
+        """Read whatever is left so the connection is positioned at the next request"""
+        for _ in self.chunks:
+            pass
+
+    def iter_lines(self):
+        while True:
+            newline = self.text.find('\n', self.pos)
+            if newline >= 0:
+                yield self.text[self.pos:newline]
+                self.pos = newline + 1
+            elif not self.read_more():
+                yield self.text[self.pos:]
+                return
+
+    def decode_value(self):
+        if not self.next_char():
+            raise ValueError("Unexpected end of the batch body")
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                # Errors at the end of the text, or in a string still open there, mean the item
+                # continues in the next chunk; anything else is a real syntax error
+                truncated = e.pos >= len(self.text) - BATCH_LOOKAHEAD or e.msg.startswith('Unterminated string')
+                if not truncated or len(self.text) - self.pos > MAX_BATCH_ITEM_SIZE or not self.read_more():
+                    raise
+                continue
+            # A number close to the end may go on in the next chunk ("1." then "5")
+            if len(self.text) - end < BATCH_LOOKAHEAD and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """Yield the items of the JSON array that starts at the current position"""
+        self.pos += 1
+        decoded = 0
+        try:
+            if self.next_char() == ']':
+                self.pos += 1
+            else:
+                while True:
+                    yield self.decode_value()
+                    decoded += 1
+                    separator = self.next_char()
+                    self.pos += 1
+                    if separator == ']':
+                        break
+                    if separator != ',':
+                        raise ValueError(f"Expecting ',' or ']' after item {decoded - 1}")
+        except ValueError as e:
+            if not decoded:
+                raise
+            # Results for the items before it are already on their way, so the batch ends with an error line
+            yield InvalidBatchItem(f"Invalid JSON: {e}")
+        self.drain()
+
+def iter_batch_surveys(chunks):
+    """Yield surveys from a JSON array or NDJSON request body, given as an iterable of bytes chunks"""
+    text = BatchBodyText(chunks)
+    first = text.next_char()
+    if first == '[':
+        yield from text.iter_array()
+    elif first:
+        yield from iter_ndjson_surveys(text.iter_lines())
+
+def iter_ndjson_surveys(lines):
+    """Yield one decoded survey per non-empty NDJSON line"""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidBatchItem(f"Invalid JSON: {e}")
+
+def iter_chunks(items, size=BATCH_CHUNK_SIZE):
+    """Group an iterable into lists of at most `size` items"""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def score_batch_chunk(start_index, surveys):
+    """Score one chunk of surveys and return the results as NDJSON bytes"""
+    valid_rows = [row for row, survey_data in enumerate(surveys) if isinstance(survey_data, dict)]
+    results = {}
+    model_version = None
+
+    try:
+        engine = ENGINE_REGISTRY.get_engine()
+        batch, version = engine.recommend_batch([surveys[row] for row in valid_rows])
+        results = dict(zip(valid_rows, batch))
+        model_version = version.label if version is not None else None
+        error = None
+    except Exception as e:
+        logger.error("Error in batch recommendation: %s", e)
+        error = str(e)
+
+    lines = []
+    for row, survey_data in enumerate(surveys):
+        if row in results:
+            line = {'index': start_index + row, 'success': True, 'recommendations': results[row],
+                    'model_version': model_version}
+        elif isinstance(survey_data, InvalidBatchItem):
+            line = {'index': start_index + row, 'success': False, 'error': survey_data.error}
+        elif error is not None:
+            line = {'index': start_index + row, 'success': False, 'error': error}
+        else:
+            line = {'index': start_index + row, 'success': False, 'error': 'Survey must be a JSON object'}
+        lines.append(json.dumps(line))
+
+    return ('\n'.join(lines) + '\n').encode()
+
+def iter_batch_results(surveys):
+    """Score surveys chunk by chunk, yielding NDJSON bytes for each chunk"""
+    start_index = 0
+    for chunk in iter_chunks(surveys):
+        yield score_batch_chunk(start_index, chunk)
+        start_index += len(chunk)
+
+def issue_token(user_data):
+    return TOKEN_SIGNER.issue(user_data['id'])
+
+def token_claims(authorization):
+    """Claims of the request's bearer token, None without one; raises InvalidToken for a bad one"""
+    token = bearer_token(authorization)
+    return TOKEN_SIGNER.verify(token) if token is not None else None
+
+def token_rejected(error):
+    return 401, {'success': False, 'error': str(error)}
+
+def api_register(post_data):
+    """Register a new user"""
+    try:
+        data = json.loads(post_data.decode('utf-8'))
+
+        # Insert new user unless the email is taken
+        user_data = USER_STORE.register(data['name'], data['email'], data['password'], data['phone'])
+
+        if user_data is None:
+            return 400, {'success': False, 'error': 'Email already registered'}
+
+        # A "User not found" may be cached for the new id
+        invalidate_profiles([user_data['id']])
+        return 200, {'success': True, 'user': user_data, 'token': issue_token(user_data)}
+
+    except Exception as e:
+        logger.error("Error in registration: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+def api_login(post_data):
+    """Check user credentials"""
+    try:
+        data = json.loads(post_data.decode('utf-8'))
+
+        # Check user credentials
+        user_data = USER_STORE.authenticate(data['email'], data['password'])
+
+        if user_data:
+            return 200, {'success': True, 'user': user_data, 'token': issue_token(user_data)}
+        else:
+            return 401, {'success': False, 'error': 'Invalid email or password'}
+
+    except Exception as e:
+        logger.error("Error in login: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+def api_survey_submit(post_data, authorization=None):
+    """Store a survey submission from an authenticated user"""
+    try:
+        data = json.loads(post_data.decode('utf-8'))
+
+        # The session token decides the user, a client-supplied user_id alone is never trusted
+        claims = token_claims(authorization)
+        if claims is None:
+            return 401, {'success': False, 'error': 'Login required to submit a survey'}
+        if data.get('user_id') is not None and str(data['user_id']) != str(claims['uid']):
+            return 403, {'success': False, 'error': 'user_id does not match the session token'}
+        user_id = claims['uid']
+
+        # A client-chosen id makes resending safe: the server stores each submission once
+        submission_id = data.get('submission_id')
+        if submission_id is None:
+            submission_id = uuid.uuid4().hex
+        elif not is_submission_id(submission_id):
+            return 400, {'success': False, 'error': 'submission_id must be 32 lowercase hex digits'}
+        else:
+            repeated = repeated_submission(submission_id, user_id)
+            if repeated is not None:
+                return repeated
+
+        # Store survey response and update user's last survey
+        submission = (
+            submission_id,
+            user_id,
+            json.dumps(data['survey_data']),
+            json.dumps(data['recommendations']),
+            data.get('selected_package', None)
+        )
+        if SURVEY_QUEUE is not None:
+            # Cached profiles are invalidated by the writer once the row is committed
+            if not SURVEY_QUEUE.submit(*submission):
+                # Queued by a concurrent request with the same id since the check above
+                return repeated_submission(submission_id, user_id) or (500, {
+                    'success': False, 'error': 'Submission could not be queued'})
+        else:
+            try:
+                USER_STORE.record_survey(*submission)
+            except sqlite3.IntegrityError:
+                # Stored by a concurrent request with the same id since the check above
+                repeated = repeated_submission(submission_id, user_id)
+                if repeated is None:
+                    raise
+                return repeated
+            invalidate_profiles([user_id])
+
+        return 200, {'success': True, 'message': 'Survey submitted successfully', 'submission_id': submission_id}
+
+    except InvalidToken as e:
+        return token_rejected(e)
+
+    except SurveyQueueFull as e:
+        logger.warning("Rejecting survey submission: %s", e)
+        return 503, {'success': False, 'error': str(e)}
+
+    except Exception as e:
+        logger.error("Error in survey submission: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+def repeated_submission(submission_id, user_id):
+    """(status, payload) when submission_id was already submitted, None if it is new
+
+    A repeat from the same user succeeds without storing anything; an id that
+    belongs to another user's submission is a conflict.
+    """
+    # Queue first: a row leaves it only once committed, so it can't slip between the two lookups
+    owner = SURVEY_QUEUE.queued_user(submission_id) if SURVEY_QUEUE is not None else None
+    if owner is None:
+        stored = USER_STORE.submission(submission_id)
+        if stored is None:
+            return None
+        owner = stored['user_id']
+    if str(owner) != str(user_id):
+        return 409, {'success': False, 'error': 'submission_id belongs to another submission'}
+    return 200, {'success': True, 'message': 'Survey already submitted', 'submission_id': submission_id,
+                 'duplicate': True}
+
+def api_user_profile(user_id, authorization=None):
+    """Profile data and survey count for one user"""
+    try:
+        claims = token_claims(authorization)
+        if claims is not None and claims['uid'] != user_id:
+            return 403, {'success': False, 'error': 'Session token belongs to another user'}
+
+        if PROFILE_CACHE is not None:
+            user_data = PROFILE_CACHE.get_or_compute(user_id, lambda: USER_STORE.profile(user_id))
+        else:
+            user_data = USER_STORE.profile(user_id)
+
+        if user_data:
+            return 200, {'success': True, 'user': user_data}
+        else:
+            return 404, {'success': False, 'error': 'User not found'}
+
+    except InvalidToken as e:
+        return token_rejected(e)
+
+    except Exception as e:
+        logger.error("Error getting user profile: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+def api_submission_status(submission_id):
+    """Whether a survey submission is still queued, failed or stored"""
+    try:
+        status = SURVEY_QUEUE.status(submission_id) if SURVEY_QUEUE is not None else None
+        if status == 'queued':
+            return 200, {'success': True, 'submission': {'submission_id': submission_id, 'status': 'queued'}}
+        if status is not None:
+            return 200, {'success': True, 'submission': {'submission_id': submission_id, 'status': 'failed',
+                                                         'error': status[1]}}
+
+        submission = USER_STORE.submission(submission_id)
+        if submission:
+            submission['status'] = 'stored'
+            return 200, {'success': True, 'submission': submission}
+        elif SURVEY_QUEUE is not None:
+            # Pre-fork workers each queue their own submissions
+            return 404, {'success': False, 'error': 'Submission not found, it may still be queued by another worker'}
+        else:
+            return 404, {'success': False, 'error': 'Submission not found'}
+
+    except Exception as e:
+        logger.error("Error getting submission status: %s", e)
+        return 500, {'success': False, 'error': str(e)}
+
+# Routes reported by name in metrics; ids are collapsed so the label set stays small
+METRIC_ROUTES = frozenset((
+    '/api/packages', '/api/health', '/api/metrics', '/api/recommend', '/api/recommend/batch',
+    '/api/auth/register', '/api/auth/login', '/api/survey/submit', '/api/admin/model',
+    '/api/admin/model/reload', '/api/admin/model/rollback'
+))
+METRIC_METHODS = frozenset(('GET', 'HEAD', 'POST', 'OPTIONS'))
+
+def route_label(path):
+    """Metrics label for a request path"""
+    path = urllib.parse.urlsplit(path).path
+    if path in METRIC_ROUTES:
+        return path
+    if path.startswith('/api/user/'):
+        return '/api/user/<id>'
+    if path.startswith('/api/survey/submission/'):
+        return '/api/survey/submission/<id>'
+    return 'other' if path.startswith('/api/') else 'static'
+
+def record_request(method, path, status, seconds):
+    """Count one response and observe its latency"""
+    route = route_label(path)
+    method = method if method in METRIC_METHODS else 'other'
+    REQUEST_SECONDS.observe(seconds, route, method)
+    REQUESTS_TOTAL.inc(route, method, str(status))
+    if status >= 500:
+        REQUEST_ERRORS_TOTAL.inc(route)
+
+def metrics_response():
+    """(status, headers, body) for GET /api/metrics"""
+    return 200, {'Content-Type': METRICS.CONTENT_TYPE, 'Cache-Control': 'no-store'}, METRICS.render()
+
+def parse_submission_id(path):
+    """Extract the id from /api/survey/submission/<id>, or None if it isn't a submission id"""
+    submission_id = path.split('/')[-1]
+    return submission_id if is_submission_id(submission_id) else None
+
+def is_submission_id(value):
+    """True for 32 lowercase hex digits, the format of uuid4().hex"""
+    return isinstance(value, str) and len(value) == 32 and all(c in '0123456789abcdef' for c in value)
+
+def parse_user_id(path):
+    """Extract the numeric user id from /api/user/<id>, or None if invalid"""
+    try:
+        return int(path.split('/')[-1])
+    except (ValueError, IndexError):
+        return None
+
 class HybridRequestHandler(http.server.SimpleHTTPRequestHandler):
 
-    def __init__(self, *args, **kwargs):
-        self.recommendation_engine = HybridRecommendationEngine()
-        super().__init__(*args, **kwargs)
+    # Persistent connections, so a proxy can keep an upstream pool instead of reconnecting per request
+    protocol_version = 'HTTP/1.1'
+    idle_timeout = 75.0
+    max_requests_per_connection = 1000
+    # Headers and body go out in separate writes; with Nagle on, the body waits for the
+    # client's delayed ACK of the headers (~40 ms) on every reused connection
+    disable_nagle_algorithm = True
+    # Longest a client may stall partway through a request
+    timeout = 30
+    # How often an idle connection checks whether a new one is queued behind it
+    KEEPALIVE_POLL = 0.25
+
+    def setup(self):
+        super().setup()
+        self.requests_on_connection = 0
+        self.response_status = None
+        self.request_started = None
+
+    def parse_request(self):
+        self.request_started = time.perf_counter()
+        if not super().parse_request():
+            return False
+        begin_request(self.headers.get('X-Request-ID'))
+        return True
+
+    def handle_one_request(self):
+        self.response_status = None
+        REQUEST_ID.set(None)
+        super().handle_one_request()
+        if self.response_status is not None and self.command:
+            record_request(self.command, self.path, self.response_status, time.perf_counter() - self.request_started)
+
+    def handle(self):
+        """Serve requests until the client closes, goes idle or reaches the per-connection cap"""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        """True once the next request is readable; False to close an idle connection"""
+        # A pipelined request may already sit in the read buffer, where select() can't see it
+        self.connection.setblocking(False)
+        try:
+            buffered = self.rfile.peek(1)
+        except (BlockingIOError, socket.timeout):
+            buffered = b''
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+        if buffered:
+            return True
+
+        deadline = time.monotonic() + self.idle_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                readable, _, _ = select.select([self.connection], [], [], min(remaining, self.KEEPALIVE_POLL))
+            except (OSError, ValueError):
+                return False
+            if readable:
+                return True
+            # Don't let an idle client hold the thread a waiting connection needs
+            has_waiting = getattr(self.server, 'has_waiting_connections', None)
+            if has_waiting is not None and has_waiting():
+                return False
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        self.requests_on_connection += 1
+        self.response_status = code
+
+    def end_headers(self):
+        request_id = REQUEST_ID.get()
+        if request_id is not None:
+            self.send_header('X-Request-ID', request_id)
+        # send_header('Connection', 'close') already set close_connection, so the header isn't repeated
+        if not self.close_connection:
+            if self.requests_on_connection >= self.max_requests_per_connection:
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                # HTTP/1.0 clients only keep the connection when told so
+                self.send_header('Connection', 'keep-alive')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        # Instead of the stdlib's synchronous write to stderr per request
+        access_logger.info(format, *args, extra={'client': self.address_string()})
+
+    @property
+    def recommendation_engine(self):
+        return ENGINE_REGISTRY.get_engine()
 
     def do_OPTIONS(self):
         """Handle CORS preflight requests"""
@@ -647,6 +2382,7 @@ class HybridRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def do_GET(self):
@@ -655,366 +2391,603 @@ class HybridRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_packages()
         elif self.path == '/api/health':
             self.health_check()
+        elif self.path == '/api/metrics':
+            self.send_encoded(*metrics_response())
+        elif self.path == '/api/admin/model':
+            self.handle_admin(api_model_versions)
+        elif self.path.startswith('/api/survey/submission/'):
+            submission_id = parse_submission_id(self.path)
+            if submission_id is None:
+                self.send_error(400)
+            else:
+                self.send_json(*api_submission_status(submission_id))
         elif self.path.startswith('/api/user/'):
             # Extract user ID from path
-            try:
-                user_id = int(self.path.split('/')[-1])
-                self.handle_user_profile(user_id)
-            except (ValueError, IndexError):
+            user_id = parse_user_id(self.path)
+            if user_id is None:
                 self.send_error(400)
+            else:
+                self.handle_user_profile(user_id)
         else:
-            super().do_GET()
+            self.send_static()
+
+    def do_HEAD(self):
+        """Handle HEAD requests for static files"""
+        self.send_static(head=True)
 
     def do_POST(self):
         """Handle POST requests"""
-        if self.path == '/api/recommend':
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            # Bodies are read by Content-Length only
+            self.send_error(411)
+        elif self.path == '/api/recommend':
             self.handle_hybrid_recommendation()
+        elif self.path == '/api/recommend/batch':
+            self.handle_batch_recommendation()
         elif self.path == '/api/auth/register':
             self.handle_register()
         elif self.path == '/api/auth/login':
             self.handle_login()
         elif self.path == '/api/survey/submit':
             self.handle_survey_submission()
+        elif self.path == '/api/admin/model/reload':
+            self.handle_admin(api_model_reload, self.read_post_data())
+        elif self.path == '/api/admin/model/rollback':
+            self.handle_admin(api_model_rollback, self.read_post_data())
         else:
             self.send_error(404)
 
-    def send_packages(self):
-        """Send all available packages"""
-        self.send_response(200)
+    def read_post_data(self):
+        """Read the request body, defaulting to an empty JSON object"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length > 0:
+            with STAGE_SECONDS.time('read_body'):
+                return self.rfile.read(content_length)
+        return b'{}'
+
+    def send_json(self, status, payload):
+        """Send a JSON response with CORS headers"""
+        with STAGE_SECONDS.time('serialize'):
+            body = json.dumps(payload).encode()
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_static(self, head=False):
+        """Send a file under the static root, honouring validators and Range"""
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        response = STATIC_FILES.respond(self.path, headers)
+        if response.status == 404:
+            self.send_error(404, "File not found")
+            return
+
+        self.send_response(response.status)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        if response.status != 304:
+            self.send_header('Content-Length', str(response.length if response.path else len(response.body)))
         self.end_headers()
+        if head or response.status == 304:
+            return
 
-        response = json.dumps(PACKAGES)
-        self.wfile.write(response.encode())
+        if response.path is None:
+            self.wfile.write(response.body)
+        else:
+            # Large files go from the page cache to the socket without passing through Python
+            with open(response.path, 'rb') as f:
+                self.connection.sendfile(f, response.offset, response.length)
 
-    def health_check(self):
-        """Health check endpoint"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
+    def send_packages(self):
+        """Send all available packages"""
+        self.send_encoded(*packages_response(self.headers.get('Accept-Encoding'), self.headers.get('If-None-Match')))
+
+    def send_encoded(self, status, headers, body):
+        """Send a pre-encoded response as (status, headers, body)"""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
         self.end_headers()
+        if body:
+            self.wfile.write(body)
 
-        health_data = {
-            'status': 'healthy',
-            'ml_model_loaded': self.recommendation_engine.ml_processor.model_loaded,
-            'feature_encoder_ready': True,
-            'weighting_logic_ready': True,
-            'survey_analyzer_ready': True,
-            'hybrid_engine': 'active',
-            'model_type': 'model_telco_recommendation.pkl'
-        }
-
-        response = json.dumps(health_data)
-        self.wfile.write(response.encode())
+    def health_check(self):
+        """Health check endpoint"""
+        self.send_json(*api_health())
 
     def handle_hybrid_recommendation(self):
         """Handle hybrid recommendation request"""
+        self.send_json(*api_recommend(self.read_post_data()))
+
+    def handle_batch_recommendation(self):
+        """Stream NDJSON recommendations for a JSON array or NDJSON body"""
         content_length = int(self.headers.get('Content-Length', 0))
-        if content_length > 0:
-            post_data = self.rfile.read(content_length)
-        else:
-            post_data = b'{}'
 
         try:
-            survey_data = json.loads(post_data.decode('utf-8'))
-
-            # Get hybrid recommendations (ML + Survey)
-            recommendations = self.recommendation_engine.get_hybrid_recommendations(survey_data)
-
-            # Count recommendation types
-            ml_count = sum(1 for r in recommendations if r.get('recommendation_type') == 'ml_model')
-            survey_count = sum(1 for r in recommendations if r.get('recommendation_type') == 'survey_based')
-
-            # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-
-            response = json.dumps({
-                'success': True,
-                'recommendations': recommendations,
-                'metadata': {
-                    'ml_model_used': self.recommendation_engine.ml_processor.model_loaded,
-                    'feature_encoding': 'active',
-                    'weighting_logic': 'active',
-                    'survey_analysis': 'active',
-                    'total_recommendations': len(recommendations),
-                    'ml_count': ml_count,
-                    'survey_count': survey_count,
-                    'recommendation_source': 'Hybrid ML Model + Survey Analysis',
-                    'model_file': 'model_telco_recommendation.pkl'
-                }
-            })
-            self.wfile.write(response.encode())
-
+            # Decode straight off the socket, one chunk at a time, so memory stays flat
+            results = iter_batch_results(iter_batch_surveys(self._body_chunks(content_length)))
+            first_chunk = next(results, b'')
         except Exception as e:
-            print(f"Error in hybrid recommendation: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            error_response = json.dumps({'success': False, 'error': str(e)})
-            self.wfile.write(error_response.encode())
-
-    def handle_register(self):
-        """Handle user registration"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length > 0:
-            post_data = self.rfile.read(content_length)
+            logger.error("Error in batch recommendation: %s", e)
+            # Part of the body may still be unread, so the connection can't carry another request
+            self.close_connection = True
+            self.send_json(400, {'success': False, 'error': str(e)})
+            return
+
+        # The length isn't known up front: chunk the stream on HTTP/1.1, end it by closing on HTTP/1.0
+        chunked = self.request_version != 'HTTP/1.0'
+        if not chunked:
+            self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
         else:
-            post_data = b'{}'
-
-        try:
-            data = json.loads(post_data.decode('utf-8'))
-
-            # Connect to database
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-
-            # Check if user already exists
-            cursor.execute('SELECT id FROM users WHERE email = ?', (data['email'],))
-            existing_user = cursor.fetchone()
-
-            if existing_user:
-                conn.close()
-                self.send_response(400)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                error_response = json.dumps({'success': False, 'error': 'Email already registered'})
-                self.wfile.write(error_response.encode())
-                return
-
-            # Insert new user
-            cursor.execute('''
-                INSERT INTO users (name, email, password, phone)
-                VALUES (?, ?, ?, ?)
-            ''', (data['name'], data['email'], data['password'], data['phone']))
-
-            user_id = cursor.lastrowid
-            conn.commit()
-
-            # Get user data
-            cursor.execute('SELECT id, name, email, phone, package FROM users WHERE id = ?', (user_id,))
-            user = cursor.fetchone()
-            conn.close()
-
-            if user:
-                user_data = {
-                    'id': user[0],
-                    'name': user[1],
-                    'email': user[2],
-                    'phone': user[3],
-                    'package': user[4]
-                }
-
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                response = json.dumps({'success': True, 'user': user_data})
-                self.wfile.write(response.encode())
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        for chunk in itertools.chain((first_chunk,), results):
+            if not chunk:
+                continue
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
             else:
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                error_response = json.dumps({'success': False, 'error': 'Registration failed'})
-                self.wfile.write(error_response.encode())
+                self.wfile.write(chunk)
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def _body_chunks(self, remaining):
+        """Yield the request body in pieces without reading past Content-Length"""
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, BATCH_READ_SIZE))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
 
-        except Exception as e:
-            print(f"Error in registration: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            error_response = json.dumps({'success': False, 'error': str(e)})
-            self.wfile.write(error_response.encode())
+    def handle_register(self):
+        """Handle user registration"""
+        self.send_json(*api_register(self.read_post_data()))
 
     def handle_login(self):
         """Handle user login"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length > 0:
-            post_data = self.rfile.read(content_length)
-        else:
-            post_data = b'{}'
-
-        try:
-            data = json.loads(post_data.decode('utf-8'))
-
-            # Connect to database
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-
-            # Check user credentials
-            cursor.execute('''
-                SELECT id, name, email, phone, package
-                FROM users
-                WHERE email = ? AND password = ?
-            ''', (data['email'], data['password']))
-
-            user = cursor.fetchone()
-            conn.close()
-
-            if user:
-                user_data = {
-                    'id': user[0],
-                    'name': user[1],
-                    'email': user[2],
-                    'phone': user[3],
-                    'package': user[4]
-                }
-
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                response = json.dumps({'success': True, 'user': user_data})
-                self.wfile.write(response.encode())
-            else:
-                self.send_response(401)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                error_response = json.dumps({'success': False, 'error': 'Invalid email or password'})
-                self.wfile.write(error_response.encode())
-
-        except Exception as e:
-            print(f"Error in login: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            error_response = json.dumps({'success': False, 'error': str(e)})
-            self.wfile.write(error_response.encode())
+        self.send_json(*api_login(self.read_post_data()))
 
     def handle_survey_submission(self):
         """Handle survey submission from authenticated users"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length > 0:
-            post_data = self.rfile.read(content_length)
-        else:
-            post_data = b'{}'
-
-        try:
-            data = json.loads(post_data.decode('utf-8'))
-
-            # Connect to database
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-
-            # Store survey response
-            cursor.execute('''
-                INSERT INTO survey_responses (user_id, survey_data, recommendations)
-                VALUES (?, ?, ?)
-            ''', (data['user_id'], json.dumps(data['survey_data']), json.dumps(data['recommendations'])))
-
-            # Update user's last survey
-            cursor.execute('''
-                UPDATE users SET last_survey = ?, package = ?
-                WHERE id = ?
-            ''', (json.dumps(data['survey_data']), data.get('selected_package', None), data['user_id']))
-
-            conn.commit()
-            conn.close()
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = json.dumps({'success': True, 'message': 'Survey submitted successfully'})
-            self.wfile.write(response.encode())
-
-        except Exception as e:
-            print(f"Error in survey submission: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            error_response = json.dumps({'success': False, 'error': str(e)})
-            self.wfile.write(error_response.encode())
+        self.send_json(*api_survey_submit(self.read_post_data(), self.headers.get('Authorization')))
 
     def handle_user_profile(self, user_id):
         """Handle user profile request"""
-        try:
-            # Connect to database
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-
-            # Get user data
-            cursor.execute('''
-                SELECT id, name, email, phone, package, created_at
-                FROM users
-                WHERE id = ?
-            ''', (user_id,))
-
-            user = cursor.fetchone()
-
-            # Get survey responses count
-            cursor.execute('''
-                SELECT COUNT(*) FROM survey_responses WHERE user_id = ?
-            ''', (user_id,))
-
-            survey_count = cursor.fetchone()[0]
-
-            conn.close()
-
-            if user:
-                user_data = {
-                    'id': user[0],
-                    'name': user[1],
-                    'email': user[2],
-                    'phone': user[3],
-                    'package': user[4],
-                    'created_at': user[5],
-                    'survey_count': survey_count
-                }
-
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                response = json.dumps({'success': True, 'user': user_data})
-                self.wfile.write(response.encode())
-            else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                error_response = json.dumps({'success': False, 'error': 'User not found'})
-                self.wfile.write(error_response.encode())
-
-        except Exception as e:
-            print(f"Error getting user profile: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            error_response = json.dumps({'success': False, 'error': str(e)})
-            self.wfile.write(error_response.encode())
-
-def run_server():
+        self.send_json(*api_user_profile(user_id, self.headers.get('Authorization')))
+
+    def handle_admin(self, operation, *args):
+        """Run an admin operation if the request carries the admin token"""
+        if not admin_authorized(self.headers.get('X-Admin-Token', '')):
+            self.send_json(*admin_forbidden())
+            return
+        self.send_json(*operation(*args))
+
+# Listed in the startup log
+ENDPOINTS = (
+    'GET  /api/packages - Get all available packages',
+    'GET  /api/health - Check system status',
+    'GET  /api/metrics - Latency histograms and request counters (Prometheus text format)',
+    'POST /api/recommend - Get hybrid recommendations',
+    'POST /api/recommend/batch - Score a JSON array or NDJSON stream of surveys',
+    'GET  /api/survey/submission/<id> - Status of a survey submission',
+    'GET  /api/admin/model - Serving model version and rollback history (X-Admin-Token)',
+    'POST /api/admin/model/reload, /api/admin/model/rollback - Swap model versions (X-Admin-Token)'
+)
+
+def run_server(host="", port=8000, workers=1, threads_per_worker=1, reuse_port=False, micro_batching=None,
+               cache=None, inference_backend='auto', model_reload=None, write_behind=None, profile_cache=None,
+               catalog=None, static_files=None, keep_alive=None):
     """Initialize and run the hybrid server"""
     # Initialize database
     init_database()
-
-    # Create and run server
-    PORT = 8000  # Use original port
-    with socketserver.TCPServer(("", PORT), HybridRequestHandler) as httpd:
-        print(f"Sphinx Net Hybrid ML + Survey Server running at http://localhost:{PORT}")
-        print("Hybrid System: ML Model (model_telco_recommendation.pkl) + Survey Analysis")
-        print("Available endpoints:")
-        print("  GET  /api/packages - Get all available packages")
-        print("  GET  /api/health - Check system status")
-        print("  POST /api/recommend - Get hybrid recommendations")
-        print("\nFeatures:")
-        print("   ML Model predictions using model_telco_recommendation.pkl with feature encoding")
-        print("   Survey analysis for complementary recommendations")
-        print("   Weighting logic: Budget (35%) + Usage (30%) + Need (20%) + Tech (15%)")
-        print("   Hybrid output: 3 ML + 3 Survey recommendations")
-        httpd.serve_forever()
+    if write_behind:
+        enable_write_behind(**write_behind)
+    if profile_cache:
+        enable_profile_cache(**profile_cache)
+    if catalog:
+        enable_catalog(**catalog)
+    if static_files:
+        enable_static_files(**static_files)
+    if keep_alive:
+        enable_keep_alive(**keep_alive)
+
+    # Load the model once for the whole process before accepting connections.
+    # In pre-fork mode this happens in the parent so workers share the pages.
+    ENGINE_REGISTRY.initialize(micro_batching=micro_batching, cache=cache, inference_backend=inference_backend,
+                               model_reload=model_reload)
+
+    logger.info("Sphinx Net Hybrid ML + Survey Server running at http://localhost:%s", port,
+                extra={'endpoints': ENDPOINTS})
+    logger.info("Hybrid output: 3 ML + 3 Survey recommendations, weighting Budget (35%) + Usage (30%) + "
+                "Need (20%) + Tech (15%); send SIGHUP to hot-reload the model file in every worker")
+
+    if workers > 1 and hasattr(os, 'fork'):
+        logger.info("Pre-fork mode: %d workers x %d thread(s)", workers, threads_per_worker)
+        # A scrape reaches whichever worker accepts it, so workers publish their
+        # metrics here and each one serves the sum
+        METRICS.enable_sharing(tempfile.mkdtemp(prefix='sphinx-metrics-'))
+        try:
+            PreforkServer(
+                (host, port),
+                HybridRequestHandler,
+                workers=workers,
+                threads_per_worker=threads_per_worker,
+                reuse_port=reuse_port,
+                worker_init=start_worker,
+                worker_exit=shutdown_worker,
+                on_reload=ENGINE_REGISTRY.reload_in_background
+            ).serve_forever()
+        finally:
+            shutil.rmtree(METRICS.directory, ignore_errors=True)
+        return
+
+    install_reload_signal()
+    # Exit through SystemExit on SIGTERM so queued survey writes are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    ENGINE_REGISTRY.start_model_watcher()
+    try:
+        with PooledTCPServer((host, port), HybridRequestHandler, threads=threads_per_worker) as httpd:
+            httpd.serve_forever()
+    finally:
+        flush_write_behind()
+
+def install_reload_signal():
+    """Hot-reload the model on SIGHUP in a single-process server"""
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: ENGINE_REGISTRY.reload_in_background())
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+NDJSON_HEADERS = {'Content-Type': 'application/x-ndjson', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
+}
+
+def streams_request_body(method, target):
+    """Batch bodies are read as they are scored rather than up front, whatever their size"""
+    return method == 'POST' and urllib.parse.urlsplit(target).path == '/api/recommend/batch'
+
+def make_async_dispatch(inference_executor, db_executor):
+    """Build the asyncio route table; model and sqlite work run off the event loop"""
+
+    def json_response(status, payload):
+        with STAGE_SECONDS.time('serialize'):
+            return status, JSON_HEADERS, json.dumps(payload).encode()
+
+    def static_response(path, headers):
+        response = STATIC_FILES.respond(path, headers)
+        if response.path is not None:
+            return response.status, response.headers, FileBody(response.path, response.offset, response.length)
+        return response.status, response.headers, response.body
+
+    async def batch_response(body):
+        # Reading, decoding and scoring all happen on the inference pool, one chunk at a time;
+        # the pool thread waits on the event loop for each piece of the body
+        chunks = body.iter_chunks(asyncio.get_running_loop(), BATCH_READ_SIZE)
+        results = iter_batch_results(iter_batch_surveys(chunks))
+        try:
+            first_chunk = await inference_executor.run(next, results, b'')
+        except Exception as e:
+            logger.error("Error in batch recommendation: %s", e)
+            return json_response(400, {'success': False, 'error': str(e)})
+
+        async def stream():
+            yield first_chunk
+            while True:
+                chunk = await inference_executor.run(next, results, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+        return 200, NDJSON_HEADERS, stream()
+
+    post_db_routes = {
+        '/api/auth/register': api_register,
+        '/api/auth/login': api_login
+    }
+    post_admin_routes = {
+        '/api/admin/model/reload': api_model_reload,
+        '/api/admin/model/rollback': api_model_rollback
+    }
+
+    async def dispatch(method, path, headers, body):
+        path = urllib.parse.urlsplit(path).path
+
+        if method == 'OPTIONS':
+            return 200, PREFLIGHT_HEADERS, b''
+
+        if method in ('GET', 'HEAD'):
+            if path == '/api/packages':
+                return packages_response(headers.get('accept-encoding'), headers.get('if-none-match'))
+            elif path == '/api/health':
+                return json_response(*api_health())
+            elif path == '/api/metrics':
+                return metrics_response()
+            elif path == '/api/admin/model':
+                if not admin_authorized(headers.get('x-admin-token', '')):
+                    return json_response(*admin_forbidden())
+                return json_response(*api_model_versions())
+            elif path.startswith('/api/survey/submission/'):
+                submission_id = parse_submission_id(path)
+                if submission_id is None:
+                    return 400, CORS_HEADERS, b''
+                return json_response(*await db_executor.run(api_submission_status, submission_id))
+            elif path.startswith('/api/user/'):
+                user_id = parse_user_id(path)
+                if user_id is None:
+                    return 400, CORS_HEADERS, b''
+                return json_response(*await db_executor.run(api_user_profile, user_id,
+                                                            headers.get('authorization')))
+            elif not path.startswith('/api/'):
+                # stat() and small reads block, so they share the pool with sqlite
+                return await db_executor.run(static_response, path, headers)
+            return 404, CORS_HEADERS, b''
+
+        if method == 'POST':
+            post_data = body or b'{}'
+            if path == '/api/recommend':
+                return json_response(*await inference_executor.run(api_recommend, post_data))
+            elif path == '/api/recommend/batch':
+                return await batch_response(body)
+            elif path == '/api/survey/submit':
+                return json_response(*await db_executor.run(api_survey_submit, post_data,
+                                                            headers.get('authorization')))
+            elif path in post_db_routes:
+                return json_response(*await db_executor.run(post_db_routes[path], post_data))
+            elif path in post_admin_routes:
+                if not admin_authorized(headers.get('x-admin-token', '')):
+                    return json_response(*admin_forbidden())
+                # Loading a model is CPU work; keep it off the event loop
+                return json_response(*await inference_executor.run(post_admin_routes[path], post_data))
+            return 404, CORS_HEADERS, b''
+
+        return 501, CORS_HEADERS, b''
+
+    async def timed_dispatch(method, path, headers, body):
+        # Each connection is its own task, so the request id stays with this request
+        request_id = begin_request(headers.get('x-request-id'))
+        # Streamed batch responses are timed up to their first chunk
+        start = time.perf_counter()
+        status, response_headers, response_body = await dispatch(method, path, headers, body)
+        record_request(method, path, status, time.perf_counter() - start)
+        return status, dict(response_headers, **{'X-Request-ID': request_id}), response_body
+
+    return timed_dispatch
+
+def run_async_server(host="", port=8000, inference_threads=None, db_threads=4, idle_timeout=75.0,
+                     max_requests_per_connection=1000, micro_batching=None, cache=None, inference_backend='auto',
+                     model_reload=None, write_behind=None, profile_cache=None, catalog=None, static_files=None):
+    """Initialize and run the asyncio front end with bounded worker pools"""
+    init_database()
+    if write_behind:
+        enable_write_behind(**write_behind)
+    if profile_cache:
+        enable_profile_cache(**profile_cache)
+    if catalog:
+        enable_catalog(**catalog)
+    if static_files:
+        enable_static_files(**static_files)
+    ENGINE_REGISTRY.initialize(micro_batching=micro_batching, cache=cache, inference_backend=inference_backend,
+                               model_reload=model_reload)
+    install_reload_signal()
+    ENGINE_REGISTRY.start_model_watcher()
+
+    inference_threads = inference_threads or os.cpu_count() or 1
+    inference_executor = BoundedExecutor('inference', inference_threads)
+    db_executor = BoundedExecutor('sqlite', db_threads)
+
+    server = AsyncHTTPServer(
+        make_async_dispatch(inference_executor, db_executor),
+        host=host,
+        port=port,
+        idle_timeout=idle_timeout,
+        max_requests_per_connection=max_requests_per_connection,
+        stream_body=streams_request_body
+    )
+    logger.info("Sphinx Net Hybrid ML + Survey Server (asyncio) running at http://localhost:%s", port,
+                extra={'endpoints': ENDPOINTS, 'inference_threads': inference_threads, 'db_threads': db_threads})
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        inference_executor.shutdown()
+        ENGINE_REGISTRY.close_scheduler()
+        db_executor.shutdown()
+        flush_write_behind()
+
+def export_model_artifact(model_path, output_path=None):
+    """Convert a pickled model into a memory-mappable artifact, by default next to it"""
+    output_path = output_path or artifact_path(model_path)
+    processor = MLModelProcessor()
+    version = processor.build_version(model_path)
+    if version.compiled_model is None:
+        raise ModelValidationError(f"{model_path} cannot be compiled into node arrays")
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    write_artifact(version.compiled_model, output_path, metadata={
+        'source_path': os.path.relpath(os.path.abspath(model_path), output_dir),
+        'source_fingerprint': version.fingerprint,
+        'source_stamp': file_stamp(model_path),
+        'max_difference': version.compiled_max_difference
+    })
+
+    # Read it back the way the server will and check it against the pickle
+    forest, _ = load_artifact(output_path)
+    difference = forest.max_difference(version.model, processor.feature_encoder.sample_feature_matrix(2048, seed=1))
+    if difference > 1e-9:
+        os.remove(output_path)
+        raise ModelValidationError(f"Exported artifact differs from {model_path} by {difference:.3g}")
+
+    logger.info("Exported %s (%s) to %s: %d trees, %d nodes, %d bytes", model_path, version.label, output_path,
+                forest.n_trees, forest.n_nodes, os.path.getsize(output_path))
+    return output_path
+
+def parse_args(argv=None):
+    """Parse command line options for the server"""
+    parser = argparse.ArgumentParser(description='Sphinx Net Hybrid ML + Survey Server')
+    parser.add_argument('--host', default='', help='Interface to bind (default: all)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of pre-forked worker processes, 0 = one per CPU (default: 1)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='Request threads in each worker process (default: 1)')
+    parser.add_argument('--reuse-port', action='store_true',
+                        help='Give each worker its own SO_REUSEPORT socket instead of a shared one')
+    parser.add_argument('--async', dest='async_mode', action='store_true',
+                        help='Serve the API and static files with the asyncio front end instead of threads')
+    parser.add_argument('--inference-threads', type=int, default=None,
+                        help='asyncio mode: model inference pool size (default: one per CPU)')
+    parser.add_argument('--db-threads', type=int, default=4,
+                        help='asyncio mode: sqlite pool size (default: 4)')
+    parser.add_argument('--idle-timeout', type=float, default=75.0,
+                        help='Seconds before an idle keep-alive connection is closed (default: 75)')
+    parser.add_argument('--max-requests-per-connection', type=int, default=1000,
+                        help='Responses on one keep-alive connection before it is closed (default: 1000)')
+    parser.add_argument('--micro-batch-window-ms', type=float, default=0,
+                        help='Coalesce concurrent /api/recommend predictions for up to this long (0 = off)')
+    parser.add_argument('--micro-batch-size', type=int, default=64,
+                        help='Maximum rows per coalesced prediction (default: 64)')
+    parser.add_argument('--micro-batch-queue', type=int, default=1024,
+                        help='Maximum queued predictions before returning 503 (default: 1024)')
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help='Recommendation results kept in the LRU cache, 0 = no cache (default: 4096)')
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help='Seconds before a cached recommendation expires, 0 = never (default: 0)')
+    parser.add_argument('--inference-backend', choices=['auto', 'sklearn'], default='auto',
+                        help='auto: compiled forest when it matches sklearn, sklearn: always sklearn')
+    parser.add_argument('--write-behind', dest='write_behind_enabled', action='store_true',
+                        help='Acknowledge survey submissions at once and store them in batched transactions')
+    parser.add_argument('--write-behind-queue', type=int, default=10000,
+                        help='Queued survey submissions before returning 503 (default: 10000)')
+    parser.add_argument('--write-behind-batch', type=int, default=256,
+                        help='Maximum survey submissions per transaction (default: 256)')
+    parser.add_argument('--write-behind-interval-ms', type=float, default=50,
+                        help='Longest a queued survey submission waits for its batch to fill (default: 50)')
+    parser.add_argument('--profile-cache-size', type=int, default=10000,
+                        help='User profiles kept in memory, 0 = no cache (default: 10000)')
+    parser.add_argument('--profile-cache-ttl', type=float, default=30,
+                        help='Seconds a cached profile may be served, bounds staleness across '
+                             'pre-fork workers; 0 = until invalidated (default: 30)')
+    parser.add_argument('--catalog', metavar='PATH', default=DEFAULT_CATALOG_PATH,
+                        help='Package catalog shared with the website (default: data/packages.json)')
+    parser.add_argument('--catalog-check-interval', type=float, default=2.0,
+                        help='Seconds between checks of the catalog file for changes (default: 2)')
+    parser.add_argument('--static-root', default='.',
+                        help='Directory served for GET requests outside /api/ (default: current directory)')
+    parser.add_argument('--static-max-age', type=int, default=3600,
+                        help='Cache-Control max-age for static files other than HTML pages (default: 3600)')
+    parser.add_argument('--static-cache-entries', type=int, default=512,
+                        help='Small static files kept in memory, 0 = read every request (default: 512)')
+    parser.add_argument('--static-cache-max-kb', type=int, default=128,
+                        help='Largest static file kept in memory; larger ones use sendfile() (default: 128)')
+    parser.add_argument('--log-level', default=os.environ.get('LOG_LEVEL', 'INFO'),
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper,
+                        help='Lowest level written to the JSON-lines log on stdout (default: INFO or $LOG_LEVEL)')
+    parser.add_argument('--log-sample-rate', type=float, default=1.0,
+                        help='Fraction of requests whose debug detail, e.g. model predictions, is logged '
+                             'at --log-level DEBUG (default: 1)')
+    parser.add_argument('--log-queue-size', type=int, default=10000,
+                        help='Log records waiting to be written before new ones are dropped (default: 10000)')
+    parser.add_argument('--ephemeral-secret', action='store_true',
+                        help='Start without SECRET_KEY, signing session tokens with a random key that '
+                             'changes on every restart (local development only)')
+    parser.add_argument('--export-model', metavar='PICKLE',
+                        help='Write a memory-mappable .forest artifact for this pickled model and exit')
+    parser.add_argument('--export-output', metavar='PATH',
+                        help='Artifact path for --export-model (default: the pickle path with .forest)')
+    parser.add_argument('--model-watch-interval', type=float, default=0,
+                        help='Seconds between checks of the model file for hot reload, 0 = off (default: 0)')
+    parser.add_argument('--model-history', type=int, default=MLModelProcessor.HISTORY_SIZE,
+                        help=f'Previous model versions kept for rollback (default: {MLModelProcessor.HISTORY_SIZE})')
+    args = parser.parse_args(argv)
+    if not os.environ.get('SECRET_KEY') and not args.ephemeral_secret and not args.export_model:
+        parser.error("SECRET_KEY is not set; session tokens need a key shared by every worker and "
+                     "kept across restarts. Set SECRET_KEY, or pass --ephemeral-secret for local development")
+    if args.workers <= 0:
+        args.workers = os.cpu_count() or 1
+    args.micro_batching = None
+    if args.micro_batch_window_ms > 0:
+        args.micro_batching = {
+            'max_batch_size': args.micro_batch_size,
+            'max_wait_ms': args.micro_batch_window_ms,
+            'max_queue': args.micro_batch_queue
+        }
+    args.cache = None
+    if args.cache_size > 0:
+        args.cache = {'max_entries': args.cache_size, 'ttl': args.cache_ttl or None}
+    args.model_reload = {'history': args.model_history, 'watch_interval': args.model_watch_interval}
+    args.catalog = {'path': args.catalog, 'check_interval': args.catalog_check_interval}
+    args.static_files = {
+        'root': args.static_root,
+        'max_age': args.static_max_age,
+        'cache_entries': args.static_cache_entries,
+        'cache_max_file': args.static_cache_max_kb * 1024
+    }
+    args.keep_alive = {'idle_timeout': args.idle_timeout, 'max_requests': args.max_requests_per_connection}
+    args.profile_cache = None
+    if args.profile_cache_size > 0:
+        args.profile_cache = {'max_entries': args.profile_cache_size, 'ttl': args.profile_cache_ttl or None}
+    args.write_behind = None
+    if args.write_behind_enabled:
+        args.write_behind = {
+            'max_queue': args.write_behind_queue,
+            'batch_size': args.write_behind_batch,
+            'flush_interval_ms': args.write_behind_interval_ms
+        }
+    return args
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    args = parse_args()
+    configure_logging(args.log_level, sample_rate=args.log_sample_rate, queue_size=args.log_queue_size)
+    if not os.environ.get('SECRET_KEY') and not args.export_model:
+        logger.warning("SECRET_KEY is not set, session tokens are invalidated by every restart")
+    if args.export_model:
+        export_model_artifact(args.export_model, args.export_output)
+    elif args.async_mode:
+        run_async_server(
+            host=args.host,
+            port=args.port,
+            inference_threads=args.inference_threads,
+            db_threads=args.db_threads,
+            idle_timeout=args.idle_timeout,
+            max_requests_per_connection=args.max_requests_per_connection,
+            micro_batching=args.micro_batching,
+            cache=args.cache,
+            inference_backend=args.inference_backend,
+            model_reload=args.model_reload,
+            write_behind=args.write_behind,
+            profile_cache=args.profile_cache,
+            catalog=args.catalog,
+            static_files=args.static_files
+        )
+    else:
+        run_server(
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            threads_per_worker=args.threads_per_worker,
+            reuse_port=args.reuse_port,
+            micro_batching=args.micro_batching,
+            cache=args.cache,
+            inference_backend=args.inference_backend,
+            model_reload=args.model_reload,
+            write_behind=args.write_behind,
+            profile_cache=args.profile_cache,
+            catalog=args.catalog,
+            static_files=args.static_files,
+            keep_alive=args.keep_alive
+        )
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+In-process request metrics
+Fixed-bucket latency histograms and counters, rendered in the Prometheus text format,
+optionally summed over the pre-fork workers through a shared directory
+"""
+
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cached lookup (~100 us) to a slow model reload
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """Context manager that observes its elapsed time into one histogram series"""
+
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.series.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramSeries:
+    """Bucket counts, sum and count for one combination of label values"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.sum = 0.0
+            self.count = 0
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, one series per label combination"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The series for these label values, created on first use"""
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(values, _HistogramSeries(self.buckets))
+        return series
+
+    def observe(self, value, *label_values):
+        self.labels(*label_values).observe(value)
+
+    def time(self, *label_values):
+        """`with histogram.time('encode'):` observes the block's duration in seconds"""
+        return _Timer(self.labels(*label_values))
+
+    def snapshot(self):
+        """{label values: (bucket counts, sum, count)}"""
+        with self._lock:
+            items = list(self._series.items())
+        return {values: series.snapshot() for values, series in items}
+
+    def reset(self):
+        with self._lock:
+            for series in self._series.values():
+                series.reset()
+
+    @staticmethod
+    def merge(total, snapshot):
+        """Add one process's snapshot into `total`"""
+        for values, (counts, value_sum, count) in snapshot.items():
+            if values in total:
+                previous_counts, previous_sum, previous_count = total[values]
+                counts = [a + b for a, b in zip(previous_counts, counts)]
+                value_sum += previous_sum
+                count += previous_count
+            total[values] = (list(counts), value_sum, count)
+
+    def render(self, snapshot=None):
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        lines = []
+        for values, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, values, (('le', _format_value(float(bound))),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, values, (('le', '+Inf'),))
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.label_names, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one value per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def snapshot(self):
+        """{label values: value}"""
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(total, snapshot):
+        """Add one process's snapshot into `total`"""
+        for values, value in snapshot.items():
+            total[values] = total.get(values, 0) + value
+
+    def render(self, snapshot=None):
+        snapshot = self.snapshot() if snapshot is None else snapshot
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}'
+                for labels, value in sorted(snapshot.items())]
+
+
+class MetricsRegistry:
+    """Every metric of one process, in registration order
+
+    After enable_sharing(directory) each process writes its snapshot to
+    `directory/metrics-<pid>.json` and render() returns the sum over every
+    file there, so a scrape answered by any pre-fork worker covers all of
+    them. Files of exited workers stay, which keeps the sums monotonic when
+    a worker is restarted; the other workers' numbers lag by up to one
+    publish interval.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+        self._publish_lock = threading.Lock()
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def enable_sharing(self, directory):
+        """Sum metrics over every process publishing to `directory`; call before forking"""
+        self.directory = directory
+
+    def start_publishing(self, interval=1.0):
+        """In a freshly forked worker: start from zero and publish every `interval` seconds"""
+        # Whatever the parent observed before the fork is not this worker's
+        for metric in self._metrics:
+            metric.reset()
+        self.publish()
+
+        def publish_forever():
+            while True:
+                time.sleep(interval)
+                self.publish()
+
+        threading.Thread(target=publish_forever, name='metrics-publisher', daemon=True).start()
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def publish(self):
+        """Write this process's snapshot to the shared directory, replacing the previous one"""
+        if self.directory is None:
+            return
+        data = {metric.name: [[list(values), state] for values, state in metric.snapshot().items()]
+                for metric in self._metrics}
+        path = self._path(os.getpid())
+        temp_path = f'{path}.tmp'
+        try:
+            with self._publish_lock:
+                with open(temp_path, 'w') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("Could not publish metrics to %s: %s", self.directory, e)
+
+    def _shared_snapshots(self):
+        """{metric name: snapshot summed over every published process}"""
+        self.publish()
+        kinds = {metric.name: metric for metric in self._metrics}
+        totals = {name: {} for name in kinds}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Files are only ever replaced whole, so this is the directory being removed at shutdown
+                continue
+            for name, series in data.items():
+                if name in kinds:
+                    kinds[name].merge(totals[name], {tuple(values): state for values, state in series})
+        return totals
+
+    def render(self):
+        """Prometheus text exposition of every metric"""
+        snapshots = self._shared_snapshots() if self.directory is not None else {}
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(snapshots.get(metric.name)))
+        return ('\n'.join(lines) + '\n').encode('utf-8')
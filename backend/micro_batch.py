@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Adaptive micro-batching for single-row model inference
+Collects concurrent requests for a short window and runs them as one batch
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the scheduler queue is at its bound"""
+
+
+class _PendingRequest:
+    __slots__ = ('row', 'enqueued_at', 'done', 'result', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatchScheduler:
+    """Runs batch_fn(rows) -> results for rows submitted from many threads
+
+    A batch is flushed when it reaches max_batch_size or when the oldest row
+    has waited max_wait_ms. The window is adaptive: while recent batches held a
+    single row (low traffic) rows are flushed immediately, and the full window
+    only applies once concurrent requests are actually coalescing.
+    """
+
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+    def __init__(self, batch_fn, max_batch_size=64, max_wait_ms=2.0, max_queue=1024):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._pid = None
+        self._closing = False
+        self._avg_batch_size = 1.0
+
+        self.batches = 0
+        self.rows = 0
+        self.rejected = 0
+        self.errors = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.batch_size_counts = [0] * (len(self.BATCH_SIZE_BUCKETS) + 1)
+
+    def submit(self, row):
+        """Queue one row and block until its result is ready"""
+        self._ensure_worker()
+        request = _PendingRequest(row)
+
+        with self._cond:
+            if self._closing:
+                self.rejected += 1
+                raise InferenceQueueFull("Inference queue is shutting down")
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFull(f"Inference queue is full ({self.max_queue} pending)")
+            self._queue.append(request)
+            self._cond.notify()
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self, timeout=30.0):
+        """Stop accepting rows and wait until everything queued has its result"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            worker = self._worker if self._pid == os.getpid() else None
+        if worker is not None:
+            worker.join(timeout)
+            if worker.is_alive():
+                logger.warning("%d inference requests were not run before shutdown", len(self._queue))
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        with self._cond:
+            queue_depth = len(self._queue)
+        histogram = {}
+        for bucket, count in zip(self.BATCH_SIZE_BUCKETS, self.batch_size_counts):
+            histogram[f'<={bucket}'] = count
+        histogram[f'>{self.BATCH_SIZE_BUCKETS[-1]}'] = self.batch_size_counts[-1]
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'max_queue': self.max_queue,
+            'queue_depth': queue_depth,
+            'batches': self.batches,
+            'rows': self.rows,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'avg_batch_size': round(self.rows / self.batches, 2) if self.batches else 0,
+            'avg_queue_wait_ms': round(self.queue_wait_total / self.rows * 1000, 3) if self.rows else 0,
+            'max_queue_wait_ms': round(self.queue_wait_max * 1000, 3),
+            'batch_size_histogram': histogram
+        }
+
+    def _ensure_worker(self):
+        # The worker thread does not survive fork(), so start one per process
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue.clear()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name='micro-batch', daemon=True)
+            self._worker.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                if self._closing:
+                    return None
+                self._cond.wait()
+
+            # Only hold the batch open when traffic has recently been concurrent
+            if self._avg_batch_size >= 1.5 and not self._closing:
+                deadline = self._queue[0].enqueued_at + self.max_wait
+                while len(self._queue) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._closing:
+                        break
+                    self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.monotonic()
+
+            try:
+                results = self.batch_fn([request.row for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                self.errors += 1
+                for request in batch:
+                    request.error = e
+
+            self._record(batch, started)
+            for request in batch:
+                request.done.set()
+
+    def _record(self, batch, started):
+        size = len(batch)
+        self.batches += 1
+        self.rows += size
+        self._avg_batch_size = 0.8 * self._avg_batch_size + 0.2 * size
+
+        for request in batch:
+            wait = started - request.enqueued_at
+            self.queue_wait_total += wait
+            if wait > self.queue_wait_max:
+                self.queue_wait_max = wait
+
+        for index, bucket in enumerate(self.BATCH_SIZE_BUCKETS):
+            if size <= bucket:
+                self.batch_size_counts[index] += 1
+                break
+        else:
+            self.batch_size_counts[-1] += 1
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the user database
+Applied in order at startup; the schema version lives in SQLite's PRAGMA user_version
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            phone TEXT,
+            package TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_survey TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS survey_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            survey_data TEXT,
+            recommendations TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def add_submission_ids(conn):
+    # Databases created by the pre-migration startup code may already have the column
+    if 'submission_id' not in table_columns(conn, 'survey_responses'):
+        conn.execute('ALTER TABLE survey_responses ADD COLUMN submission_id TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_survey_responses_submission_id
+        ON survey_responses (submission_id)
+    ''')
+
+
+def index_survey_user_id(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_survey_responses_user_id ON survey_responses (user_id)')
+
+
+def add_survey_count(conn):
+    """users.survey_count, backfilled once and kept current by triggers"""
+    conn.execute('ALTER TABLE users ADD COLUMN survey_count INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        UPDATE users
+        SET survey_count = (SELECT COUNT(*) FROM survey_responses WHERE user_id = users.id)
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS survey_responses_count_insert
+        AFTER INSERT ON survey_responses
+        BEGIN
+            UPDATE users SET survey_count = survey_count + 1 WHERE id = NEW.user_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS survey_responses_count_delete
+        AFTER DELETE ON survey_responses
+        BEGIN
+            UPDATE users SET survey_count = survey_count - 1 WHERE id = OLD.user_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS survey_responses_count_move
+        AFTER UPDATE OF user_id ON survey_responses
+        WHEN OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            UPDATE users SET survey_count = survey_count - 1 WHERE id = OLD.user_id;
+            UPDATE users SET survey_count = survey_count + 1 WHERE id = NEW.user_id;
+        END
+    ''')
+    # Responses can be stored for an id before that user exists
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS users_count_existing_surveys
+        AFTER INSERT ON users
+        BEGIN
+            UPDATE users
+            SET survey_count = (SELECT COUNT(*) FROM survey_responses WHERE user_id = NEW.id)
+            WHERE id = NEW.id;
+        END
+    ''')
+
+
+def add_rescoring_columns(conn):
+    """Results of offline re-scoring, kept apart from the recommendations the user was shown"""
+    columns = table_columns(conn, 'survey_responses')
+    for column, column_type in (('rescored_recommendations', 'TEXT'), ('rescored_model_version', 'TEXT'),
+                                ('rescored_at', 'TIMESTAMP')):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE survey_responses ADD COLUMN {column} {column_type}')
+
+
+# (version, description, upgrade(conn)); append only, never renumber
+MIGRATIONS = [
+    (1, 'create users and survey_responses', create_tables),
+    (2, 'survey submission ids', add_submission_ids),
+    (3, 'index survey_responses.user_id', index_survey_user_id),
+    (4, 'trigger-maintained users.survey_count', add_survey_count),
+    (5, 'survey_responses rescoring columns', add_rescoring_columns)
+]
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def schema_version(database):
+    return database.query_one('PRAGMA user_version')[0]
+
+
+def migrate(database, migrations=MIGRATIONS):
+    """Apply pending migrations in order, each in its own transaction; returns the versions applied"""
+    latest = migrations[-1][0]
+    if schema_version(database) > latest:
+        logger.warning("Database schema version %d is newer than this server (%d)", schema_version(database), latest)
+        return []
+
+    applied = []
+    for version, description, upgrade in migrations:
+        def apply(conn):
+            # Re-read inside the write transaction: another process may have migrated meanwhile
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                return False
+            upgrade(conn)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            return True
+
+        if database.transaction(apply):
+            logger.info("Applied database migration %d: %s", version, description)
+            applied.append(version)
+    return applied
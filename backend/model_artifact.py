@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Memory-mappable model artifact
+Stores a CompiledForest as raw node arrays behind a small JSON header so every
+process can map one shared page-cache copy instead of unpickling the forest
+"""
+
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+from forest_compiler import CompiledForest
+
+# File layout: MAGIC | header length (uint64, little endian) | JSON header |
+# padding | arrays, each starting on an ALIGNMENT boundary
+MAGIC = b'SPHXFRST'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+ARTIFACT_SUFFIX = '.forest'
+
+# On-disk dtypes are fixed so artifacts don't depend on the exporting platform
+ARRAY_DTYPES = {
+    'feature': '<i8',
+    'threshold': '<f8',
+    'children': '<i8',
+    'is_leaf': '|b1',
+    'value': '<f8',
+    'roots': '<i8'
+}
+
+
+class ArtifactError(Exception):
+    """Raised when a file is not a readable model artifact"""
+
+
+def artifact_path(model_path):
+    """Artifact file that sits next to a pickled model"""
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIX
+
+
+def is_artifact(path):
+    return path.endswith(ARTIFACT_SUFFIX)
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_artifact(forest, path, metadata=None):
+    """Write `forest` to `path` atomically; metadata is stored in the header as-is"""
+    arrays = {}
+    for name in CompiledForest.ARRAY_NAMES:
+        arrays[name] = np.ascontiguousarray(getattr(forest, name), dtype=ARRAY_DTYPES[name])
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': ARRAY_DTYPES[name], 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'n_features': forest.n_features,
+        'max_depth': int(forest.max_depth),
+        'classes': np.asarray(forest.classes_).tolist(),
+        'arrays': layout,
+        'metadata': metadata or {}
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    # Replace in one step so a running server never maps a half-written file
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path):
+    """Parsed JSON header and the file offset where array data starts"""
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + 8)
+        if len(prefix) < len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+            raise ArtifactError(f"{path} is not a model artifact")
+        (header_length,) = struct.unpack('<Q', prefix[len(MAGIC):])
+        try:
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        except ValueError as e:
+            raise ArtifactError(f"{path} has a corrupt header: {e}") from e
+
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ArtifactError(f"{path} has format version {header.get('format_version')}, expected {FORMAT_VERSION}")
+    return header, _aligned(len(MAGIC) + 8 + header_length)
+
+
+def load_artifact(path):
+    """Map an artifact read-only and return (CompiledForest, header) without copying arrays"""
+    header, data_start = read_header(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+
+    arrays = {}
+    for name in CompiledForest.ARRAY_NAMES:
+        spec = header['arrays'].get(name)
+        if spec is None:
+            raise ArtifactError(f"{path} is missing the {name} array")
+        dtype = np.dtype(spec['dtype'])
+        start = data_start + spec['offset']
+        end = start + dtype.itemsize * int(np.prod(spec['shape'], dtype=np.int64))
+        if end > len(mapped):
+            raise ArtifactError(f"{path} is truncated")
+        arrays[name] = mapped[start:end].view(dtype).reshape(spec['shape'])
+
+    forest = CompiledForest(
+        max_depth=header['max_depth'],
+        n_features=header['n_features'],
+        classes=np.asarray(header['classes']),
+        **arrays
+    )
+    return forest, header
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Pre-fork process manager for the hybrid server
+Loads shared state in the parent, then forks worker processes that accept on one port
+"""
+
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PooledTCPServer(socketserver.TCPServer):
+    """TCP server that hands accepted connections to a fixed-size thread pool"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, server_address, handler_class, threads=1, listen_socket=None, reuse_port=False):
+        self.threads = max(1, threads)
+        self.reuse_port = reuse_port
+        self._executor = None
+        # Accepted connections not yet picked up by a pool thread
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+        if listen_socket is not None:
+            # Accept on a socket inherited from the parent process
+            super().__init__(server_address, handler_class, bind_and_activate=False)
+            self.socket.close()
+            self.socket = listen_socket
+            self.server_address = listen_socket.getsockname()
+        else:
+            super().__init__(server_address, handler_class)
+
+    def server_bind(self):
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        """Serve inline for a single thread, otherwise on the worker's pool"""
+        if self.threads == 1:
+            super().process_request(request, client_address)
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='http')
+        with self._waiting_lock:
+            self._waiting += 1
+        self._executor.submit(self._process_request_thread, request, client_address)
+
+    def has_waiting_connections(self):
+        """True when a new connection is held up behind the ones being served"""
+        if self.threads == 1:
+            # The only thread is busy with a connection, so nobody is accepting
+            return bool(select.select([self.socket], [], [], 0)[0])
+        return self._waiting > 0
+
+    def _process_request_thread(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def create_listen_socket(server_address, reuse_port=False, backlog=1024):
+    """Create a bound, listening socket that forked workers can inherit"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(server_address)
+    sock.listen(backlog)
+    return sock
+
+
+class PreforkServer:
+    """Forks N workers serving one handler class and restarts any that die"""
+
+    # Workers that die sooner than this after starting are respawned with a delay
+    MIN_WORKER_LIFETIME = 1.0
+
+    def __init__(self, server_address, handler_class, workers=2, threads_per_worker=1, reuse_port=False,
+                 worker_init=None, worker_exit=None, on_reload=None):
+        # worker_init() and worker_exit() run in each worker after fork and before
+        # it exits; on_reload() runs in every worker when the supervisor gets SIGHUP
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.workers = max(1, workers)
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.reuse_port = reuse_port and hasattr(socket, 'SO_REUSEPORT')
+        self.worker_init = worker_init
+        self.worker_exit = worker_exit
+        self.on_reload = on_reload
+        self.listen_socket = None
+        self.children = {}
+        self.running = False
+
+    def serve_forever(self):
+        """Bind, fork the workers and supervise them until SIGINT/SIGTERM"""
+        if not self.reuse_port:
+            self.listen_socket = create_listen_socket(self.server_address)
+
+        # Move everything loaded so far (model, catalog) out of the GC's reach so
+        # collections in the workers don't touch and unshare those pages
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._forward_reload)
+
+        for worker_id in range(self.workers):
+            self._spawn_worker(worker_id)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+
+            worker_id, started_at = self.children.pop(pid, (None, None))
+            if worker_id is None:
+                continue
+
+            if self.running:
+                logger.warning("Worker %d (pid %d) exited with status %d, restarting", worker_id, pid, status)
+                if time.monotonic() - started_at < self.MIN_WORKER_LIFETIME:
+                    time.sleep(self.MIN_WORKER_LIFETIME)
+                self._spawn_worker(worker_id)
+
+        if self.listen_socket is not None:
+            self.listen_socket.close()
+        logger.info("All workers stopped")
+
+    def _spawn_worker(self, worker_id):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (worker_id, time.monotonic())
+            return
+
+        # Child process: never return into the supervisor loop
+        exit_code = 0
+        try:
+            self._run_worker(worker_id)
+        except Exception as e:
+            logger.error("Worker %d crashed: %s", worker_id, e)
+            exit_code = 1
+        finally:
+            try:
+                # Workers leave through os._exit(), which skips atexit handlers
+                if self.worker_exit is not None:
+                    self.worker_exit()
+            finally:
+                os._exit(exit_code)
+
+    def _run_worker(self, worker_id):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        httpd = PooledTCPServer(
+            self.server_address,
+            self.handler_class,
+            threads=self.threads_per_worker,
+            listen_socket=self.listen_socket,
+            reuse_port=self.reuse_port
+        )
+
+        def stop(signum, frame):
+            threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._handle_reload)
+        if self.worker_init is not None:
+            self.worker_init()
+        logger.info("Worker %d (pid %d) serving with %d thread(s)", worker_id, os.getpid(), self.threads_per_worker)
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+
+    def _handle_stop(self, signum, frame):
+        self.running = False
+        self._signal_children(signal.SIGTERM)
+
+    def _forward_reload(self, signum, frame):
+        self._signal_children(signal.SIGHUP)
+
+    def _handle_reload(self, signum, frame):
+        if self.on_reload is not None:
+            self.on_reload()
+
+    def _signal_children(self, signum):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Static file layer for serving the frontend from the backend
+Validators, conditional and Range requests, precompressed .gz siblings, an LRU of
+small hot files and sendfile() for everything larger
+"""
+
+import email.utils
+import mimetypes
+import os
+import posixpath
+import urllib.parse
+
+from caching import LRUCache
+from encoded_response import accepted_encodings, etag_matches
+
+# Never served, whatever the root: the user database, model files and dotfiles
+PRIVATE_SUFFIXES = ('.db', '.db-wal', '.db-shm', '.db-journal', '.pkl', '.forest', '.tmp')
+
+# Pages are revalidated on every load so a deploy shows up at once
+REVALIDATE_TYPES = ('text/html',)
+
+
+class StaticResponse:
+    """Status, headers and either in-memory bytes or a (path, offset, length) file slice"""
+
+    __slots__ = ('status', 'headers', 'body', 'path', 'offset', 'length')
+
+    def __init__(self, status, headers, body=b'', path=None, offset=0, length=0):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+
+def http_date(timestamp):
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+def parse_http_date(value):
+    """Seconds since the epoch, or None if the header isn't an HTTP date"""
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return parsed.timestamp() if parsed.tzinfo is not None else None
+
+
+def parse_range(value, size):
+    """(start, end) inclusive for a single `bytes=` range, 'unsatisfiable', or None to send the whole file"""
+    unit, _, spec = (value or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None  # Multiple ranges are allowed to be answered with the full body
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return 'unsatisfiable'
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start < 0 or (last and end < start):
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+class StaticFiles:
+    """Serves files under `root` for GET and HEAD requests
+
+    Unlike SimpleHTTPRequestHandler, a directory without index.html is a 404
+    rather than a listing, so the backend sources, model files and anything
+    else under the root can't be browsed.
+    """
+
+    def __init__(self, root, max_age=3600, cache_entries=512, cache_max_file=128 * 1024):
+        self.root = os.path.realpath(root)
+        self.max_age = max_age
+        self.cache_max_file = cache_max_file
+        # Keys include size and mtime, so an edited file simply misses
+        self.cache = LRUCache(max_entries=cache_entries) if cache_entries > 0 else None
+
+    def resolve(self, url_path):
+        """Filesystem path for a URL path inside root, or None"""
+        path = urllib.parse.unquote(urllib.parse.urlsplit(url_path).path)
+        parts = [part for part in posixpath.normpath(path).split('/') if part not in ('', '.', '..')]
+        if any(part.startswith('.') for part in parts):
+            return None
+        resolved = os.path.realpath(os.path.join(self.root, *parts))
+        if resolved != self.root and not resolved.startswith(self.root + os.sep):
+            return None
+        return resolved
+
+    def cache_control(self, content_type):
+        if content_type.split(';')[0] in REVALIDATE_TYPES:
+            return 'no-cache'
+        return f'public, max-age={self.max_age}'
+
+    def respond(self, url_path, headers):
+        """StaticResponse for a GET; `headers` maps lowercase request header names to values"""
+        path = self.resolve(url_path)
+        if path is None:
+            return StaticResponse(404, {})
+        if os.path.isdir(path):
+            if not urllib.parse.urlsplit(url_path).path.endswith('/'):
+                parts = urllib.parse.urlsplit(url_path)
+                return StaticResponse(301, {'Location': urllib.parse.urlunsplit(
+                    (parts[0], parts[1], parts[2] + '/', parts[3], parts[4]))})
+            # No listing when it's missing, see the class docstring
+            path = os.path.join(path, 'index.html')
+        if path.endswith(PRIVATE_SUFFIXES):
+            return StaticResponse(404, {})
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return StaticResponse(404, {})
+        if not os.path.isfile(path):
+            return StaticResponse(404, {})
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        response_headers = {
+            'Content-Type': content_type,
+            'Last-Modified': http_date(stat.st_mtime),
+            'Cache-Control': self.cache_control(content_type),
+            'Accept-Ranges': 'bytes'
+        }
+
+        # A fresh .gz sibling is served whole to gzip clients; ranges always use the plain file
+        gzip_path = path + '.gz'
+        gzip_stat = None
+        if 'range' not in headers and accepted_encodings(headers.get('accept-encoding')).get('gzip', 0) > 0:
+            try:
+                gzip_stat = os.stat(gzip_path)
+            except OSError:
+                gzip_stat = None
+            if gzip_stat is not None and gzip_stat.st_mtime_ns < stat.st_mtime_ns:
+                gzip_stat = None
+        if os.path.exists(gzip_path):
+            response_headers['Vary'] = 'Accept-Encoding'
+        # Either tag proves the client has the current version of the file
+        mtime = stat.st_mtime
+        current_tags = {etag}
+        if gzip_stat is not None:
+            response_headers['Content-Encoding'] = 'gzip'
+            response_headers['ETag'] = f'"{gzip_stat.st_size:x}-{gzip_stat.st_mtime_ns:x}-gzip"'
+            current_tags.add(response_headers['ETag'])
+            path, stat = gzip_path, gzip_stat
+        else:
+            response_headers['ETag'] = etag
+
+        if self.not_modified(headers, current_tags, mtime):
+            del response_headers['Content-Type']
+            return StaticResponse(304, response_headers)
+
+        start, end = 0, stat.st_size - 1
+        byte_range = None
+        if 'range' in headers and self.range_applies(headers.get('if-range'), etag, mtime):
+            byte_range = parse_range(headers['range'], stat.st_size)
+        if byte_range == 'unsatisfiable':
+            return StaticResponse(416, {'Content-Range': f'bytes */{stat.st_size}'})
+        status = 200
+        if byte_range is not None:
+            status = 206
+            start, end = byte_range
+            response_headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+        length = max(0, end - start + 1)
+        if stat.st_size <= self.cache_max_file and self.cache is not None:
+            data = self.cache.get_or_compute((path, stat.st_size, stat.st_mtime_ns), lambda: self._read(path))
+            return StaticResponse(status, response_headers, data[start:end + 1])
+        return StaticResponse(status, response_headers, path=path, offset=start, length=length)
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def not_modified(headers, etags, mtime):
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        if 'if-none-match' in headers:
+            return etag_matches(headers['if-none-match'], etags)
+        since = parse_http_date(headers.get('if-modified-since'))
+        return since is not None and int(mtime) <= since
+
+    @staticmethod
+    def range_applies(if_range, etag, mtime):
+        """False when If-Range names an older version, so the whole file is sent"""
+        if not if_range:
+            return True
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        since = parse_http_date(if_range)
+        return since is not None and int(mtime) <= since
+
+    def stats(self):
+        return {
+            'root': self.root,
+            'max_age': self.max_age,
+            'cache_max_file': self.cache_max_file,
+            'cache': self.cache.stats() if self.cache is not None else None
+        }
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+JSON-lines logging off the request hot path
+Records are queued by the request thread and formatted and written by one listener thread
+"""
+
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+
+# Set per request by begin_request(); tasks and executor calls copy them along
+REQUEST_ID = contextvars.ContextVar('request_id', default=None)
+REQUEST_SAMPLED = contextvars.ContextVar('request_sampled', default=False)
+
+# Arguments that can't change once logged, so %-formatting them can wait for the listener
+IMMUTABLE_ARG_TYPES = (str, int, float, bytes, type(None))
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _json_default(value):
+    # numpy arrays and scalars, sets, exceptions
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id is not None:
+            entry['request_id'] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key != 'request_id':
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Formatted by DroppingQueueHandler.prepare() before the record was queued
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=_json_default)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the request id of the thread or task that logged it"""
+
+    def filter(self, record):
+        record.request_id = REQUEST_ID.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Arguments are %-formatted on the listener thread, unless one of them could
+        # still change after the call returns (a dict, list or numpy array), in which
+        # case the message is merged here, on the calling thread
+        if record.args and not (isinstance(record.args, tuple) and
+                                all(isinstance(arg, IMMUTABLE_ARG_TYPES) for arg in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AsyncLogging:
+    """Root handler plus the listener thread that writes its records"""
+
+    def __init__(self, level=logging.INFO, sample_rate=1.0, queue_size=10000, stream=None):
+        self.level = level
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.stream = stream or sys.stdout
+        self.output = logging.StreamHandler(self.stream)
+        self.output.setFormatter(JsonFormatter())
+        self.handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self.handler.addFilter(RequestContextFilter())
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.listener = logging.handlers.QueueListener(self.handler.queue, self.output)
+            self.listener.start()
+
+    def restart_after_fork(self):
+        # The parent's listener thread doesn't exist in the child, and its queue
+        # lock may have been held at fork time
+        self.handler.queue = queue.Queue(self.queue_size)
+        self._lock = threading.Lock()
+        self.start()
+
+    def stop(self):
+        """Write everything still queued"""
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+    def stats(self):
+        return {
+            'level': logging.getLevelName(self.level),
+            'sample_rate': self.sample_rate,
+            'queued': self.handler.queue.qsize(),
+            'dropped': self.handler.dropped
+        }
+
+
+# Set by configure_logging()
+LOGGING = None
+
+
+def configure_logging(level='INFO', sample_rate=1.0, queue_size=10000, stream=None):
+    """Send every logger's records through one bounded queue to JSON lines on stream (stdout)"""
+    global LOGGING
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {level!r}")
+
+    root = logging.getLogger()
+    if LOGGING is not None:
+        root.removeHandler(LOGGING.handler)
+        LOGGING.stop()
+    else:
+        atexit.register(shutdown_logging)
+    LOGGING = AsyncLogging(level=level, sample_rate=sample_rate, queue_size=queue_size, stream=stream)
+    LOGGING.start()
+    root.addHandler(LOGGING.handler)
+    root.setLevel(level)
+    return LOGGING
+
+
+def shutdown_logging():
+    if LOGGING is not None:
+        LOGGING.stop()
+
+
+def _restart_in_child():
+    if LOGGING is not None:
+        LOGGING.restart_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def begin_request(request_id=None):
+    """Start a request's log context: its id (the client's X-Request-ID if sane) and sampling decision"""
+    if not request_id or len(request_id) > 64 or not request_id.isprintable():
+        request_id = uuid.uuid4().hex
+    REQUEST_ID.set(request_id)
+    rate = LOGGING.sample_rate if LOGGING is not None else 1.0
+    REQUEST_SAMPLED.set(rate >= 1.0 or random.random() < rate)
+    return request_id
+
+
+def debug_sampled(logger):
+    """True when this request's debug detail should be logged; check before building it"""
+    return REQUEST_SAMPLED.get() and logger.isEnabledFor(logging.DEBUG)
@@ -0,0 +1,163 @@
+import asyncio
+import json
+
+import pytest
+
+from async_http import AsyncHTTPServer, BoundedExecutor
+from benchmarks.synthetic import synthetic_surveys
+
+# Small enough that the test batches go well past it
+MAX_BODY_SIZE = 16 * 1024
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # No model files in the working directory: the engine scores with its rules
+    monkeypatch.chdir(tmp_path)
+    import hybrid_ml_survey_server as server
+    return server
+
+
+async def start(server):
+    http_server = AsyncHTTPServer(
+        server.make_async_dispatch(BoundedExecutor('inference', 2), BoundedExecutor('sqlite', 1)),
+        idle_timeout=5.0, max_body_size=MAX_BODY_SIZE, stream_body=server.streams_request_body)
+    tcp_server = await asyncio.start_server(http_server.handle_connection, '127.0.0.1', 0)
+    return tcp_server, tcp_server.sockets[0].getsockname()[1]
+
+
+async def read_response(reader):
+    """(status, headers, body, chunked) of one response; a body without a length runs to EOF"""
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                return status, headers, body, True
+            body += chunk[:-2]
+    if 'content-length' in headers:
+        return status, headers, await reader.readexactly(int(headers['content-length'])), False
+    return status, headers, await reader.read(), False
+
+
+def post(path, body, version='HTTP/1.1', connection='keep-alive'):
+    return (f'POST {path} {version}\r\nHost: test\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n').encode() + body
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 30))
+
+
+def results(body):
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+
+def test_batch_larger_than_the_body_limit_is_streamed(server):
+    surveys = synthetic_surveys(300, seed=4)
+    array_body = json.dumps(surveys).encode()
+    ndjson_body = '\n'.join(json.dumps(survey) for survey in surveys).encode()
+    assert len(array_body) > 4 * MAX_BODY_SIZE
+
+    async def scenario():
+        tcp_server, port = await start(server)
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            # Both batches and a single survey on one keep-alive connection
+            writer.write(post('/api/recommend/batch', array_body))
+            array_response = await read_response(reader)
+            writer.write(post('/api/recommend/batch?x=1', ndjson_body))
+            ndjson_response = await read_response(reader)
+            writer.write(post('/api/recommend', json.dumps(surveys[0]).encode(), connection='close'))
+            single_response = await read_response(reader)
+            writer.close()
+            return array_response, ndjson_response, single_response
+
+    array_response, ndjson_response, single_response = run(scenario())
+    for status, headers, body, chunked in (array_response, ndjson_response):
+        assert (status, chunked) == (200, True)
+        lines = results(body)
+        assert [line['index'] for line in lines] == list(range(300))
+        assert all(line['success'] for line in lines)
+    assert results(array_response[2]) == results(ndjson_response[2])
+    assert single_response[0] == 200 and json.loads(single_response[2])['success']
+
+
+def test_other_bodies_over_the_limit_are_rejected(server):
+    body = json.dumps({'padding': 'x' * MAX_BODY_SIZE}).encode()
+
+    async def scenario():
+        tcp_server, port = await start(server)
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(post('/api/recommend', body))
+            response = await read_response(reader)
+            writer.close()
+            return response
+
+    assert run(scenario())[0] == 400
+
+
+def test_malformed_batch_is_rejected_and_the_connection_closed(server):
+    async def scenario():
+        tcp_server, port = await start(server)
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(post('/api/recommend/batch', b'[{not json}' + b' ' * 100000))
+            response = await read_response(reader)
+            closed = await reader.read() == b''
+            writer.close()
+            return response, closed
+
+    (status, headers, body, _), closed = run(scenario())
+    assert status == 400 and not json.loads(body)['success']
+    assert headers['connection'] == 'close' and closed
+
+
+@pytest.mark.parametrize('connection', ['close', 'keep-alive'])
+def test_batch_to_an_http_1_0_client_ends_by_closing(server, connection):
+    surveys = synthetic_surveys(40, seed=6)
+
+    async def scenario():
+        tcp_server, port = await start(server)
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(post('/api/recommend/batch', json.dumps(surveys).encode(), version='HTTP/1.0',
+                              connection=connection))
+            response = await read_response(reader)
+            writer.close()
+            return response
+
+    status, headers, body, chunked = run(scenario())
+    assert status == 200 and not chunked
+    assert 'transfer-encoding' not in headers and 'content-length' not in headers
+    assert headers['connection'] == 'close'
+    assert [line['index'] for line in results(body)] == list(range(40))
+
+
+def test_http_1_0_keep_alive_still_works_for_sized_responses(server):
+    async def scenario():
+        tcp_server, port = await start(server)
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            responses = []
+            for _ in range(2):
+                writer.write(b'GET /api/health HTTP/1.0\r\nConnection: keep-alive\r\n\r\n')
+                responses.append(await read_response(reader))
+            writer.close()
+            return responses
+
+    for status, headers, body, chunked in run(scenario()):
+        assert status == 200 and headers['connection'] == 'keep-alive'
+        assert int(headers['content-length']) == len(body) and json.loads(body)['status'] == 'healthy'
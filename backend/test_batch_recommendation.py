@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from hybrid_ml_survey_server import InvalidBatchItem, iter_batch_surveys
+
+ITEMS = [{'id': i, 'usage': ['gaming'] * i, 'note': 'é☃ "quoted"' * i, 'budget': 1.25e5} for i in range(30)]
+ITEMS += [12345, 1.5, [1, 2], 'text', None]
+
+
+def pieces(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def decoded(surveys):
+    return [InvalidBatchItem if isinstance(survey, InvalidBatchItem) else survey for survey in surveys]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1 << 20])
+def test_array_decodes_the_same_however_the_body_is_split(size):
+    body = b' \r\n' + json.dumps(ITEMS).encode() + b'\n'
+    assert list(iter_batch_surveys(pieces(body, size))) == ITEMS
+
+
+@pytest.mark.parametrize('size', [1, 5, 1 << 20])
+def test_ndjson_decodes_line_by_line(size):
+    body = b'\n'.join(json.dumps(item).encode() for item in ITEMS[:30]) + b'\n\n{bad\n' + json.dumps(ITEMS[0]).encode()
+    assert decoded(iter_batch_surveys(pieces(body, size))) == ITEMS[:30] + [InvalidBatchItem, ITEMS[0]]
+
+
+@pytest.mark.parametrize('body', [b'', b'  \n', b'[]', b' [ ] '])
+def test_empty_batches(body):
+    assert list(iter_batch_surveys([body])) == []
+
+
+@pytest.mark.parametrize('body', [b'[{bad', b'[', b'[,1]'])
+def test_array_that_is_malformed_from_the_start_raises(body):
+    with pytest.raises(ValueError):
+        list(iter_batch_surveys(pieces(body, 1)))
+
+
+@pytest.mark.parametrize('body', [b'[{"a": 1} {"b": 2}]', b'[{"a": 1}, {bad}]', b'[{"a": 1},'])
+def test_array_that_breaks_later_ends_with_an_error_item(body):
+    surveys = list(iter_batch_surveys(pieces(body, 3)))
+    assert surveys[0] == {'a': 1}
+    assert len(surveys) == 2 and 'Invalid JSON' in surveys[1].error
+
+
+def test_bad_item_is_reported_without_reading_the_rest_of_the_body():
+    read = []
+
+    def chunks():
+        yield b'[{bad json here} '
+        for _ in range(100):
+            read.append(1)
+            yield b' ' * 1000
+
+    with pytest.raises(ValueError):
+        list(iter_batch_surveys(chunks()))
+    assert len(read) <= 1
+
+
+def test_whole_body_is_consumed_after_the_array():
+    # Left unread, the trailing bytes would be taken for the next request on the connection
+    chunks = iter([b'[{"a": 1}]', b'  ', b'\n'])
+    assert list(iter_batch_surveys(chunks)) == [{'a': 1}]
+    assert next(chunks, None) is None
+
+
+def test_only_one_chunk_is_buffered_at_a_time():
+    seen = []
+
+    def chunks():
+        for i in range(1000):
+            seen.append(i)
+            yield (b'[' if i == 0 else b',') + json.dumps(ITEMS[0]).encode()
+        yield b']'
+
+    surveys = iter_batch_surveys(chunks())
+    for count, survey in enumerate(surveys, 1):
+        # The decoder runs at most a chunk or two ahead of the items it has handed out
+        assert len(seen) <= count + 2
+    assert count == 1000
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import bulk_scoring
+from benchmarks.synthetic import synthetic_surveys
+from bulk_scoring import BulkScoringError, Checkpoint, run
+from data_access import Database, UserStore
+from migrations import migrate
+
+
+@pytest.fixture
+def surveys(tmp_path, monkeypatch):
+    # No model files in the working directory: the engine scores with its rules
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'surveys.jsonl'
+    lines = [json.dumps(survey) for survey in synthetic_surveys(23, seed=3)]
+    lines[5] = '{not json'
+    lines[9] = json.dumps({'id': 9, 'user_id': 4, 'survey_data': json.dumps(synthetic_surveys(1, seed=9)[0])})
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+
+def score(surveys, output, **options):
+    options.setdefault('chunk_size', 4)
+    return run(('jsonl', str(surveys)), output=str(output), database=str(surveys.parent / 'users.db'), **options)
+
+
+def test_every_line_gets_one_result(surveys, tmp_path):
+    state = score(surveys, tmp_path / 'out.jsonl')
+    results = [json.loads(line) for line in (tmp_path / 'out.jsonl').read_text().splitlines()]
+
+    assert [result['line'] for result in results] == list(range(1, 24))
+    assert state['complete'] and (state['scored'], state['errors']) == (23, 1)
+    assert not results[5]['success'] and 'Invalid JSON' in results[5]['error']
+    assert (results[9]['id'], results[9]['user_id'], results[9]['success']) == (9, 4, True)
+    assert all(result['recommendations'] for result in results if result['success'])
+
+
+def test_resumed_run_matches_a_single_run(surveys, tmp_path):
+    score(surveys, tmp_path / 'single.jsonl')
+
+    checkpoint = str(tmp_path / 'run.ckpt')
+    first = score(surveys, tmp_path / 'resumed.jsonl', checkpoint=checkpoint, limit=10)
+    assert not first['complete'] and (first['position'], first['scored']) == (10, 10)
+    second = score(surveys, tmp_path / 'resumed.jsonl', checkpoint=checkpoint, resume=True)
+    assert second['complete'] and second['scored'] == 23
+
+    assert (tmp_path / 'resumed.jsonl').read_bytes() == (tmp_path / 'single.jsonl').read_bytes()
+    assert Checkpoint(checkpoint).load() == second
+
+
+def test_write_back_resumes_without_skipping_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database = Database(str(tmp_path / 'users.db'))
+    migrate(database)
+    store = UserStore(database)
+    store.record_surveys([(f's{i}', 1, json.dumps(survey), '[]', None)
+                          for i, survey in enumerate(synthetic_surveys(11, seed=5))])
+
+    options = dict(write_back=True, checkpoint=str(tmp_path / 'run.ckpt'), chunk_size=3,
+                   database=str(tmp_path / 'users.db'))
+    run(('db', str(tmp_path / 'users.db')), limit=5, **options)
+    rescored = database.query_one('SELECT COUNT(*) FROM survey_responses WHERE rescored_at IS NOT NULL')[0]
+    assert rescored == 5
+
+    state = run(('db', str(tmp_path / 'users.db')), resume=True, **options)
+    assert state['complete'] and state['scored'] == 11
+    rows = database.run(lambda conn: conn.execute(
+        'SELECT rescored_recommendations FROM survey_responses ORDER BY id').fetchall())
+    assert len(rows) == 11 and all(json.loads(recommendations) for recommendations, in rows)
+
+
+def test_lines_written_after_the_last_checkpoint_are_replaced(surveys, tmp_path):
+    score(surveys, tmp_path / 'single.jsonl')
+
+    checkpoint = str(tmp_path / 'run.ckpt')
+    score(surveys, tmp_path / 'resumed.jsonl', checkpoint=checkpoint, limit=8)
+    # A crash between writing a chunk and saving the checkpoint leaves extra lines
+    with open(tmp_path / 'resumed.jsonl', 'a') as f:
+        f.write('{"line": 9, "partial": true}\n')
+    score(surveys, tmp_path / 'resumed.jsonl', checkpoint=checkpoint, resume=True)
+
+    assert (tmp_path / 'resumed.jsonl').read_bytes() == (tmp_path / 'single.jsonl').read_bytes()
+
+
+def test_output_shorter_than_the_checkpoint_is_not_resumed(surveys, tmp_path):
+    checkpoint = str(tmp_path / 'run.ckpt')
+    score(surveys, tmp_path / 'out.jsonl', checkpoint=checkpoint, limit=8)
+    (tmp_path / 'out.jsonl').write_text('')
+    with pytest.raises(BulkScoringError, match='shorter'):
+        score(surveys, tmp_path / 'out.jsonl', checkpoint=checkpoint, resume=True)
+
+
+def test_existing_checkpoint_needs_resume(surveys, tmp_path):
+    checkpoint = str(tmp_path / 'run.ckpt')
+    score(surveys, tmp_path / 'out.jsonl', checkpoint=checkpoint, limit=4)
+    with pytest.raises(BulkScoringError, match='--resume'):
+        score(surveys, tmp_path / 'out.jsonl', checkpoint=checkpoint)
+    with pytest.raises(BulkScoringError, match='different source or output'):
+        score(surveys, tmp_path / 'other.jsonl', checkpoint=checkpoint, resume=True)
+
+
+def test_resume_without_checkpoint_file_fails(surveys, tmp_path):
+    with pytest.raises(BulkScoringError, match='not found'):
+        score(surveys, tmp_path / 'out.jsonl', checkpoint=str(tmp_path / 'missing.ckpt'), resume=True)
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_non_positive_limit_is_rejected(surveys, tmp_path, limit):
+    with pytest.raises(BulkScoringError, match='positive'):
+        score(surveys, tmp_path / 'out.jsonl', limit=limit)
+    with pytest.raises(SystemExit):
+        bulk_scoring.parse_args(['--jsonl', str(surveys), '--output', 'out.jsonl', '--limit', str(limit)])
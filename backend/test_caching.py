@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import caching
+from caching import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(caching, 'time', clock)
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.put('a', 1)
+    clock.now += 9.9
+    assert cache.get('a') == 1
+    clock.now += 0.1
+    assert cache.get('a', 'missing') == 'missing'
+    assert cache.stats()['expirations'] == 1
+
+
+def test_non_positive_ttl_means_no_expiry(clock):
+    cache = LRUCache(ttl=0)
+    cache.put('a', 1)
+    clock.now += 1e9
+    assert cache.get('a') == 1
+
+
+def test_new_generation_drops_every_entry():
+    cache = LRUCache()
+    cache.set_generation(1)
+    cache.put('a', 1)
+    cache.set_generation(1)
+    assert cache.get('a') == 1
+
+    cache.set_generation(2)
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = LRUCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+                 for _ in range(4)]
+    for follower in followers:
+        follower.start()
+    while cache.stats()['coalesced'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ['value'] * 5
+    assert len(calls) == 1
+    assert cache.get_or_compute('k', compute) == 'value' and len(calls) == 1
+
+
+def test_failed_computation_is_raised_and_not_cached():
+    cache = LRUCache()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError, match='boom'):
+        cache.get_or_compute('k', fail)
+    assert cache.get_or_compute('k', lambda: 'value') == 'value'
+
+
+def test_result_computed_against_old_data_is_not_stored():
+    cache = LRUCache()
+    cache.set_generation(1)
+
+    def compute_during_reload():
+        cache.set_generation(2)
+        return 'old'
+
+    assert cache.get_or_compute('k', compute_during_reload) == 'old'
+    assert cache.get('k') is None
+
+    def compute_during_invalidate():
+        cache.invalidate('k')
+        return 'old'
+
+    assert cache.get_or_compute('k', compute_during_invalidate) == 'old'
+    assert cache.get('k') is None
@@ -0,0 +1,147 @@
+import copy
+import gzip
+import json
+import os
+
+import pytest
+
+import hybrid_ml_survey_server as server
+from catalog import DEFAULT_CATALOG_PATH, CatalogError, CatalogFile, PackageCatalog, load_catalog, parse_price
+
+with open(DEFAULT_CATALOG_PATH) as f:
+    DOCUMENT = json.load(f)
+
+
+def entries(group):
+    return [entry for section in DOCUMENT[group] for entry in section['packages'] if 'category' in entry]
+
+
+UNLISTED = {entry.get('sku') or entry['name'] for entry in entries('unlisted')}
+
+
+def write(path, document):
+    if isinstance(document, bytes):
+        path.write_bytes(document)
+    else:
+        path.write_text(document if isinstance(document, str) else json.dumps(document))
+    return str(path)
+
+
+def test_shipped_catalog_is_indexed_by_model_class():
+    catalog = load_catalog(DEFAULT_CATALOG_PATH)
+    recommendable = sorted((entry for group in ('quota', 'simCredit', 'wifi', 'unlisted') for entry in entries(group)),
+                           key=lambda entry: int(entry['modelClass']))
+
+    assert len(catalog) == len(recommendable) == 22
+    for row, (package, entry) in enumerate(zip(catalog.packages, recommendable)):
+        assert set(package) == {'name', 'kuota', 'harga', 'category'}
+        assert package['name'] == (entry.get('sku') or entry['name'])
+        assert package['harga'] == parse_price(entry['price']) and package['category'] == entry['category']
+        assert catalog.row(package['name']) == row
+
+    prices = [package['harga'] for package in catalog.packages]
+    assert [prices[row] for row in catalog.rows_within_budget(50000)] == sorted(p for p in prices if p <= 50000)
+    assert all(catalog.packages[row]['category'] == 'call' for row in catalog.rows_in_category('call'))
+    # The version is the file's hash, so it only changes with the file
+    assert load_catalog(DEFAULT_CATALOG_PATH).version == catalog.version
+
+
+@pytest.mark.parametrize('price, expected', [(40000, 40000), (40000.0, 40000), ('40000', 40000),
+                                             ('Rp40.000', 40000), ('Rp 1.500.000', 1500000),
+                                             ('IDR 25.000,00', 25000)])
+def test_parse_price(price, expected):
+    assert parse_price(price) == expected
+
+
+@pytest.mark.parametrize('price', [True, 'gratis', 'Rp', 1.5, None])
+def test_invalid_price_is_rejected(price):
+    with pytest.raises(CatalogError):
+        parse_price(price)
+
+
+def test_unlisted_packages_are_recommended_but_not_listed():
+    catalog = load_catalog(DEFAULT_CATALOG_PATH)
+    assert UNLISTED and UNLISTED <= set(catalog.by_name)
+    assert [package['name'] for package in catalog.listed_packages] == \
+        [package['name'] for package in catalog.packages if package['name'] not in UNLISTED]
+
+    status, headers, body = server.packages_response('gzip', None)
+    listed = json.loads(gzip.decompress(body))
+    assert status == 200 and listed == server.current_catalog().listed_packages
+    assert not UNLISTED & {package['name'] for package in listed}
+    assert server.api_packages() == (200, listed)
+    # The engine still ranks them
+    assert UNLISTED <= {package['name'] for package in server.HybridRecommendationEngine().get_kernel().packages}
+
+
+def test_catalog_without_unlisted_group_lists_everything(tmp_path):
+    document = {group: DOCUMENT[group] for group in ('quota', 'simCredit', 'wifi')}
+    document['wifi'] = copy.deepcopy(document['wifi'])
+    document['wifi'][0]['packages'].extend(entry for section in DOCUMENT['unlisted'] for entry in section['packages'])
+    catalog = load_catalog(write(tmp_path / 'packages.json', document))
+    assert catalog.listed_packages == catalog.packages
+
+
+def broken(mutate):
+    document = copy.deepcopy(DOCUMENT)
+    mutate(document)
+    return document
+
+
+def first_entry(document):
+    return document['quota'][0]['packages'][0]
+
+
+@pytest.mark.parametrize('document, message', [
+    ('{"quota": [', "Can't read catalog"),
+    (b'{"quota": "\xff"}', "Can't read catalog"),
+    ([], 'JSON object'),
+    ({'quota': []}, 'no recommendable packages'),
+    (broken(lambda d: first_entry(d).pop('price')), 'Invalid package'),
+    (broken(lambda d: first_entry(d).update(price='gratis')), 'Invalid package'),
+    (broken(lambda d: first_entry(d).update(modelClass='x')), 'Invalid package'),
+    (broken(lambda d: first_entry(d).update(modelClass=21)), 'is used by both'),
+    (broken(lambda d: first_entry(d).update(modelClass=99)), 'without gaps'),
+    (broken(lambda d: d['quota'][0]['packages'][1].update(sku=first_entry(d).get('sku') or first_entry(d)['name'])),
+     'Duplicate package name'),
+], ids=['truncated', 'not utf-8', 'not an object', 'empty', 'missing price', 'bad price', 'bad model class',
+        'shared model class', 'model class gap', 'duplicate name'])
+def test_malformed_catalog_is_rejected(tmp_path, document, message):
+    with pytest.raises(CatalogError, match=message):
+        load_catalog(write(tmp_path / 'packages.json', document))
+
+
+def test_missing_catalog_is_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / 'missing.json')
+    with pytest.raises(CatalogError, match="Can't read catalog"):
+        load_catalog(path)
+    with pytest.raises(CatalogError):
+        CatalogFile(path).current()
+
+    # The server refuses to start on it instead of serving an empty catalog
+    monkeypatch.setattr(server, 'CATALOG', server.CATALOG)
+    with pytest.raises(CatalogError):
+        server.enable_catalog(path)
+
+
+def test_broken_edit_keeps_the_previous_catalog(tmp_path):
+    path = write(tmp_path / 'packages.json', DOCUMENT)
+    catalog_file = CatalogFile(path, check_interval=0)
+    catalog = catalog_file.current()
+
+    write(tmp_path / 'packages.json', '{"quota": [')
+    os.utime(path, ns=(0, 1))
+    assert catalog_file.current() is catalog
+    assert "Can't read catalog" in catalog_file.stats()['load_error']
+
+    edited = first_entry(DOCUMENT).get('sku') or first_entry(DOCUMENT)['name']
+    write(tmp_path / 'packages.json', broken(lambda d: first_entry(d).update(price='Rp99.000')))
+    reloaded = catalog_file.current()
+    assert reloaded is not catalog and reloaded.version != catalog.version
+    assert reloaded.get(edited)['harga'] == 99000
+    assert catalog_file.stats()['load_error'] is None and catalog_file.reloads == 1
+
+
+def test_package_catalog_rejects_duplicate_names():
+    with pytest.raises(CatalogError, match='Duplicate'):
+        PackageCatalog([{'name': 'A', 'kuota': '1GB', 'harga': 1, 'category': 'x'}] * 2)
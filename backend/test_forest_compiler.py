@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+sklearn_ensemble = pytest.importorskip('sklearn.ensemble')
+sklearn_tree = pytest.importorskip('sklearn.tree')
+
+from forest_compiler import CompiledForest, ForestCompileError, compile_and_verify  # noqa: E402
+
+
+def training_data(n_rows=400, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features))
+    # Integer-valued columns put many samples exactly on split thresholds
+    X[:, :2] = rng.integers(0, 5, size=(n_rows, 2))
+    y = (X[:, 0] + X[:, 2] > 1).astype(int) + 2 * (X[:, 3] > 0)
+    return X, np.array(['quota', 'wifi', 'sim', 'gaming'])[y]
+
+
+@pytest.fixture(scope='module')
+def forest_model():
+    X, y = training_data()
+    return sklearn_ensemble.RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X, y)
+
+
+def test_probabilities_match_sklearn(forest_model):
+    X, _ = training_data(n_rows=300, seed=1)
+    forest = CompiledForest.from_sklearn(forest_model)
+
+    np.testing.assert_allclose(forest.predict_proba(X), forest_model.predict_proba(X), rtol=0, atol=1e-12)
+    assert list(forest.predict(X)) == list(forest_model.predict(X))
+    assert list(forest.classes_) == list(forest_model.classes_)
+
+
+def test_leaves_match_sklearn_apply(forest_model):
+    X, _ = training_data(n_rows=50, seed=2)
+    forest = CompiledForest.from_sklearn(forest_model)
+    # Compiled node ids are offset by each tree's root in the flat arrays
+    assert np.array_equal(forest.apply(X) - forest.roots, forest_model.apply(X))
+
+
+def test_single_tree_and_single_row():
+    X, y = training_data()
+    tree = sklearn_tree.DecisionTreeClassifier(max_depth=5, random_state=0).fit(X, y)
+    forest = CompiledForest.from_sklearn(tree)
+    assert forest.n_trees == 1
+    np.testing.assert_allclose(forest.predict_proba(X[:1]), tree.predict_proba(X[:1]), atol=1e-12)
+
+
+def test_wrong_input_width_is_rejected(forest_model):
+    with pytest.raises(ValueError, match='shape'):
+        CompiledForest.from_sklearn(forest_model).predict_proba(np.zeros((2, 3)))
+
+
+def test_unfitted_or_foreign_models_are_not_compiled():
+    with pytest.raises(ForestCompileError):
+        CompiledForest.from_sklearn(sklearn_ensemble.RandomForestClassifier())
+    with pytest.raises(ForestCompileError):
+        CompiledForest.from_sklearn(object())
+
+
+def test_compile_and_verify_reports_a_mismatch(forest_model, monkeypatch):
+    X, _ = training_data(n_rows=20, seed=3)
+    forest, difference = compile_and_verify(forest_model, X)
+    assert difference <= 1e-9
+
+    monkeypatch.setattr(CompiledForest, 'predict_proba', lambda self, X: np.zeros((len(X), len(self.classes_))))
+    with pytest.raises(ForestCompileError, match='differs'):
+        compile_and_verify(forest_model, X)
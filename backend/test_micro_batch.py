@@ -0,0 +1,182 @@
+import threading
+import time
+
+import pytest
+
+from micro_batch import InferenceQueueFull, MicroBatchScheduler
+
+
+class RecordingBatch:
+    """batch_fn that doubles each row, remembers every batch and can be held shut"""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def __call__(self, rows):
+        self.batches.append(list(rows))
+        self.entered.set()
+        self.gate.wait(10)
+        if self.error is not None:
+            raise self.error
+        return [row * 2 for row in rows]
+
+
+def submit_all(scheduler, rows):
+    """Submit each row from its own thread; results and errors by row"""
+    results, errors = {}, {}
+
+    def submit(row):
+        try:
+            results[row] = scheduler.submit(row)
+        except Exception as e:
+            errors[row] = e
+
+    threads = [threading.Thread(target=submit, args=(row,)) for row in rows]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def join(threads):
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+
+
+def wait_for_queue(scheduler, depth):
+    deadline = time.monotonic() + 10
+    while scheduler.stats()['queue_depth'] < depth:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def coalescing(scheduler):
+    # Batches only wait out the window once recent traffic has been concurrent
+    scheduler._avg_batch_size = float(scheduler.max_batch_size)
+    return scheduler
+
+
+def test_low_traffic_rows_are_flushed_immediately():
+    batch_fn = RecordingBatch()
+    scheduler = MicroBatchScheduler(batch_fn, max_batch_size=8, max_wait_ms=10000)
+
+    started = time.monotonic()
+    assert scheduler.submit(21) == 42
+    assert time.monotonic() - started < 5
+    assert batch_fn.batches == [[21]]
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_deadline():
+    batch_fn = RecordingBatch()
+    scheduler = coalescing(MicroBatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=60000))
+
+    started = time.monotonic()
+    threads, results, errors = submit_all(scheduler, range(4))
+    join(threads)
+
+    assert time.monotonic() - started < 10
+    assert results == {row: row * 2 for row in range(4)} and not errors
+    assert [sorted(batch) for batch in batch_fn.batches] == [[0, 1, 2, 3]]
+
+
+def test_rows_beyond_the_batch_size_go_in_the_next_batch():
+    batch_fn = RecordingBatch()
+    batch_fn.gate.clear()
+    scheduler = MicroBatchScheduler(batch_fn, max_batch_size=3, max_wait_ms=0)
+
+    first, _, _ = submit_all(scheduler, [100])
+    assert batch_fn.entered.wait(10)
+    threads, results, errors = submit_all(scheduler, range(7))
+    wait_for_queue(scheduler, 7)
+    batch_fn.gate.set()
+    join(first + threads)
+
+    assert results == {row: row * 2 for row in range(7)} and not errors
+    assert [len(batch) for batch in batch_fn.batches] == [1, 3, 3, 1]
+    assert scheduler.stats()['rows'] == 8
+
+
+def test_partial_batch_is_flushed_at_the_deadline():
+    batch_fn = RecordingBatch()
+    scheduler = coalescing(MicroBatchScheduler(batch_fn, max_batch_size=64, max_wait_ms=200))
+
+    started = time.monotonic()
+    threads, results, errors = submit_all(scheduler, range(3))
+    join(threads)
+    elapsed = time.monotonic() - started
+
+    assert results == {row: row * 2 for row in range(3)} and not errors
+    assert [sorted(batch) for batch in batch_fn.batches] == [[0, 1, 2]]
+    # The oldest row waited out the whole window, but not much longer
+    assert 0.15 <= elapsed < 5
+
+
+def test_batch_error_reaches_every_waiter():
+    error = ValueError('model exploded')
+    batch_fn = RecordingBatch(error=error)
+    scheduler = coalescing(MicroBatchScheduler(batch_fn, max_batch_size=5, max_wait_ms=60000))
+
+    threads, results, errors = submit_all(scheduler, range(5))
+    join(threads)
+
+    assert len(batch_fn.batches) == 1 and not results
+    assert sorted(errors) == list(range(5)) and all(e is error for e in errors.values())
+    assert scheduler.stats()['errors'] == 1
+
+    # The worker survives the failure
+    batch_fn.error = None
+    scheduler.max_wait = 0
+    assert scheduler.submit(7) == 14
+
+
+def test_full_queue_is_rejected():
+    batch_fn = RecordingBatch()
+    batch_fn.gate.clear()
+    scheduler = MicroBatchScheduler(batch_fn, max_batch_size=1, max_queue=2)
+
+    first, _, _ = submit_all(scheduler, [0])
+    assert batch_fn.entered.wait(10)
+    threads, results, _ = submit_all(scheduler, [1, 2])
+    wait_for_queue(scheduler, 2)
+
+    with pytest.raises(InferenceQueueFull):
+        scheduler.submit(3)
+    assert scheduler.stats()['rejected'] == 1
+
+    batch_fn.gate.set()
+    join(first + threads)
+    assert results == {1: 2, 2: 4}
+
+
+def test_close_runs_everything_queued_then_rejects_new_rows():
+    batch_fn = RecordingBatch()
+    batch_fn.gate.clear()
+    scheduler = MicroBatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=60000)
+
+    first, first_results, _ = submit_all(scheduler, [100])
+    assert batch_fn.entered.wait(10)
+    threads, results, errors = submit_all(scheduler, range(6))
+    wait_for_queue(scheduler, 6)
+    coalescing(scheduler)
+
+    closer = threading.Thread(target=scheduler.close)
+    closer.start()
+    # Closing does not hold the remaining rows back for the batching window
+    batch_fn.gate.set()
+    join(first + threads + [closer])
+
+    assert first_results == {100: 200}
+    assert results == {row: row * 2 for row in range(6)} and not errors
+    assert sum(len(batch) for batch in batch_fn.batches) == 7
+    assert not scheduler._worker.is_alive()
+
+    with pytest.raises(InferenceQueueFull, match='shutting down'):
+        scheduler.submit(1)
+
+
+def test_close_without_a_worker_returns():
+    MicroBatchScheduler(RecordingBatch()).close(timeout=1)
@@ -0,0 +1,146 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from data_access import Database, UserStore
+from migrations import MIGRATIONS, migrate, schema_version, table_columns
+
+REPO_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'telco_users.db')
+
+# The tables as the server created them before migrations existed
+BASELINE_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        phone TEXT,
+        package TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_survey TEXT
+    );
+    CREATE TABLE survey_responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        survey_data TEXT,
+        recommendations TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+'''
+
+LATEST = MIGRATIONS[-1][0]
+
+
+@pytest.fixture
+def baseline_path(tmp_path):
+    path = str(tmp_path / 'users.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO users (name, email, password) VALUES (?, ?, ?)',
+                     [('A', 'a@example.com', 'x'), ('B', 'b@example.com', 'x'), ('C', 'c@example.com', 'x')])
+    conn.executemany('INSERT INTO survey_responses (user_id, survey_data, recommendations) VALUES (?, ?, ?)',
+                     [(1, '{}', '[]'), (1, '{}', '[]'), (2, '{}', '[]'), (99, '{}', '[]')])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def survey_counts(database):
+    return dict(database.run(lambda conn: conn.execute('SELECT id, survey_count FROM users').fetchall()))
+
+
+def test_fresh_database_gets_every_migration_once(tmp_path):
+    database = Database(str(tmp_path / 'new.db'))
+    assert migrate(database) == [version for version, _, _ in MIGRATIONS]
+    assert schema_version(database) == LATEST
+    assert migrate(database) == []
+
+
+def test_existing_database_keeps_its_rows_and_backfills_counts(baseline_path):
+    database = Database(baseline_path)
+    assert migrate(database) == [1, 2, 3, 4, 5]
+
+    assert survey_counts(database) == {1: 2, 2: 1, 3: 0}
+    assert database.query_one('SELECT COUNT(*) FROM survey_responses')[0] == 4
+    columns = database.run(lambda conn: table_columns(conn, 'survey_responses'))
+    assert {'submission_id', 'rescored_recommendations', 'rescored_model_version', 'rescored_at'} <= columns
+
+
+def test_submission_id_column_from_older_startup_code_is_kept(baseline_path):
+    conn = sqlite3.connect(baseline_path)
+    conn.execute('ALTER TABLE survey_responses ADD COLUMN submission_id TEXT')
+    conn.execute("UPDATE survey_responses SET submission_id = 'sub-' || id")
+    conn.commit()
+    conn.close()
+
+    database = Database(baseline_path)
+    migrate(database)
+    store = UserStore(database)
+    assert store.submission('sub-1')['user_id'] == 1
+
+
+def test_submission_ids_are_unique_after_migration(baseline_path):
+    database = Database(baseline_path)
+    migrate(database)
+    store = UserStore(database)
+    store.record_survey('same-id', 1, '{}', '[]', None)
+    with pytest.raises(sqlite3.IntegrityError):
+        store.record_survey('same-id', 2, '{}', '[]', None)
+
+
+def test_triggers_keep_survey_count_current(baseline_path):
+    database = Database(baseline_path)
+    migrate(database)
+    store = UserStore(database)
+
+    store.record_surveys([('s1', 3, '{}', '[]', None), ('s2', 3, '{}', '[]', 'Sphinx Unlimited')])
+    assert survey_counts(database)[3] == 2
+    assert store.profile(3)['survey_count'] == 2
+
+    database.transaction(lambda conn: conn.execute("UPDATE survey_responses SET user_id = 2 WHERE submission_id = 's1'"))
+    assert survey_counts(database) == {1: 2, 2: 2, 3: 1}
+
+    database.transaction(lambda conn: conn.execute('DELETE FROM survey_responses WHERE user_id = 1'))
+    assert survey_counts(database)[1] == 0
+
+
+def test_user_registered_after_their_surveys_counts_them(baseline_path):
+    database = Database(baseline_path)
+    migrate(database)
+    # Response 4 was stored for user id 99 before that user existed
+    database.transaction(lambda conn: conn.execute(
+        "INSERT INTO users (id, name, email, password) VALUES (99, 'Late', 'late@example.com', 'x')"))
+    assert survey_counts(database)[99] == 1
+
+
+def test_database_from_a_newer_server_is_left_alone(tmp_path):
+    database = Database(str(tmp_path / 'newer.db'))
+    migrate(database)
+    database.run(lambda conn: conn.execute(f'PRAGMA user_version = {LATEST + 1}'))
+    assert migrate(database) == []
+    assert schema_version(database) == LATEST + 1
+
+
+def test_partially_migrated_database_resumes_at_the_next_version(baseline_path):
+    database = Database(baseline_path)
+    assert migrate(database, MIGRATIONS[:2]) == [1, 2]
+    assert migrate(database) == [3, 4, 5]
+    assert survey_counts(database) == {1: 2, 2: 1, 3: 0}
+
+
+@pytest.mark.skipif(not os.path.exists(REPO_DATABASE), reason='no telco_users.db in the repository')
+def test_repository_database_migrates(tmp_path):
+    path = str(tmp_path / 'telco_users.db')
+    shutil.copy(REPO_DATABASE, path)
+    database = Database(path)
+    migrate(database)
+
+    assert schema_version(database) == LATEST
+    mismatched = database.query_one('''
+        SELECT COUNT(*) FROM users
+        WHERE survey_count != (SELECT COUNT(*) FROM survey_responses WHERE user_id = users.id)
+    ''')[0]
+    assert mismatched == 0
@@ -0,0 +1,81 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+sklearn_ensemble = pytest.importorskip('sklearn.ensemble')
+
+from forest_compiler import CompiledForest  # noqa: E402
+from model_artifact import (ALIGNMENT, MAGIC, ArtifactError, artifact_path, is_artifact,  # noqa: E402
+                            load_artifact, read_header, write_artifact)
+
+
+@pytest.fixture(scope='module')
+def model_and_rows():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 5))
+    y = np.where(X[:, 0] > 0, 'quota', np.where(X[:, 1] > 0, 'wifi', 'simCredit'))
+    model = sklearn_ensemble.RandomForestClassifier(n_estimators=8, max_depth=6, random_state=0).fit(X, y)
+    return model, rng.normal(size=(100, 5))
+
+
+@pytest.fixture
+def artifact(tmp_path, model_and_rows):
+    model, _ = model_and_rows
+    path = str(tmp_path / 'model.forest')
+    write_artifact(CompiledForest.from_sklearn(model), path, metadata={'source': 'model.pkl'})
+    return path
+
+
+def test_round_trip_predicts_like_the_model(artifact, model_and_rows):
+    model, X = model_and_rows
+    forest, header = load_artifact(artifact)
+
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+    assert list(forest.classes_) == list(model.classes_)
+    assert forest.n_features == 5
+    assert header['metadata'] == {'source': 'model.pkl'}
+
+
+def test_arrays_are_aligned_read_only_maps(artifact):
+    forest, _ = load_artifact(artifact)
+    for name in CompiledForest.ARRAY_NAMES:
+        array = getattr(forest, name)
+        assert isinstance(array.base, np.memmap) or isinstance(array, np.memmap)
+        assert not array.flags.writeable
+        assert array.ctypes.data % ALIGNMENT == 0
+
+
+def test_artifact_path_sits_next_to_the_pickle():
+    assert artifact_path('/models/model_telco_recommendation.pkl') == '/models/model_telco_recommendation.forest'
+    assert is_artifact('model.forest') and not is_artifact('model.pkl')
+
+
+def test_write_leaves_no_temporary_file(artifact, tmp_path):
+    assert [path.name for path in tmp_path.iterdir()] == ['model.forest']
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'model.pkl'
+    path.write_bytes(b'\x80\x04not an artifact')
+    with pytest.raises(ArtifactError, match='not a model artifact'):
+        load_artifact(str(path))
+
+
+def test_newer_format_version_is_rejected(artifact):
+    header, _ = read_header(artifact)
+    header['format_version'] += 1
+    with open(artifact, 'r+b') as f:
+        f.seek(len(MAGIC))
+        (length,) = struct.unpack('<Q', f.read(8))
+        f.write(json.dumps(header).encode().ljust(length))
+    with pytest.raises(ArtifactError, match='format version'):
+        load_artifact(artifact)
+
+
+def test_truncated_artifact_is_rejected(artifact):
+    with open(artifact, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - ALIGNMENT * 2)
+    with pytest.raises(ArtifactError, match='truncated'):
+        load_artifact(artifact)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+import hybrid_ml_survey_server as server
+from benchmarks.synthetic import synthetic_surveys
+from catalog import PackageCatalog
+
+BUDGETS = list(server.WeightingLogic.BUDGET_LIMITS) + ['not an answer']
+
+
+def edge_prices():
+    """Prices at, just under and just over every budget ceiling and its 120% band"""
+    prices = set()
+    for limit in server.WeightingLogic.BUDGET_LIMITS.values():
+        for edge in (limit, int(limit * 1.2)):
+            prices.update((edge - 500, edge, edge + 500))
+    return sorted(prices)
+
+
+def tied_catalog(n_packages, seed=0):
+    """Variants of the shipped packages on a handful of prices, so many rows tie"""
+    rng = np.random.default_rng(seed)
+    base = server.current_catalog().packages
+    prices = edge_prices()
+    return PackageCatalog([
+        {
+            'name': f"{base[i % len(base)]['name']} V{i}",
+            'kuota': base[i % len(base)]['kuota'],
+            'harga': int(rng.choice(prices)),
+            'category': base[i % len(base)]['category']
+        }
+        for i in range(n_packages)
+    ])
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return server.HybridRecommendationEngine()
+
+
+def kernel_for(engine, catalog):
+    return server.ScoringKernel(catalog, engine.ml_processor.weighting_logic, engine.survey_analyzer,
+                                engine.ml_processor.feature_encoder)
+
+
+def ml_score_sets(kernel, prepared, rng):
+    size = len(kernel.packages)
+    yield 'fallback', kernel.ml_scores(prepared, None)
+    # Sparse class probabilities, like a forest's leaf votes
+    yield 'sparse', rng.dirichlet(np.full(size, 0.05))
+    # Few distinct values, so logic scores tie across categories and budget tiers
+    yield 'quantized', rng.integers(0, 4, size) / 4
+    yield 'flat', np.zeros(size)
+
+
+def test_two_stage_ranking_matches_full_scoring(engine):
+    kernel = kernel_for(engine, tied_catalog(server.ScoringKernel.RETRIEVAL_MIN_PACKAGES + 500))
+    rng = np.random.default_rng(1)
+    surveys = synthetic_surveys(400, seed=2)
+
+    compared = 0
+    for i, survey in enumerate(surveys):
+        survey['budget'] = BUDGETS[i % len(BUDGETS)]
+        prepared = kernel.prepare(survey)
+        for source, ml_scores in ml_score_sets(kernel, prepared, rng):
+            for k in (1, 3, 10):
+                expected = kernel.rank_all(prepared, ml_scores, k)
+                assert kernel.rank_candidates(prepared, ml_scores, k) == expected, (source, k, survey)
+                compared += 1
+    assert compared == 400 * 4 * 3
+
+
+def test_large_catalogs_are_ranked_in_two_stages(engine, monkeypatch):
+    kernel = kernel_for(engine, tied_catalog(server.ScoringKernel.RETRIEVAL_MIN_PACKAGES))
+    prepared = kernel.prepare(synthetic_surveys(1, seed=3)[0])
+    ml_scores = kernel.ml_scores(prepared, None)
+    expected = kernel.rank_all(prepared, ml_scores)
+
+    monkeypatch.setattr(server.ScoringKernel, 'rank_all', lambda *args: pytest.fail('scored every package'))
+    assert kernel.rank(prepared, ml_scores) == expected
+
+
+def reference_recommendations(engine, survey, probabilities):
+    """The per-package implementation the kernel replaces"""
+    ml_recommendations = engine.ml_processor.rank_packages(survey, probabilities)
+    return engine.merge_recommendations(survey, ml_recommendations)
+
+
+def test_kernel_matches_the_reference_implementation(engine):
+    rng = np.random.default_rng(4)
+    size = len(server.current_catalog().packages)
+    surveys = synthetic_surveys(400, seed=5)
+    # Answers the synthetic surveys never give: defaults, a bare usage string, unknown values
+    surveys += [{}, {'usage': 'Gaming online'}, {'budget': 'not an answer', 'reason': 'MURAH dan stabil'},
+                {'usage': [], 'preference': 'not an answer', 'phone_model': 'not an answer'}]
+
+    for i, survey in enumerate(surveys):
+        if i < 400:
+            survey['budget'] = BUDGETS[i % len(BUDGETS)]
+        # Otherwise the engine falls back to the reference implementation itself
+        assert engine.get_kernel().prepare(survey) is not None
+        for probabilities in (None, rng.dirichlet(np.full(size, 0.3)), rng.integers(0, 3, size) / 2):
+            expected = reference_recommendations(engine, dict(survey), probabilities)
+            actual = engine.recommend_from_probabilities(dict(survey), probabilities)
+            assert actual == expected, survey
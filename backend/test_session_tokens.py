@@ -0,0 +1,180 @@
+import json
+
+import pytest
+
+from session_tokens import InvalidToken, TokenSigner, _b64decode, _b64encode, bearer_token
+
+NOW = 1_700_000_000
+
+
+def test_issued_token_verifies_until_it_expires():
+    signer = TokenSigner('secret', ttl=60)
+    token = signer.issue(42, now=NOW)
+
+    assert signer.verify(token, now=NOW + 59) == {'uid': 42, 'exp': NOW + 60}
+    with pytest.raises(InvalidToken, match='expired'):
+        signer.verify(token, now=NOW + 60)
+
+
+def test_claims_carry_only_user_id_and_expiry():
+    payload = TokenSigner('secret').issue(7, now=NOW).split('.')[0]
+    assert set(json.loads(_b64decode(payload))) == {'uid', 'exp'}
+
+
+def test_token_from_another_key_is_rejected():
+    token = TokenSigner('other secret').issue(42, now=NOW)
+    with pytest.raises(InvalidToken, match='signature'):
+        TokenSigner('secret').verify(token, now=NOW)
+
+
+def test_edited_payload_is_rejected():
+    signer = TokenSigner('secret', ttl=60)
+    payload, signature = signer.issue(42, now=NOW).split('.')
+    claims = json.loads(_b64decode(payload))
+    claims['uid'] = 1
+    forged = _b64encode(json.dumps(claims).encode()) + '.' + signature
+    with pytest.raises(InvalidToken, match='signature'):
+        signer.verify(forged, now=NOW)
+
+
+def test_extended_expiry_is_rejected():
+    signer = TokenSigner('secret', ttl=60)
+    payload, signature = signer.issue(42, now=NOW).split('.')
+    claims = json.loads(_b64decode(payload))
+    claims['exp'] += 3600
+    forged = _b64encode(json.dumps(claims, separators=(',', ':')).encode()) + '.' + signature
+    with pytest.raises(InvalidToken):
+        signer.verify(forged, now=NOW + 120)
+
+
+@pytest.mark.parametrize('token', [None, '', 'no-dot', '.sig', 'payload.', 'a.b.c'])
+def test_malformed_tokens_are_rejected(token):
+    with pytest.raises(InvalidToken):
+        TokenSigner('secret').verify(token, now=NOW)
+
+
+def test_signed_payload_with_wrong_claim_types_is_rejected():
+    signer = TokenSigner('secret')
+    payload = _b64encode(json.dumps({'uid': '42', 'exp': NOW + 60}).encode())
+    with pytest.raises(InvalidToken, match='Malformed'):
+        signer.verify(f'{payload}.{signer._sign(payload)}', now=NOW)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('Bearer abc.def', 'abc.def'),
+    ('bearer  abc.def ', 'abc.def'),
+    ('Basic abc', None),
+    ('Bearer ', None),
+    ('', None),
+    (None, None),
+])
+def test_bearer_token(header, expected):
+    assert bearer_token(header) == expected
+
+
+class RecordingStore:
+    def __init__(self):
+        self.surveys = []
+
+    def record_survey(self, submission_id, user_id, survey_json, recommendations_json, package):
+        self.surveys.append(user_id)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    import hybrid_ml_survey_server as server
+    monkeypatch.setattr(server, 'USER_STORE', RecordingStore())
+    monkeypatch.setattr(server, 'SURVEY_QUEUE', None)
+    return server
+
+
+def submit(server, body, authorization=None):
+    return server.api_survey_submit(json.dumps(body).encode(), authorization)
+
+
+def test_survey_submit_takes_the_user_from_the_token(server):
+    token = server.TOKEN_SIGNER.issue(5)
+    status, payload = submit(server, {'survey_data': {}, 'recommendations': []}, f'Bearer {token}')
+    assert (status, payload['success']) == (200, True)
+    assert server.USER_STORE.surveys == [5]
+
+
+def test_survey_submit_without_token_is_rejected(server):
+    status, _ = submit(server, {'user_id': 5, 'survey_data': {}, 'recommendations': []})
+    assert status == 401
+    assert server.USER_STORE.surveys == []
+
+
+def test_survey_submit_for_another_user_is_rejected(server):
+    token = server.TOKEN_SIGNER.issue(5)
+    status, _ = submit(server, {'user_id': 6, 'survey_data': {}, 'recommendations': []}, f'Bearer {token}')
+    assert status == 403
+    assert server.USER_STORE.surveys == []
+
+
+def test_survey_submit_with_expired_token_is_rejected(server):
+    token = server.TOKEN_SIGNER.issue(5, now=NOW)
+    status, payload = submit(server, {'survey_data': {}, 'recommendations': []}, f'Bearer {token}')
+    assert status == 401 and 'expired' in payload['error']
+    assert server.USER_STORE.surveys == []
+
+
+@pytest.fixture
+def stored_server(tmp_path, monkeypatch):
+    import hybrid_ml_survey_server as server
+    from data_access import Database, UserStore
+    from migrations import migrate
+    database = Database(str(tmp_path / 'users.db'))
+    migrate(database)
+    monkeypatch.setattr(server, 'USER_STORE', UserStore(database))
+    monkeypatch.setattr(server, 'SURVEY_QUEUE', None)
+    return server
+
+
+def stored_rows(server):
+    return server.USER_STORE.db.query_one('SELECT COUNT(*) FROM survey_responses')[0]
+
+
+SUBMISSION_ID = 'ab' * 16
+
+
+def test_resent_submission_is_stored_once(stored_server):
+    token = stored_server.TOKEN_SIGNER.issue(5)
+    body = {'submission_id': SUBMISSION_ID, 'survey_data': {}, 'recommendations': []}
+
+    first = submit(stored_server, body, f'Bearer {token}')
+    second = submit(stored_server, body, f'Bearer {token}')
+    assert first[0] == 200 and first[1]['submission_id'] == SUBMISSION_ID and 'duplicate' not in first[1]
+    assert second[0] == 200 and second[1]['duplicate']
+    assert stored_rows(stored_server) == 1
+
+
+def test_submission_id_of_another_user_is_a_conflict(stored_server):
+    body = {'submission_id': SUBMISSION_ID, 'survey_data': {}, 'recommendations': []}
+    submit(stored_server, body, f'Bearer {stored_server.TOKEN_SIGNER.issue(5)}')
+    status, _ = submit(stored_server, body, f'Bearer {stored_server.TOKEN_SIGNER.issue(6)}')
+    assert status == 409
+    assert stored_rows(stored_server) == 1
+
+
+@pytest.mark.parametrize('submission_id', ['AB' * 16, 'ab' * 15, 12345, 'x' * 32])
+def test_malformed_submission_id_is_rejected(stored_server, submission_id):
+    body = {'submission_id': submission_id, 'survey_data': {}, 'recommendations': []}
+    status, _ = submit(stored_server, body, f'Bearer {stored_server.TOKEN_SIGNER.issue(5)}')
+    assert status == 400
+    assert stored_rows(stored_server) == 0
+
+
+def test_resent_submission_is_queued_once(stored_server, monkeypatch):
+    from write_behind import SurveyWriteQueue
+    queue = SurveyWriteQueue(stored_server.USER_STORE, flush_interval_ms=200)
+    monkeypatch.setattr(stored_server, 'SURVEY_QUEUE', queue)
+    token = stored_server.TOKEN_SIGNER.issue(5)
+    body = {'submission_id': SUBMISSION_ID, 'survey_data': {}, 'recommendations': []}
+
+    assert submit(stored_server, body, f'Bearer {token}')[0] == 200
+    # Still queued, then stored: both repeats are recognised
+    assert submit(stored_server, body, f'Bearer {token}')[1]['duplicate']
+    queue.close()
+    assert submit(stored_server, body, f'Bearer {token}')[1]['duplicate']
+    assert stored_rows(stored_server) == 1
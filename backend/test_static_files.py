@@ -0,0 +1,129 @@
+import gzip
+import os
+
+import pytest
+
+from static_files import StaticFiles, parse_range
+
+BODY = b''.join(b'line %03d\n' % i for i in range(200))
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / 'app.js').write_bytes(BODY)
+    (tmp_path / 'index.html').write_text('<h1>home</h1>')
+    (tmp_path / 'users.db').write_bytes(b'SQLite format 3')
+    (tmp_path / '.env').write_text('SECRET_KEY=x')
+    (tmp_path / 'backend').mkdir()
+    (tmp_path / 'backend' / 'server.py').write_text('print()')
+    return tmp_path
+
+
+@pytest.fixture(params=[512, 0], ids=['cached', 'sendfile'])
+def files(root, request):
+    # cache_entries=0 returns file slices the way large files are sent
+    return StaticFiles(str(root), cache_entries=request.param)
+
+
+def body(response):
+    if response.path is None:
+        return response.body
+    with open(response.path, 'rb') as f:
+        f.seek(response.offset)
+        return f.read(response.length)
+
+
+@pytest.mark.parametrize('header, size, expected', [
+    ('bytes=0-9', 100, (0, 9)),
+    ('bytes=90-', 100, (90, 99)),
+    ('bytes=-10', 100, (90, 99)),
+    ('bytes=-500', 100, (0, 99)),
+    ('bytes=95-200', 100, (95, 99)),
+    ('bytes=100-', 100, 'unsatisfiable'),
+    ('bytes=-0', 100, 'unsatisfiable'),
+    ('bytes=5-2', 100, None),
+    ('bytes=0-1,5-6', 100, None),
+    ('items=0-1', 100, None),
+    ('bytes=a-b', 100, None),
+])
+def test_parse_range(header, size, expected):
+    assert parse_range(header, size) == expected
+
+
+def test_whole_file_with_validators(files):
+    response = files.respond('/app.js', {})
+    assert response.status == 200 and body(response) == BODY
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+    assert response.headers['Cache-Control'] == 'public, max-age=3600'
+    assert files.respond('/index.html', {}).headers['Cache-Control'] == 'no-cache'
+
+
+def test_range_request(files):
+    response = files.respond('/app.js', {'range': 'bytes=9-17'})
+    assert response.status == 206 and body(response) == BODY[9:18]
+    assert response.headers['Content-Range'] == f'bytes 9-17/{len(BODY)}'
+
+
+def test_range_past_the_end_is_unsatisfiable(files):
+    response = files.respond('/app.js', {'range': f'bytes={len(BODY)}-'})
+    assert response.status == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(BODY)}'
+
+
+def test_range_for_an_older_version_sends_the_whole_file(files):
+    response = files.respond('/app.js', {'range': 'bytes=0-9', 'if-range': '"0-0"'})
+    assert response.status == 200 and body(response) == BODY
+
+
+def test_matching_etag_is_not_modified(files):
+    etag = files.respond('/app.js', {}).headers['ETag']
+    response = files.respond('/app.js', {'if-none-match': etag})
+    assert response.status == 304 and body(response) == b''
+    assert files.respond('/app.js', {'if-none-match': '"other"'}).status == 200
+
+
+def test_edited_file_gets_a_new_etag(files, root):
+    before = files.respond('/app.js', {}).headers['ETag']
+    (root / 'app.js').write_bytes(BODY + b'more\n')
+    response = files.respond('/app.js', {'if-none-match': before})
+    assert response.status == 200 and body(response) == BODY + b'more\n'
+
+
+def test_fresh_gz_sibling_is_served_to_gzip_clients(files, root):
+    gz = root / 'app.js.gz'
+    gz.write_bytes(gzip.compress(BODY))
+    stat = os.stat(root / 'app.js')
+    os.utime(gz, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    response = files.respond('/app.js', {'accept-encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'javascript' in response.headers['Content-Type']
+    assert gzip.decompress(body(response)) == BODY
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    plain = files.respond('/app.js', {})
+    assert 'Content-Encoding' not in plain.headers and body(plain) == BODY
+    ranged = files.respond('/app.js', {'accept-encoding': 'gzip', 'range': 'bytes=0-3'})
+    assert 'Content-Encoding' not in ranged.headers and body(ranged) == BODY[:4]
+
+
+def test_stale_gz_sibling_is_ignored(files, root):
+    gz = root / 'app.js.gz'
+    gz.write_bytes(gzip.compress(b'old'))
+    stat = os.stat(root / 'app.js')
+    os.utime(gz, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+
+    response = files.respond('/app.js', {'accept-encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers and body(response) == BODY
+
+
+@pytest.mark.parametrize('url', ['/users.db', '/.env', '/../etc/passwd', '/%2e%2e/%2e%2e/etc/passwd',
+                                 '/missing.js', '/backend/'])
+def test_private_and_missing_paths_are_not_found(files, url):
+    assert files.respond(url, {}).status == 404
+
+
+def test_directory_redirects_to_its_slash_and_serves_index(files):
+    response = files.respond('/backend?x=1', {})
+    assert response.status == 301 and response.headers['Location'] == '/backend/?x=1'
+    assert body(files.respond('/', {})) == b'<h1>home</h1>'
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from data_access import Database, UserStore
+from migrations import migrate
+from write_behind import SurveyQueueFull, SurveyWriteQueue
+
+
+class BlockingStore:
+    """Records batches; the writer waits on `release` before each one"""
+
+    def __init__(self, blocked=False):
+        self.batches = []
+        self.release = threading.Event()
+        if not blocked:
+            self.release.set()
+
+    def record_surveys(self, rows):
+        self.release.wait(5)
+        self.batches.append(list(rows))
+
+
+def row(submission_id, user_id=1):
+    return submission_id, user_id, '{}', '[]', None
+
+
+def written_ids(store):
+    return [r[0] for batch in store.batches for r in batch]
+
+
+def test_close_writes_everything_queued_in_order():
+    store = BlockingStore()
+    queue = SurveyWriteQueue(store, batch_size=4, flush_interval_ms=1000)
+    for i in range(10):
+        queue.submit(*row(f's{i}'))
+    queue.close()
+
+    assert written_ids(store) == [f's{i}' for i in range(10)]
+    assert all(len(batch) <= 4 for batch in store.batches)
+    assert queue.stats()['rows_written'] == 10
+    assert queue.stats()['queue_depth'] == 0
+
+
+def test_submission_stays_visible_until_committed():
+    store = BlockingStore(blocked=True)
+    queue = SurveyWriteQueue(store, flush_interval_ms=0)
+    queue.submit(*row('s1'))
+    assert queue.status('s1') == 'queued'
+
+    store.release.set()
+    queue.close()
+    assert queue.status('s1') is None
+    assert written_ids(store) == ['s1']
+
+
+def test_full_queue_rejects_after_the_enqueue_timeout():
+    store = BlockingStore(blocked=True)
+    queue = SurveyWriteQueue(store, max_queue=2, batch_size=1, flush_interval_ms=0, enqueue_timeout=0.01)
+    queue.submit(*row('s1'))
+    # Wait until the writer holds s1, so the queue itself has room for exactly two
+    for _ in range(500):
+        if queue.stats()['queue_depth'] == 0:
+            break
+        time.sleep(0.001)
+    queue.submit(*row('s2'))
+    queue.submit(*row('s3'))
+
+    with pytest.raises(SurveyQueueFull, match='full'):
+        queue.submit(*row('s4'))
+    assert queue.stats()['rejected'] == 1
+
+    store.release.set()
+    queue.close()
+    assert written_ids(store) == ['s1', 's2', 's3']
+
+
+def test_submit_after_close_is_rejected():
+    queue = SurveyWriteQueue(BlockingStore())
+    queue.submit(*row('s1'))
+    queue.close()
+    with pytest.raises(SurveyQueueFull, match='shutting down'):
+        queue.submit(*row('s2'))
+
+
+def test_failed_row_does_not_block_the_rest_of_its_batch(tmp_path):
+    database = Database(str(tmp_path / 'users.db'))
+    migrate(database)
+    store = UserStore(database)
+    store.record_survey('taken', 1, '{}', '[]', None)
+
+    written = []
+    queue = SurveyWriteQueue(store, batch_size=8, flush_interval_ms=1000, on_written=written.extend)
+    for submission_id in ('a', 'taken', 'b'):
+        queue.submit(*row(submission_id))
+    queue.close()
+
+    assert [r[0] for r in written] == ['a', 'b']
+    status, error = queue.status('taken')
+    assert status == 'failed' and 'UNIQUE' in error
+    assert queue.stats()['rows_written'] == 2
+    assert queue.stats()['rows_failed'] == 1
+    assert store.submission('a') is not None
+    assert store.submission('b') is not None
+
+
+def test_submission_id_already_queued_is_not_queued_again():
+    store = BlockingStore(blocked=True)
+    queue = SurveyWriteQueue(store, flush_interval_ms=0)
+    assert queue.submit(*row('s1', user_id=7))
+    assert not queue.submit(*row('s1', user_id=7))
+    assert queue.queued_user('s1') == 7
+
+    store.release.set()
+    queue.close()
+    assert written_ids(store) == ['s1']
+    assert queue.queued_user('s1') is None
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue for survey submissions
+Acknowledges submissions immediately and stores them in group commits from one writer thread
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SurveyQueueFull(Exception):
+    """Raised when the write-behind queue stays full for longer than the enqueue timeout"""
+
+
+class SurveyWriteQueue:
+    """Bounded queue of survey submissions flushed by a background writer
+
+    A batch is written when it reaches batch_size rows or when flush_interval_ms
+    has passed since the writer picked up the first queued row. Every queued
+    submission id stays visible through status() until it is committed.
+    """
+
+    # Failed submission ids remembered for status lookups
+    MAX_FAILED = 1024
+
+    def __init__(self, store, max_queue=10000, batch_size=256, flush_interval_ms=50.0, enqueue_timeout=0.05,
+                 on_written=None):
+        # on_written(rows) is called from the writer thread after rows are committed
+        self.store = store
+        self.on_written = on_written
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        # submission id -> user id of every queued or in-flight row
+        self._pending = {}
+        self._failed = collections.OrderedDict()
+        self._closing = False
+        self._worker = None
+        self._pid = None
+
+        self.batches = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rejected = 0
+        self.max_flush_ms = 0.0
+
+    def submit(self, submission_id, user_id, survey_json, recommendations_json, package):
+        """Queue one submission, waiting up to enqueue_timeout for space
+
+        Returns False, queuing nothing, when the submission id is already queued.
+        """
+        self._ensure_worker()
+        row = (submission_id, user_id, survey_json, recommendations_json, package)
+
+        with self._cond:
+            if submission_id in self._pending:
+                return False
+            deadline = time.monotonic() + self.enqueue_timeout
+            while len(self._queue) >= self.max_queue or self._closing:
+                remaining = deadline - time.monotonic()
+                if self._closing:
+                    self.rejected += 1
+                    raise SurveyQueueFull("Survey write queue is shutting down")
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise SurveyQueueFull(f"Survey write queue is full ({self.max_queue} pending)")
+                self._cond.wait(remaining)
+
+            self._queue.append(row)
+            self._pending[submission_id] = user_id
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def queued_user(self, submission_id):
+        """User id of the queued submission with this id, None if there is none"""
+        with self._cond:
+            return self._pending.get(submission_id)
+
+    def status(self, submission_id):
+        """'queued', ('failed', error) or None once the submission left the queue"""
+        with self._cond:
+            if submission_id in self._pending:
+                return 'queued'
+            if submission_id in self._failed:
+                return 'failed', self._failed[submission_id]
+        return None
+
+    def close(self, timeout=30.0):
+        """Stop accepting submissions and wait until everything queued is written"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            worker = self._worker if self._pid == os.getpid() else None
+        if worker is not None:
+            worker.join(timeout)
+            if worker.is_alive():
+                logger.warning("%d survey submissions were not written before shutdown", len(self._queue))
+
+    def stats(self):
+        with self._cond:
+            queue_depth = len(self._queue)
+        return {
+            'queue_depth': queue_depth,
+            'max_queue': self.max_queue,
+            'batch_size': self.batch_size,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'rejected': self.rejected,
+            'avg_batch_size': round(self.rows_written / self.batches, 2) if self.batches else 0,
+            'max_flush_ms': round(self.max_flush_ms, 3)
+        }
+
+    def _ensure_worker(self):
+        # The writer thread does not survive fork(), so start one per process
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue.clear()
+                self._pending.clear()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name='survey-writer', daemon=True)
+            self._worker.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closing:
+                self._cond.wait()
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(size)]
+            # Wake submitters waiting for space
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # closing and drained
+            self._write(batch)
+
+    def _write(self, batch):
+        started = time.monotonic()
+        failed = {}
+        try:
+            self.store.record_surveys(batch)
+        except Exception as e:
+            logger.error("Error writing %d survey submissions, retrying one by one: %s", len(batch), e)
+            # Isolate the rows that can't be stored so the rest still commit
+            for row in batch:
+                try:
+                    self.store.record_surveys([row])
+                except Exception as row_error:
+                    failed[row[0]] = str(row_error)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if self.on_written is not None:
+            try:
+                self.on_written([row for row in batch if row[0] not in failed])
+            except Exception as e:
+                logger.error("Error in survey write callback: %s", e)
+
+        with self._cond:
+            for row in batch:
+                self._pending.pop(row[0], None)
+            for submission_id, error in failed.items():
+                self._failed[submission_id] = error
+                if len(self._failed) > self.MAX_FAILED:
+                    self._failed.popitem(last=False)
+            self.batches += 1
+            self.rows_written += len(batch) - len(failed)
+            self.rows_failed += len(failed)
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
@@ -76,6 +76,7 @@ function showUnauthenticatedState() {
 
 function logout() {
     localStorage.removeItem('currentUser');
+    localStorage.removeItem('authToken');
     localStorage.removeItem('rememberMe');
     window.location.href = './login.html';
 }
@@ -84,6 +85,118 @@ function goToProfile() {
     window.location.href = './profile.html';
 }
 
+// Survey submissions waiting for a valid session token, kept across the re-login
+const PENDING_SURVEYS_KEY = 'pendingSurveySubmissions';
+
+function loadPendingSurveys() {
+    try {
+        return JSON.parse(localStorage.getItem(PENDING_SURVEYS_KEY)) || [];
+    } catch (error) {
+        return [];
+    }
+}
+
+function savePendingSurveys(pending) {
+    if (pending.length) {
+        localStorage.setItem(PENDING_SURVEYS_KEY, JSON.stringify(pending));
+    } else {
+        localStorage.removeItem(PENDING_SURVEYS_KEY);
+    }
+}
+
+// The stored token expired or the server restarted with another key: log in again
+function sessionExpired() {
+    localStorage.removeItem('currentUser');
+    localStorage.removeItem('authToken');
+    alert('Sesi Anda telah berakhir. Silakan masuk kembali, survei Anda akan dikirim setelah login.');
+    window.location.href = './login.html';
+}
+
+// Send one queued submission; true once the server answered it, false when a new login is needed
+async function sendSurveySubmission(submission) {
+    const authToken = localStorage.getItem('authToken');
+    if (!authToken) {
+        return false;
+    }
+    const response = await fetch('http://localhost:8000/api/survey/submit', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': 'Bearer ' + authToken
+        },
+        body: JSON.stringify(submission)
+    });
+    if (response.status === 401) {
+        return false;
+    }
+    const result = await response.json();
+    if (!result.success) {
+        if (response.status >= 500) {
+            // Kept queued and retried on the next page load
+            throw new Error(result.error || 'Survey submission failed');
+        }
+        // Rejected for good (e.g. queued by another user), don't retry it forever
+        console.error('Survey submission rejected:', result.error);
+    }
+    return true;
+}
+
+// 32 hex digits, the server's submission id format; a resent submission keeps its id,
+// so the server stores it once even if an earlier attempt got through without an answer
+function newSubmissionId() {
+    const bytes = new Uint8Array(16);
+    crypto.getRandomValues(bytes);
+    return Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+// Queue a survey submission and send it; it stays queued until the server accepts it
+async function submitSurvey(submission) {
+    const pending = loadPendingSurveys();
+    pending.push(Object.assign({ submission_id: newSubmissionId() }, submission));
+    savePendingSurveys(pending);
+    return flushPendingSurveys();
+}
+
+// The flush in progress, if any; a second caller waits for it instead of sending the same entries
+let activeSurveyFlush = null;
+
+// Send queued submissions in order; true when none are left
+function flushPendingSurveys() {
+    if (!activeSurveyFlush) {
+        activeSurveyFlush = sendPendingSurveys().finally(() => {
+            activeSurveyFlush = null;
+        });
+    }
+    return activeSurveyFlush;
+}
+
+async function sendPendingSurveys() {
+    let pending = loadPendingSurveys();
+    while (pending.length) {
+        const submission = pending[0];
+        if (!submission.submission_id) {
+            // Queued before submissions carried an id
+            submission.submission_id = newSubmissionId();
+            savePendingSurveys(pending);
+        }
+        if (!await sendSurveySubmission(submission)) {
+            sessionExpired();
+            return false;
+        }
+        // Entries queued meanwhile (e.g. by another tab) are picked up by reloading the queue
+        pending = loadPendingSurveys().filter(entry => entry.submission_id !== submission.submission_id);
+        savePendingSurveys(pending);
+    }
+    return true;
+}
+
+// Retry submissions left over from an expired session once logged in again
+document.addEventListener('DOMContentLoaded', function () {
+    if (localStorage.getItem('authToken') && loadPendingSurveys().length) {
+        flushPendingSurveys().catch(error => console.error('Error submitting saved surveys:', error));
+    }
+});
+
 // Make these functions global for onclick handlers
 window.logout = logout;
 window.goToProfile = goToProfile;
@@ -323,6 +436,7 @@ function loadUsageChart() {
 function logout() {
     if (confirm('Apakah Anda yakin ingin keluar?')) {
         localStorage.removeItem('currentUser');
+        localStorage.removeItem('authToken');
         sessionStorage.clear();
         window.location.href = './login.html';
     }
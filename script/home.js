@@ -686,27 +686,18 @@ async function sendSurveyToPython(surveyData) {
 // Submit survey to server for authenticated users
 async function submitSurveyToServer(userId, surveyData, recommendations) {
     try {
-        const response = await fetch('http://localhost:8000/api/survey/submit', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                user_id: userId,
-                survey_data: surveyData,
-                recommendations: recommendations,
-                selected_package: null // Can be updated when user selects a package
-            })
+        // Queued by auth.js until the server accepts it, so an expired session only means logging in again
+        const submitted = await submitSurvey({
+            user_id: userId,
+            survey_data: surveyData,
+            recommendations: recommendations,
+            selected_package: null // Can be updated when user selects a package
         });
-
-        const result = await response.json();
-        if (result.success) {
+        if (submitted) {
             console.log('Survey submitted successfully to server');
-        } else {
-            console.error('Failed to submit survey:', result.error);
         }
     } catch (error) {
-        console.error('Error submitting survey to server:', error);
+        console.error('Error submitting survey to server, it will be retried:', error);
     }
 }
 
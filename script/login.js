@@ -52,6 +52,7 @@ document
       if (result.success) {
         // Store user data in localStorage
         localStorage.setItem('currentUser', JSON.stringify(result.user));
+        localStorage.setItem('authToken', result.token);
 
         if (rememberMe) {
           localStorage.setItem('rememberMe', 'true');
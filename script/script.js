@@ -358,30 +358,21 @@ async function submitSurveyPaymentData(userId, selectedPackage) {
     try {
         const surveyContext = JSON.parse(localStorage.getItem('surveyContext'));
 
-        const response = await fetch('http://localhost:8000/api/survey/submit', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                user_id: userId,
-                survey_data: surveyContext.surveyAnswers,
-                recommendations: [selectedPackage],
-                selected_package: selectedPackage.name,
-                payment_confirmed: true
-            })
+        // Queued by auth.js until the server accepts it, so an expired session only means logging in again
+        const submission = submitSurvey({
+            user_id: userId,
+            survey_data: surveyContext.surveyAnswers,
+            recommendations: [selectedPackage],
+            selected_package: selectedPackage.name,
+            payment_confirmed: true
         });
-
-        const result = await response.json();
-        if (result.success) {
+        // The submission is saved, the survey context isn't needed anymore
+        localStorage.removeItem('surveyContext');
+        if (await submission) {
             console.log('Survey payment data submitted successfully');
-            // Clear survey data after submission
-            localStorage.removeItem('surveyContext');
-        } else {
-            console.error('Failed to submit survey payment data:', result.error);
         }
     } catch (error) {
-        console.error('Error submitting survey payment data:', error);
+        console.error('Error submitting survey payment data, it will be retried:', error);
     }
 }
 
@@ -87,6 +87,7 @@ document
       if (result.success) {
         // Store user data in localStorage
         localStorage.setItem('currentUser', JSON.stringify(result.user));
+        localStorage.setItem('authToken', result.token);
 
         showSuccess("Account created successfully! Redirecting...");
         setTimeout(() => {